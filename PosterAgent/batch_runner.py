@@ -0,0 +1,204 @@
+from PosterAgent.new_pipeline import build_parser, PosterRun
+from PosterAgent.parse_raw import get_doc_converter
+from PosterAgent.tree_split_layout import load_layout_models
+from utils.src.utils import set_soffice_profile_root, warm_up_soffice
+
+from docling.datamodel.base_models import InputFormat
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import argparse
+import asyncio
+import glob
+import json
+import multiprocessing
+import os
+import time
+import traceback
+
+
+class ResourcePool:
+    """
+    An executor with a fixed number of slots, plus the bookkeeping needed to
+    report how busy it was.
+
+    Work is only handed to the executor once a slot is free, so the measured
+    busy time is time spent working, not time spent queued inside the executor.
+    """
+
+    def __init__(self, name, executor, slots):
+        self.name = name
+        self.executor = executor
+        self.slots = slots
+        self.semaphore = asyncio.Semaphore(slots)
+        self.busy_seconds = 0.0
+        self.tasks = 0
+        self.active = 0
+        self.peak_active = 0
+
+    async def run(self, fn, *fn_args):
+        async with self.semaphore:
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+            start = time.time()
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *fn_args)
+            finally:
+                self.busy_seconds += time.time() - start
+                self.tasks += 1
+                self.active -= 1
+
+    def report(self, wall_seconds):
+        capacity = self.slots * wall_seconds
+        return {
+            'slots': self.slots,
+            'tasks': self.tasks,
+            'busy_seconds': self.busy_seconds,
+            'peak_active': self.peak_active,
+            'utilization': self.busy_seconds / capacity if capacity > 0 else 0.0,
+        }
+
+
+def _init_parse_worker():
+    # Text-layer papers only use the figures-only converter; the full one handles the rest
+    for figures_only in (True, False):
+        get_doc_converter(figures_only=figures_only).initialize_pipeline(InputFormat.PDF)
+
+
+def _init_render_worker(soffice_profile_dir):
+    # One profile root per process; each keeps its own pool of warm profiles
+    set_soffice_profile_root(os.path.join(soffice_profile_dir, str(os.getpid())))
+    warm_up_soffice()
+
+
+def _convert_in_worker(run):
+    run.run_stages(run.CONVERT_STAGES)
+    return run
+
+
+def _render_in_worker(run):
+    run.run_stages(run.RENDER_STAGES)
+    return run
+
+
+def find_papers(data_dir):
+    return sorted(glob.glob(os.path.join(data_dir, '*', 'paper.pdf')))
+
+
+def make_paper_args(pipeline_parser, pipeline_argv, poster_path, runs_dir):
+    args = pipeline_parser.parse_args(pipeline_argv)
+    args.poster_path = poster_path
+    paper_name = os.path.basename(os.path.dirname(poster_path)).replace(' ', '_')
+    args.run_dir = os.path.join(runs_dir, paper_name)
+    return args
+
+
+async def process_paper(args, layout_models, pools):
+    """
+    Move one paper through the pools: parse -> LLM stages -> render.
+
+    The PosterRun travels to the parse and render processes and back; the LLM
+    stages run on a thread of this process and update it in place.
+    """
+    run = PosterRun(args, layout_models=layout_models)
+    run = await pools['parse'].run(_convert_in_worker, run)
+    await pools['llm'].run(run.run_llm_stages)
+    run = await pools['render'].run(_render_in_worker, run)
+    return run.finish()
+
+
+async def run_batch(batch_args, pipeline_argv):
+    pipeline_parser = build_parser()
+    poster_paths = find_papers(batch_args.data_dir)
+    if batch_args.limit is not None:
+        poster_paths = poster_paths[:batch_args.limit]
+    print(f'📚 {len(poster_paths)} papers under {batch_args.data_dir}')
+
+    layout_models = load_layout_models()
+
+    spawn = multiprocessing.get_context('spawn')
+    parse_executor = ProcessPoolExecutor(
+        max_workers=batch_args.parse_workers, mp_context=spawn, initializer=_init_parse_worker
+    )
+    llm_executor = ThreadPoolExecutor(max_workers=batch_args.llm_slots)
+    render_executor = ProcessPoolExecutor(
+        max_workers=batch_args.render_workers, mp_context=spawn,
+        initializer=_init_render_worker, initargs=(batch_args.soffice_profile_dir,)
+    )
+    pools = {
+        'parse': ResourcePool('parse', parse_executor, batch_args.parse_workers),
+        'llm': ResourcePool('llm', llm_executor, batch_args.llm_slots),
+        'render': ResourcePool('render', render_executor, batch_args.render_workers),
+    }
+
+    async def _process(poster_path):
+        record = {'poster_path': poster_path}
+        try:
+            args = make_paper_args(pipeline_parser, pipeline_argv, poster_path, batch_args.runs_dir)
+            record['result'] = await process_paper(args, layout_models, pools)
+            record['status'] = 'done'
+            print(f'✅ Finished {poster_path}')
+        except Exception:
+            record['status'] = 'failed'
+            record['error'] = traceback.format_exc()
+            print(f'❌ Failed {poster_path}\n{record["error"]}')
+        return record
+
+    start_time = time.time()
+    try:
+        records = await asyncio.gather(*(_process(p) for p in poster_paths))
+    finally:
+        for pool in pools.values():
+            pool.executor.shutdown(wait=True)
+    wall_seconds = time.time() - start_time
+
+    num_done = sum(r['status'] == 'done' for r in records)
+    report = {
+        'papers': len(records),
+        'done': num_done,
+        'failed': len(records) - num_done,
+        'wall_seconds': wall_seconds,
+        'posters_per_hour': num_done * 3600 / wall_seconds if wall_seconds > 0 else 0.0,
+        'pools': {name: pool.report(wall_seconds) for name, pool in pools.items()},
+        'runs': records,
+    }
+    return report
+
+
+def print_report(report):
+    print('\n' + '=' * 60)
+    print(f'📊 {report["done"]}/{report["papers"]} posters in {report["wall_seconds"]:.1f} seconds '
+          f'({report["posters_per_hour"]:.1f} posters/hour)')
+    for name, pool in report['pools'].items():
+        print(f'   {name:<7} slots={pool["slots"]:<3} tasks={pool["tasks"]:<4} '
+              f'busy={pool["busy_seconds"]:.1f}s utilization={pool["utilization"]:.0%}')
+    print('=' * 60)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Batch poster generation over a dataset directory. '
+                    'Unrecognized options are passed to every new_pipeline run.'
+    )
+    parser.add_argument('--data_dir', type=str, default='Paper2Poster-data',
+                        help='Directory with one <paper_name>/paper.pdf per paper')
+    parser.add_argument('--runs_dir', type=str, default='runs',
+                        help='Intermediates of each paper go to <runs_dir>/<paper_name>')
+    parser.add_argument('--limit', type=int, default=None)
+    parser.add_argument('--parse_workers', type=int, default=2,
+                        help='Processes running docling/marker conversion')
+    parser.add_argument('--llm_slots', type=int, default=4,
+                        help='Papers in the LLM/VLM stages at once; each may issue up to --max_workers '
+                             'concurrent calls, so keep llm_slots * max_workers within the provider rate limit')
+    parser.add_argument('--render_workers', type=int, default=2,
+                        help='Processes rendering with python-pptx and LibreOffice')
+    parser.add_argument('--soffice_profile_dir', type=str, default='tmp/soffice_profiles')
+    batch_args, pipeline_argv = parser.parse_known_args()
+
+    report = asyncio.run(run_batch(batch_args, pipeline_argv))
+    print_report(report)
+
+    os.makedirs(batch_args.runs_dir, exist_ok=True)
+    report_path = os.path.join(batch_args.runs_dir, 'batch_report.json')
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f'Batch report saved to {report_path}')
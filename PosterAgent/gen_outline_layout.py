@@ -13,6 +13,10 @@ from camel.messages import BaseMessage
 
 from utils.pptx_utils import *
 from utils.wei_utils import *
+from utils.run_context import get_run_context, project_path
+from utils.prompt_utils import layout_prompt, paper_content_arg
+from utils.json_schemas import structured_config, schema_errors
+from utils.asset_store import load_asset_index
 
 import pickle as pkl
 import argparse
@@ -23,6 +27,8 @@ IMAGE_SCALE_RATIO_MIN = 50
 IMAGE_SCALE_RATIO_MAX = 40
 TABLE_SCALE_RATIO_MIN = 100
 TABLE_SCALE_RATIO_MAX = 80
+# Figure entry keys that only locate the asset; kept out of the filter prompt
+FILTER_PROMPT_EXCLUDED_KEYS = ('asset',)
 
 def compute_tp(raw_content_json):
     total_length = 0
@@ -243,43 +249,68 @@ def validate_and_adjust_subsections(section_bbox, subsection_bboxes):
     return False, revised
 
 def filter_image_table(args, filter_config):
-    images = json.load(open(f'<{args.model_name_t}_{args.model_name_v}>_images_and_tables/{args.poster_name}_images.json', 'r'))
-    tables = json.load(open(f'<{args.model_name_t}_{args.model_name_v}>_images_and_tables/{args.poster_name}_tables.json', 'r'))
-    doc_json = json.load(open(f'contents/<{args.model_name_t}_{args.model_name_v}>_{args.poster_name}_raw_content.json', 'r'))
+    ctx = get_run_context(args)
+    images = json.load(open(ctx.path(f'<{args.model_name_t}_{args.model_name_v}>_images_and_tables/{args.poster_name}_images.json'), 'r'))
+    tables = json.load(open(ctx.path(f'<{args.model_name_t}_{args.model_name_v}>_images_and_tables/{args.poster_name}_tables.json'), 'r'))
+    doc_json = json.load(open(ctx.path(f'contents/<{args.model_name_t}_{args.model_name_v}>_{args.poster_name}_raw_content.json'), 'r'))
     agent_filter = 'image_table_filter_agent'
-    with open(f"utils/prompt_templates/{agent_filter}.yaml", "r", encoding="utf-8") as f:
+    with open(project_path(f"utils/prompt_templates/{agent_filter}.yaml"), "r", encoding="utf-8") as f:
         config_filter = yaml.safe_load(f)
+    # Sizes come from the asset index, so no crop is decoded here
+    asset_index = load_asset_index(
+        ctx.path(f'<{args.model_name_t}_{args.model_name_v}>_images_and_tables/{args.poster_name}'), args.poster_name
+    )
+
+    def _information(v):
+        info = {key: copy.deepcopy(value) for key, value in v.items() if key not in FILTER_PROMPT_EXCLUDED_KEYS}
+        asset = asset_index[v['asset']]
+        info['width'] = asset['width']
+        info['height'] = asset['height']
+        info['figure_aspect'] = asset['aspect']
+        return info
 
     image_information = {}
     for k, v in images.items():
-        image_information[k] = copy.deepcopy(v)
-        image_information[k]['min_width'] = v['width'] // IMAGE_SCALE_RATIO_MIN
-        image_information[k]['min_height'] = v['height'] // IMAGE_SCALE_RATIO_MIN
-        image_information[k]['max_width'] = v['width'] // IMAGE_SCALE_RATIO_MAX
-        image_information[k]['max_height'] = v['height'] // IMAGE_SCALE_RATIO_MAX
+        info = _information(v)
+        info['min_width'] = info['width'] // IMAGE_SCALE_RATIO_MIN
+        info['min_height'] = info['height'] // IMAGE_SCALE_RATIO_MIN
+        info['max_width'] = info['width'] // IMAGE_SCALE_RATIO_MAX
+        info['max_height'] = info['height'] // IMAGE_SCALE_RATIO_MAX
+        image_information[k] = info
 
     table_information = {}
     for k, v in tables.items():
-        table_information[k] = copy.deepcopy(v)
-        table_information[k]['min_width'] = v['width'] // TABLE_SCALE_RATIO_MIN
-        table_information[k]['min_height'] = v['height'] // TABLE_SCALE_RATIO_MIN
-        table_information[k]['max_width'] = v['width'] // TABLE_SCALE_RATIO_MAX
-        table_information[k]['max_height'] = v['height'] // TABLE_SCALE_RATIO_MAX
+        info = _information(v)
+        info['min_width'] = info['width'] // TABLE_SCALE_RATIO_MIN
+        info['min_height'] = info['height'] // TABLE_SCALE_RATIO_MIN
+        info['max_width'] = info['width'] // TABLE_SCALE_RATIO_MAX
+        info['max_height'] = info['height'] // TABLE_SCALE_RATIO_MAX
+        table_information[k] = info
 
-    filter_actor_sys_msg = config_filter['system_prompt']
+    filter_jinja_args = {
+        'json_content': paper_content_arg(filter_config, doc_json),
+        'table_information': json.dumps(table_information, indent=4),
+        'image_information': json.dumps(image_information, indent=4),
+    }
+    jinja_env = Environment(undefined=StrictUndefined)
+    filter_prompt = jinja_env.from_string(config_filter["template"])
+    filter_actor_sys_msg, filter_user_msg = layout_prompt(
+        filter_config, config_filter['system_prompt'], filter_prompt.render(**filter_jinja_args), doc_json
+    )
 
+    filter_model_config = structured_config(filter_config, 'image_table_filter')['model_config']
     if args.model_name_t.startswith('vllm_qwen'):
         filter_model = ModelFactory.create(
             model_platform=filter_config['model_platform'],
             model_type=filter_config['model_type'],
-            model_config_dict=filter_config['model_config'],
+            model_config_dict=filter_model_config,
             url=filter_config['url'],
         )
     else:
         filter_model = ModelFactory.create(
             model_platform=filter_config['model_platform'],
             model_type=filter_config['model_type'],
-            model_config_dict=filter_config['model_config'],
+            model_config_dict=filter_model_config,
         )
 
     filter_actor_agent = ChatAgent(
@@ -288,30 +319,34 @@ def filter_image_table(args, filter_config):
         message_window_size=10,
     )
 
-    filter_jinja_args = {
-        'json_content': doc_json,
-        'table_information': json.dumps(table_information, indent=4),
-        'image_information': json.dumps(image_information, indent=4),
-    }
-    jinja_env = Environment(undefined=StrictUndefined)
-    filter_prompt = jinja_env.from_string(config_filter["template"])
-    filter_actor_agent.reset()
-    response = filter_actor_agent.step(filter_prompt.render(**filter_jinja_args))
-    input_token, output_token = account_token(response)
-    response_json = get_json_from_response(response.msgs[0].content)
+    input_token, output_token = 0, 0
+    for attempt in range(3):
+        filter_actor_agent.reset()
+        response = filter_actor_agent.step(filter_user_msg)
+        step_input_token, step_output_token = account_token(response)
+        input_token += step_input_token
+        output_token += step_output_token
+        response_json = get_json_from_response(response.msgs[0].content)
+        errors = schema_errors(response_json, 'image_table_filter')
+        if not errors:
+            break
+        print(f'Error: Invalid response ({"; ".join(errors[:3])}), retrying...')
+    else:
+        raise RuntimeError(f'The image/table filter did not follow the format: {errors[:3]}')
     table_information = response_json['table_information']
     image_information = response_json['image_information']
-    json.dump(images, open(f'<{args.model_name_t}_{args.model_name_v}>_images_and_tables/{args.poster_name}_images_filtered.json', 'w'), indent=4)
-    json.dump(tables, open(f'<{args.model_name_t}_{args.model_name_v}>_images_and_tables/{args.poster_name}_tables_filtered.json', 'w'), indent=4)
+    json.dump(images, open(ctx.path(f'<{args.model_name_t}_{args.model_name_v}>_images_and_tables/{args.poster_name}_images_filtered.json'), 'w'), indent=4)
+    json.dump(tables, open(ctx.path(f'<{args.model_name_t}_{args.model_name_v}>_images_and_tables/{args.poster_name}_tables_filtered.json'), 'w'), indent=4)
 
     return input_token, output_token
 
 def gen_outline_layout_v2(args, actor_config):
     total_input_token, total_output_token = 0, 0
     agent_name = 'poster_planner_new_v2'
-    doc_json = json.load(open(f'contents/<{args.model_name_t}_{args.model_name_v}>_{args.poster_name}_raw_content.json', 'r'))
-    filtered_table_information = json.load(open(f'<{args.model_name_t}_{args.model_name_v}>_images_and_tables/{args.poster_name}_tables_filtered.json', 'r'))
-    filtered_image_information = json.load(open(f'<{args.model_name_t}_{args.model_name_v}>_images_and_tables/{args.poster_name}_images_filtered.json', 'r'))
+    ctx = get_run_context(args)
+    doc_json = json.load(open(ctx.path(f'contents/<{args.model_name_t}_{args.model_name_v}>_{args.poster_name}_raw_content.json'), 'r'))
+    filtered_table_information = json.load(open(ctx.path(f'<{args.model_name_t}_{args.model_name_v}>_images_and_tables/{args.poster_name}_tables_filtered.json'), 'r'))
+    filtered_image_information = json.load(open(ctx.path(f'<{args.model_name_t}_{args.model_name_v}>_images_and_tables/{args.poster_name}_images_filtered.json'), 'r'))
 
     filtered_table_information_captions = {}
     filtered_image_information_captions = {}
@@ -326,7 +361,7 @@ def gen_outline_layout_v2(args, actor_config):
             v['caption']
         }
 
-    with open(f"utils/prompt_templates/{agent_name}.yaml", "r", encoding="utf-8") as f:
+    with open(project_path(f"utils/prompt_templates/{agent_name}.yaml"), "r", encoding="utf-8") as f:
         planner_config = yaml.safe_load(f)
 
     compute_tp(doc_json)
@@ -334,41 +369,51 @@ def gen_outline_layout_v2(args, actor_config):
     jinja_env = Environment(undefined=StrictUndefined)
     outline_template = jinja_env.from_string(planner_config["template"])
     planner_jinja_args = {
-        'json_content': doc_json,
+        'json_content': paper_content_arg(actor_config, doc_json),
         'table_information': filtered_table_information_captions,
         'image_information': filtered_image_information_captions,
     }
+    planner_sys_msg, planner_prompt = layout_prompt(
+        actor_config, planner_config['system_prompt'], outline_template.render(**planner_jinja_args), doc_json
+    )
 
+    planner_model_config = structured_config(actor_config, 'outline')['model_config']
     if args.model_name_t.startswith('vllm_qwen'):
         planner_model = ModelFactory.create(
             model_platform=actor_config['model_platform'],
             model_type=actor_config['model_type'],
-            model_config_dict=actor_config['model_config'],
+            model_config_dict=planner_model_config,
             url=actor_config['url'],
         )
     else:
         planner_model = ModelFactory.create(
             model_platform=actor_config['model_platform'],
             model_type=actor_config['model_type'],
-            model_config_dict=actor_config['model_config'],
+            model_config_dict=planner_model_config,
         )
 
 
     planner_agent = ChatAgent(
-        system_message=planner_config['system_prompt'],
+        system_message=planner_sys_msg,
         model=planner_model,
         message_window_size=10,
     )
 
     print(f'Generating outline...')
-    planner_prompt = outline_template.render(**planner_jinja_args)
-    planner_agent.reset()
-    response = planner_agent.step(planner_prompt)
-    input_token, output_token = account_token(response)
-    total_input_token += input_token
-    total_output_token += output_token
-
-    figure_arrangement = get_json_from_response(response.msgs[0].content)
+    for attempt in range(3):
+        planner_agent.reset()
+        response = planner_agent.step(planner_prompt)
+        input_token, output_token = account_token(response)
+        total_input_token += input_token
+        total_output_token += output_token
+
+        figure_arrangement = get_json_from_response(response.msgs[0].content)
+        errors = schema_errors(figure_arrangement, 'outline')
+        if not errors:
+            break
+        print(f'Error: Invalid response ({"; ".join(errors[:3])}), retrying...')
+    else:
+        raise RuntimeError(f'The outline did not follow the format: {errors[:3]}')
 
     print(f'Figure arrangement: {json.dumps(figure_arrangement, indent=4)}')
 
@@ -1,3 +1,5 @@
+import contextvars
+import os
 import tempfile
 import shutil
 from dotenv import load_dotenv
@@ -13,6 +15,10 @@ from utils.src.utils import ppt_to_images
 from PIL import Image
 
 from utils.wei_utils import *
+from utils.run_context import get_run_context, project_path
+from utils.cache_utils import json_sha256
+from utils.tracing import trace_context
+from utils.json_schemas import structured_config, schema_errors
 
 from utils.pptx_utils import *
 from utils.critic_utils import *
@@ -161,50 +167,59 @@ def render_textbox(text_arrangement, textbox_content, tmp_dir):
 
 def gen_poster_title_content(args, actor_config):
     total_input_token, total_output_token = 0, 0
-    raw_content = json.load(open(f'contents/<{args.model_name_t}_{args.model_name_v}>_{args.poster_name}_raw_content.json', 'r'))
+    ctx = get_run_context(args)
+    raw_content = json.load(open(ctx.path(f'contents/<{args.model_name_t}_{args.model_name_v}>_{args.poster_name}_raw_content.json'), 'r'))
     actor_agent_name = 'poster_title_agent'
 
     title_string = raw_content['meta']
 
-    with open(f'utils/prompt_templates/{actor_agent_name}.yaml', "r") as f:
+    with open(project_path(f'utils/prompt_templates/{actor_agent_name}.yaml'), "r") as f:
         content_config = yaml.safe_load(f)
     jinja_env = Environment(undefined=StrictUndefined)
     template = jinja_env.from_string(content_config["template"])
 
+    actor_model_config = structured_config(actor_config, 'poster_title')['model_config']
     if args.model_name_t == 'vllm_qwen':
         actor_model = ModelFactory.create(
             model_platform=actor_config['model_platform'],
             model_type=actor_config['model_type'],
-            model_config_dict=actor_config['model_config'],
+            model_config_dict=actor_model_config,
             url=actor_config['url'],
         )
     else:
         actor_model = ModelFactory.create(
             model_platform=actor_config['model_platform'],
             model_type=actor_config['model_type'],
-            model_config_dict=actor_config['model_config']
+            model_config_dict=actor_model_config
         )
 
-    actor_sys_msg = content_config['system_prompt']
-    actor_agent = ChatAgent(
-        system_message=actor_sys_msg,
-        model=actor_model,
-        message_window_size=30
-    )
-
     jinja_args = {
         'title_string': title_string,
         'title_font_size': getattr(args, 'poster_title_font_size', None) or getattr(args, 'title_font_size', None),
         'author_font_size': getattr(args, 'poster_author_font_size', None) or getattr(args, 'author_font_size', None),
     }
+    # Only the paper meta goes in; the title prompt is too small to gain from the shared paper prefix
+    actor_sys_msg = content_config['system_prompt']
     prompt = template.render(**jinja_args)
+    actor_agent = ChatAgent(
+        system_message=actor_sys_msg,
+        model=actor_model,
+        message_window_size=30
+    )
     # Step the actor_agent and track tokens
-    actor_agent.reset()
-    response = actor_agent.step(prompt)
-    input_token, output_token = account_token(response)
-    total_input_token += input_token
-    total_output_token += output_token
-    result_json = get_json_from_response(response.msgs[0].content)
+    for attempt in range(3):
+        actor_agent.reset()
+        response = actor_agent.step(prompt)
+        input_token, output_token = account_token(response)
+        total_input_token += input_token
+        total_output_token += output_token
+        result_json = get_json_from_response(response.msgs[0].content)
+        errors = schema_errors(result_json, 'poster_title')
+        if not errors:
+            break
+        print(f'Error: Invalid title response ({"; ".join(errors[:3])}), retrying...')
+    else:
+        raise RuntimeError(f'The title agent did not follow the format: {errors[:3]}')
 
     return result_json, total_input_token, total_output_token
 
@@ -218,8 +233,9 @@ def gen_bullet_point_content(args, actor_config, critic_config, agent_modify=Tru
     total_input_token_t = total_output_token_t = 0
     total_input_token_v = total_output_token_v = 0
 
-    raw_content = json.load(open(f'contents/<{args.model_name_t}_{args.model_name_v}>_{args.poster_name}_raw_content.json', 'r'))
-    with open(f'tree_splits/<{args.model_name_t}_{args.model_name_v}>_{args.poster_name}_tree_split_{args.index}.json', 'r') as f:
+    ctx = get_run_context(args)
+    raw_content = json.load(open(ctx.path(f'contents/<{args.model_name_t}_{args.model_name_v}>_{args.poster_name}_raw_content.json'), 'r'))
+    with open(ctx.path(f'tree_splits/<{args.model_name_t}_{args.model_name_v}>_{args.poster_name}_tree_split_{args.index}.json'), 'r') as f:
         tree_split_results = json.load(f)
 
     panels = tree_split_results['panels']
@@ -231,9 +247,9 @@ def gen_bullet_point_content(args, actor_config, critic_config, agent_modify=Tru
     else:
         critic_agent_name = 'critic_overlap_agent_v3'
 
-    with open(f"utils/prompt_templates/{actor_agent_name}.yaml", "r") as f:
+    with open(project_path(f"utils/prompt_templates/{actor_agent_name}.yaml"), "r") as f:
         content_config = yaml.safe_load(f)
-    with open(f"utils/prompt_templates/{critic_agent_name}.yaml", "r") as f:
+    with open(project_path(f"utils/prompt_templates/{critic_agent_name}.yaml"), "r") as f:
         critic_content_config = yaml.safe_load(f)
 
     jinja_env = Environment(undefined=StrictUndefined)
@@ -241,8 +257,8 @@ def gen_bullet_point_content(args, actor_config, critic_config, agent_modify=Tru
     critic_template = jinja_env.from_string(critic_content_config["template"])
 
     # Preload images once (each worker can reopen if needed, or just pass paths)
-    neg_img_path = 'assets/overflow_example_v2/neg.jpg'
-    pos_img_path = 'assets/overflow_example_v2/pos.jpg'
+    neg_img_path = project_path('assets/overflow_example_v2/neg.jpg')
+    pos_img_path = project_path('assets/overflow_example_v2/pos.jpg')
 
     # Group text arrangements by panel_id for O(1) lookup in workers
     from collections import defaultdict
@@ -253,6 +269,15 @@ def gen_bullet_point_content(args, actor_config, critic_config, agent_modify=Tru
     for k in textboxes_by_panel:
         textboxes_by_panel[k] = sorted(textboxes_by_panel[k], key=lambda x: x.get('textbox_id', 0))
 
+    # Finished sections are kept here so a resumed run only redoes the missing ones
+    sections_dir = ctx.makedirs(f'contents/<{args.model_name_t}_{args.model_name_v}>_{args.poster_name}_bullet_point_sections_{args.index}')
+    resume = getattr(args, 'resume', False)
+    section_options = [
+        args.model_name_t, args.model_name_v, args.estimate_chars, args.no_blank_detection,
+        args.ablation_no_commenter, args.ablation_no_example, agent_modify,
+        actor_config.get('structured_output', False),
+    ]
+
     # ----------------------- Worker (defined INSIDE main fn) -----------------------
     def _process_section(i):
         """
@@ -265,8 +290,6 @@ def gen_bullet_point_content(args, actor_config, critic_config, agent_modify=Tru
         arrangement = panels[i]
         num_textboxes = 2 if arrangement.get('gp', 0) > 0 else 1
 
-        local_tmp_dir = tempfile.mkdtemp(prefix=f"sec_{i}_", dir=tmp_dir)
-
         jinja_args = {
             'summary_of_section': raw_content['sections'][i]['content'],
             'number_of_textboxes': num_textboxes,
@@ -278,19 +301,31 @@ def gen_bullet_point_content(args, actor_config, critic_config, agent_modify=Tru
         target_textboxes = textboxes_by_panel[i][1:]  # skip first (section title)
         total_expected_length = sum(tb['num_chars'] for tb in target_textboxes)
 
+        section_path = os.path.join(sections_dir, f'section_{i}.json')
+        section_key = json_sha256([jinja_args, target_textboxes, section_options])
+        if resume and os.path.exists(section_path):
+            with open(section_path, 'r') as f:
+                section_record = json.load(f)
+            if section_record['key'] == section_key:
+                print(f'Section {i}: Reusing result from the previous run')
+                return (i, section_record['result'], *section_record['tokens'])
+
+        local_tmp_dir = tempfile.mkdtemp(prefix=f"sec_{i}_", dir=tmp_dir)
+
         # Create fresh models & agents per thread for safety
+        actor_model_config = structured_config(actor_config, 'bullet_point')['model_config']
         if args.model_name_t.startswith('vllm_qwen'):
             actor_model = ModelFactory.create(
                 model_platform=actor_config['model_platform'],
                 model_type=actor_config['model_type'],
-                model_config_dict=actor_config['model_config'],
+                model_config_dict=actor_model_config,
                 url=actor_config['url'],
             )
         else:
             actor_model = ModelFactory.create(
                 model_platform=actor_config['model_platform'],
                 model_type=actor_config['model_type'],
-                model_config_dict=actor_config['model_config']
+                model_config_dict=actor_model_config
             )
         if args.model_name_v.startswith('vllm_qwen'):
             critic_model = ModelFactory.create(
@@ -306,17 +341,25 @@ def gen_bullet_point_content(args, actor_config, critic_config, agent_modify=Tru
                 model_config_dict=critic_config['model_config']
             )
 
+        # Only the section's own summary goes in; prepending the whole paper would cost more than caching saves
+        prompt = template.render(**jinja_args)
         actor_agent = ChatAgent(system_message=content_config['system_prompt'], model=actor_model, message_window_size=30)
         critic_agent = ChatAgent(system_message=critic_content_config['system_prompt'], model=critic_model, message_window_size=10)
 
-        prompt = template.render(**jinja_args)
-        actor_agent.reset()
-        response = actor_agent.step(prompt)
-        t_in, t_out = account_token(response)
-        local_t_in += t_in
-        local_t_out += t_out
+        for attempt in range(3):
+            actor_agent.reset()
+            response = actor_agent.step(prompt)
+            t_in, t_out = account_token(response)
+            local_t_in += t_in
+            local_t_out += t_out
 
-        result_json = get_json_from_response(response.msgs[0].content)
+            result_json = get_json_from_response(response.msgs[0].content)
+            errors = schema_errors(result_json, 'bullet_point')
+            if not errors:
+                break
+            print(f'Section {i}: Invalid response ({"; ".join(errors[:3])}), retrying...')
+        else:
+            raise RuntimeError(f'Section {i}: the content agent did not follow the format: {errors[:3]}')
 
         max_attempts = 5
         num_attempts = 0
@@ -421,16 +464,28 @@ def gen_bullet_point_content(args, actor_config, critic_config, agent_modify=Tru
                 shutil.rmtree(local_tmp_dir)
             except Exception as e:
                 print(f"Error cleaning up temp dir {local_tmp_dir}: {e}")
+
+        with open(section_path, 'w') as f:
+            json.dump({
+                'key': section_key,
+                'result': result_json,
+                'tokens': [local_t_in, local_t_out, local_v_in, local_v_out],
+            }, f, indent=2)
         return i, result_json, local_t_in, local_t_out, local_v_in, local_v_out
 
+    def _traced_section(i):
+        with trace_context(section=i):
+            return _process_section(i)
+
     # ----------------------- Parallel execution -----------------------
     max_workers = getattr(args, 'max_workers', 4)
     results = {}
     lock = threading.Lock()
 
     with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        # Each section runs in a copy of the caller's context so its spans keep the poster/stage tags
         futures = {
-            ex.submit(_process_section, i): i
+            ex.submit(contextvars.copy_context().run, _traced_section, i): i
             for i in range(1, len(raw_content['sections']))
         }
         for fut in as_completed(futures):
@@ -454,9 +509,10 @@ def gen_bullet_point_content(args, actor_config, critic_config, agent_modify=Tru
 
     json.dump(
         bullet_point_content,
-        open(f'contents/<{args.model_name_t}_{args.model_name_v}>_{args.poster_name}_bullet_point_content_{args.index}.json', 'w'),
+        open(ctx.path(f'contents/<{args.model_name_t}_{args.model_name_v}>_{args.poster_name}_bullet_point_content_{args.index}.json'), 'w'),
         indent=2
     )
+    shutil.rmtree(sections_dir, ignore_errors=True)
 
     return total_input_token_t, total_output_token_t, total_input_token_v, total_output_token_v
 
@@ -1,7 +1,10 @@
-from PosterAgent.parse_raw import parse_raw, gen_image_and_table
+from PosterAgent.parse_raw import (
+    parse_raw, convert_pdf, gen_image_and_table, IMAGE_RESOLUTION_SCALE, PREVIEW_IMAGE_SCALE,
+    RAW_CONTENT_PROMPTS, RAW_CONTENT_MAP_PROMPT, RAW_CONTENT_REDUCE_PROMPT, DOCLING_CACHE_DIR
+)
 from PosterAgent.gen_outline_layout import filter_image_table, gen_outline_layout_v2
 from utils.wei_utils import get_agent_config, utils_functions, run_code, scale_to_target_area, char_capacity
-from PosterAgent.tree_split_layout import main_train, main_inference, get_arrangments_in_inches, split_textbox, to_inches
+from PosterAgent.tree_split_layout import load_layout_models, main_inference, get_arrangments_in_inches, split_textbox, to_inches
 from PosterAgent.gen_pptx_code import generate_poster_code
 from utils.src.utils import ppt_to_images
 from PosterAgent.gen_poster_content import gen_bullet_point_content
@@ -15,8 +18,20 @@ from utils.config_utils import (
 )
 from utils.style_utils import apply_all_styles
 from utils.theme_utils import get_default_theme, create_theme_with_alignment, resolve_colors
+from utils.cache_utils import ArtifactCache, DEFAULT_CACHE_DIR, file_sha256, json_sha256
+from utils.run_context import get_run_context, project_path
+from utils.run_manifest import RunManifest
+from utils.raster_utils import placed_render_scale, render_pdf_region, encode_placed_image, png_bytes
+from utils.text_layer import TEXT_LAYER_VERSION
+from utils.asset_store import ASSET_STORE_VERSION, asset_file, load_asset_index
+from utils.tracing import configure_tracing, span, trace_context
+
+from PIL import Image
 
+from concurrent.futures import ThreadPoolExecutor
 import argparse
+import contextvars
+import copy
 import json
 import os
 import time
@@ -24,8 +39,72 @@ import shutil
 
 units_per_inch = 25
 
-if __name__ == '__main__':
+# Background logo lookups; network bound, shared by all runs of the process
+_logo_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='logo')
+
+
+def prompt_template_sha(agent_name):
+    return file_sha256(project_path(f'utils/prompt_templates/{agent_name}.yaml'))
 
+
+def stage_tokens(result, cache_hit):
+    """Tokens actually spent by a stage; a cache hit spends none."""
+    if cache_hit:
+        return 0, 0
+    return result['input_token'], result['output_token']
+
+
+def strip_figure_paths(figure_info):
+    """Drop file paths from figure records so hashes do not depend on where a run lives."""
+    if isinstance(figure_info, list):
+        return [{k: v for k, v in f.items() if not k.endswith('_path')} for f in figure_info]
+    return {
+        k: {kk: vv for kk, vv in v.items() if not kk.endswith('_path')}
+        for k, v in figure_info.items()
+    }
+
+
+def relocate_figure_json(json_path, figure_dir):
+    """Point the image/table paths of a restored figure json at `figure_dir`."""
+    with open(json_path, 'r') as f:
+        figure_info = json.load(f)
+    for v in figure_info.values():
+        for key in v:
+            if key.endswith('_path') and v[key]:
+                v[key] = f'{figure_dir}/{os.path.basename(v[key])}'
+    with open(json_path, 'w') as f:
+        json.dump(figure_info, f, indent=4)
+
+# Portrait (width, height) in inches; append "L" for landscape, e.g. "A0L"
+NAMED_POSTER_SIZES = {
+    'A0': (33.1, 46.8),
+    'A1': (23.4, 33.1),
+    'A2': (16.5, 23.4),
+}
+
+
+def parse_poster_sizes(sizes):
+    """Parse a --sizes value into (label, width_inches, height_inches) tuples."""
+    parsed = []
+    for spec in sizes.split(','):
+        spec = spec.strip()
+        if not spec:
+            continue
+        name = spec.upper()
+        if name in NAMED_POSTER_SIZES:
+            width, height = NAMED_POSTER_SIZES[name]
+        elif name.endswith('L') and name[:-1] in NAMED_POSTER_SIZES:
+            height, width = NAMED_POSTER_SIZES[name[:-1]]
+        else:
+            try:
+                width, height = (float(v) for v in name.split('X'))
+            except ValueError:
+                raise ValueError(f'Invalid poster size "{spec}", expected WIDTHxHEIGHT or one of {list(NAMED_POSTER_SIZES)}')
+        parsed.append((spec.replace(' ', ''), width, height))
+    return parsed
+
+
+def build_parser():
     parser = argparse.ArgumentParser(description='Poster Generation Pipeline with Logo Support')
     parser.add_argument('--poster_path', type=str)
     parser.add_argument('--model_name_t', type=str, default='4o')
@@ -33,10 +112,45 @@ if __name__ == '__main__':
     parser.add_argument('--index', type=int, default=0)
     parser.add_argument('--poster_name', type=str, default=None)
     parser.add_argument('--tmp_dir', type=str, default='tmp')
+    parser.add_argument('--run_dir', type=str, default=None,
+                       help='Root all intermediates of this run under this directory (default: current directory)')
     parser.add_argument('--estimate_chars', action='store_true')
     parser.add_argument('--max_workers', type=int, default=10)
+    parser.add_argument('--prefix_caching', action='store_true',
+                       help='Start the figure filter and outline prompts with the same paper-content prefix so '
+                            'OpenAI and a vLLM server started with --enable-prefix-caching can reuse it across calls')
+    parser.add_argument('--structured_output', action='store_true',
+                       help='Constrain agents that answer in JSON to a schema (OpenAI structured outputs, '
+                            'vLLM guided decoding) instead of retrying malformed responses')
     parser.add_argument('--poster_width_inches', type=int, default=None)
     parser.add_argument('--poster_height_inches', type=int, default=None)
+    parser.add_argument('--shard_pages', type=int, default=None,
+                       help='Convert PDFs longer than this many pages in page shards on a process pool')
+    parser.add_argument('--shard_workers', type=int, default=4,
+                       help='Processes used for page shards')
+    parser.add_argument('--raw_content_chunk_chars', type=int, default=None,
+                       help='Summarize papers longer than this many characters chunk by chunk in parallel, then merge')
+    parser.add_argument('--layout_candidates', type=int, default=4,
+                       help='Panel trees scored per poster; the best by aspect, text capacity and figure fill is used')
+    parser.add_argument('--figure_samples', type=int, default=8,
+                       help='Figure size draws scored per panel tree')
+    parser.add_argument('--layout_capacity_weight', type=float, default=1.0,
+                       help="Weight of each panel's text capacity vs. its section's text length in the panel "
+                            'tree search (0: aspect ratio only)')
+    parser.add_argument('--max_sections', type=int, default=9,
+                       help='Keep at most this many sections (first 2, last 2 and a sample in between); '
+                            '0 keeps them all. The panel layout search handles 20 in well under a second')
+    parser.add_argument('--docling_text', action='store_true',
+                       help='Take the paper text from the full docling pipeline even where the PDF text layer is clean')
+    parser.add_argument('--save_page_images', action='store_true',
+                       help='Also render and save an image of every PDF page')
+    parser.add_argument('--save_doc_exports', action='store_true',
+                       help='Also save markdown and HTML exports of the parsed document next to the figures')
+    parser.add_argument('--figure_dpi', type=int, default=200,
+                       help='Print resolution figures and tables are re-rendered at for their placed size')
+    parser.add_argument('--figure_format', choices=['auto', 'png', 'jpeg'], default='auto',
+                       help='Encoding of figures in the pptx; auto uses JPEG for photos and PNG for line art')
+    parser.add_argument('--jpeg_quality', type=int, default=85)
     parser.add_argument('--no_blank_detection', action='store_true', help='When overflow is severe, try this option.')
     parser.add_argument('--ablation_no_tree_layout', action='store_true', help='Ablation study: no tree layout')
     parser.add_argument('--ablation_no_commenter', action='store_true', help='Ablation study: no commenter')
@@ -52,418 +166,1087 @@ if __name__ == '__main__':
     parser.add_argument('--use_google_search', action='store_true',
                        help='Use Google Custom Search API for logo search (requires API keys in .env)')
 
-    args = parser.parse_args()
-
-    start_time = time.time()
-
-    os.makedirs(args.tmp_dir, exist_ok=True)
-
-    detail_log = {}
-
-    agent_config_t = get_agent_config(args.model_name_t)
-    agent_config_v = get_agent_config(args.model_name_v)
-    poster_name = args.poster_path.split('/')[-2].replace(' ', '_')
-    if args.poster_name is None:
-        args.poster_name = poster_name
-    else:
-        poster_name = args.poster_name
-    meta_json_path = args.poster_path.replace('paper.pdf', 'meta.json')
-    if args.poster_width_inches is not None and args.poster_height_inches is not None:
-        poster_width = args.poster_width_inches * units_per_inch
-        poster_height = args.poster_height_inches * units_per_inch
-    elif os.path.exists(meta_json_path):
-        meta_json = json.load(open(meta_json_path, 'r'))
-        poster_width = meta_json['width']
-        poster_height = meta_json['height']
-    else:
-        poster_width = 48 * units_per_inch
-        poster_height = 36 * units_per_inch
-
-    poster_width, poster_height = scale_to_target_area(poster_width, poster_height)
-    poster_width_inches = to_inches(poster_width, units_per_inch)
-    poster_height_inches = to_inches(poster_height, units_per_inch)
-
-    if poster_width_inches > 56 or poster_height_inches > 56:
-        # Work out which side is longer, then compute a single scale factor
-        if poster_width_inches >= poster_height_inches:
-            scale_factor = 56 / poster_width_inches
+    # Artifact cache
+    parser.add_argument('--cache_dir', type=str, default=DEFAULT_CACHE_DIR,
+                       help='Content-addressed cache of stage results, shared by all runs')
+    parser.add_argument('--no_cache', action='store_true',
+                       help='Recompute every stage instead of reusing cached results')
+    parser.add_argument('--resume', action='store_true',
+                       help='Restart at the first stage the previous run of this poster did not complete')
+    parser.add_argument('--sizes', type=str, default=None,
+                       help='Comma-separated poster sizes to generate from one content run, '
+                            'as WIDTHxHEIGHT inches or a named size, e.g. "48x36,36x48,A0"')
+    parser.add_argument('--content_reuse_tolerance', type=float, default=0.15,
+                       help='With --sizes, reuse bullet content across sizes whose per-panel text '
+                            'capacity differs by at most this fraction')
+    parser.add_argument('--trace_path', type=str, default=None,
+                       help='Record per-call spans (LLM calls, conversion, soffice, run_code) to this .jsonl or .sqlite file')
+
+    return parser
+
+
+# Options that do not change what a run produces; a run can resume across changes to them
+RESUME_IGNORED_ARGS = {
+    'run_context', 'run_dir', 'resume', 'cache_dir', 'no_cache', 'max_workers', 'trace_path', 'sizes',
+    'shard_pages', 'shard_workers',
+}
+
+
+class PosterRun:
+    """
+    State of one poster pipeline run, split into stages.
+
+    `run()` executes every stage in order. Schedulers that overlap several
+    papers (see `PosterAgent.batch_runner`) call the stage methods themselves,
+    so that parsing, LLM calls and rendering can run on separate resource pools.
+    `layout_models` is an optional `(panel_model_params, figure_model_params)` pair
+    from `load_layout_models()`; long-lived callers pass it in to skip even loading it per poster.
+
+    Completed stages are recorded in a run manifest. With `--resume`, stages the
+    manifest lists as complete (with intact artifacts) are replayed from it and
+    the run restarts at the first incomplete one.
+    """
+
+    # Stage name -> (method, attributes later stages read). Stages with `None`
+    # are cheap, only set up args, and always rerun.
+    STAGES = {
+        'convert': ('convert', []),
+        'raw_content': ('gen_raw_content', ['raw_content_sha']),
+        'filter': ('filter_figures', ['filter_sha']),
+        'outline': ('gen_outline', ['panels', 'figures']),
+        'layout': ('gen_layout', [
+            'panels', 'width_inch', 'height_inch', 'panel_arrangement_inches',
+            'figure_arrangement_inches', 'text_arrangement_inches', 'layout_sha',
+        ]),
+        'style': ('load_style_config', None),
+        'content': ('gen_content', []),
+        'render': ('render', []),
+    }
+    CONVERT_STAGES = ['convert']
+    PLAN_STAGES = ['raw_content', 'filter', 'outline']
+    SIZE_STAGES = ['layout', 'style', 'content']
+    LLM_STAGES = PLAN_STAGES + SIZE_STAGES
+    RENDER_STAGES = ['render']
+
+    def __init__(self, args, layout_models=None):
+        self.start_time = time.time()
+        self.args = args
+        self.layout_models = layout_models
+        if args.trace_path:
+            configure_tracing(args.trace_path)
+
+        self.ctx = get_run_context(args)
+        self.tmp_dir = self.ctx.makedirs(args.tmp_dir)
+
+        self.detail_log = {}
+
+        self.agent_config_t = get_agent_config(
+            args.model_name_t, prefix_caching=args.prefix_caching, structured_output=args.structured_output
+        )
+        self.agent_config_v = get_agent_config(
+            args.model_name_v, prefix_caching=args.prefix_caching, structured_output=args.structured_output
+        )
+        poster_name = args.poster_path.split('/')[-2].replace(' ', '_')
+        if args.poster_name is None:
+            args.poster_name = poster_name
         else:
-            scale_factor = 56 / poster_height_inches
-
-        poster_width_inches  *= scale_factor
-        poster_height_inches *= scale_factor
+            poster_name = args.poster_name
+        self.poster_name = poster_name
+
+        self.total_input_tokens_t, self.total_output_tokens_t = 0, 0
+        self.total_input_tokens_v, self.total_output_tokens_v = 0, 0
+
+        self.cache = ArtifactCache(args.cache_dir, enabled=not args.no_cache)
+        ctx = self.ctx
+        t_v = f'<{args.model_name_t}_{args.model_name_v}>'
+        self.pdf_sha = file_sha256(args.poster_path)
+        self.figure_dir = ctx.path(f'{t_v}_images_and_tables/{args.poster_name}')
+        self.images_json_path = ctx.path(f'{t_v}_images_and_tables/{args.poster_name}_images.json')
+        self.tables_json_path = ctx.path(f'{t_v}_images_and_tables/{args.poster_name}_tables.json')
+        self.images_filtered_path = ctx.path(f'{t_v}_images_and_tables/{args.poster_name}_images_filtered.json')
+        self.tables_filtered_path = ctx.path(f'{t_v}_images_and_tables/{args.poster_name}_tables_filtered.json')
+        self.markdown_path = ctx.path(f'contents/{t_v}_{args.poster_name}_markdown.md')
+        self.raw_content_path = ctx.path(f'contents/{t_v}_{args.poster_name}_raw_content.json')
+
+        self.institution_logo_path = args.institution_logo_path
+        self.conference_logo_path = args.conference_logo_path
+
+        self.logo_future = None
+        self.size_label = None
+        self.content_source = None
+        self.configure_size()
+
+    def configure_size(self):
+        """Set the poster size and everything that depends on it: paths, tmp dir and manifest."""
+        args = self.args
+        ctx = self.ctx
+        t_v = f'<{args.model_name_t}_{args.model_name_v}>'
+
+        meta_json_path = args.poster_path.replace('paper.pdf', 'meta.json')
+        if args.poster_width_inches is not None and args.poster_height_inches is not None:
+            poster_width = args.poster_width_inches * units_per_inch
+            poster_height = args.poster_height_inches * units_per_inch
+        elif os.path.exists(meta_json_path):
+            meta_json = json.load(open(meta_json_path, 'r'))
+            poster_width = meta_json['width']
+            poster_height = meta_json['height']
+        else:
+            poster_width = 48 * units_per_inch
+            poster_height = 36 * units_per_inch
 
-        # convert back to internal units
-        poster_width  = poster_width_inches  * units_per_inch
-        poster_height = poster_height_inches * units_per_inch
+        poster_width, poster_height = scale_to_target_area(poster_width, poster_height)
+        poster_width_inches = to_inches(poster_width, units_per_inch)
+        poster_height_inches = to_inches(poster_height, units_per_inch)
 
-    print(f'Poster size: {poster_width_inches} x {poster_height_inches} inches')
+        if poster_width_inches > 56 or poster_height_inches > 56:
+            # Work out which side is longer, then compute a single scale factor
+            if poster_width_inches >= poster_height_inches:
+                scale_factor = 56 / poster_width_inches
+            else:
+                scale_factor = 56 / poster_height_inches
+
+            poster_width_inches  *= scale_factor
+            poster_height_inches *= scale_factor
+
+            # convert back to internal units
+            poster_width  = poster_width_inches  * units_per_inch
+            poster_height = poster_height_inches * units_per_inch
+
+        self.poster_width, self.poster_height = poster_width, poster_height
+        print(f'Poster size: {poster_width_inches} x {poster_height_inches} inches')
+
+        self.bullet_content_path = ctx.path(f'contents/{t_v}_{args.poster_name}_bullet_point_content_{args.index}.json')
+        self.tree_split_path = ctx.path(f'tree_splits/{t_v}_{args.poster_name}_tree_split_{args.index}.json')
+
+        # Step 8: Create a folder in the output directory
+        self.output_dir = f'{t_v}_generated_posters/{args.poster_path.replace("paper.pdf", "")}'
+        if self.size_label is not None:
+            self.output_dir = os.path.join(self.output_dir, self.size_label)
+            self.tmp_dir = ctx.makedirs(args.tmp_dir, self.size_label)
+        self.pptx_path = os.path.join(self.output_dir, f'{self.poster_name}.pptx')
+
+        manifest_path = ctx.path(f'contents/{t_v}_{args.poster_name}_manifest_{args.index}.json')
+        fingerprint = json_sha256([
+            self.pdf_sha,
+            {k: v for k, v in sorted(vars(args).items()) if k not in RESUME_IGNORED_ARGS},
+        ])
+        if args.resume:
+            self.manifest = RunManifest.load(manifest_path, fingerprint)
+        else:
+            self.manifest = RunManifest(manifest_path, fingerprint)
+        self.resuming = bool(self.manifest.stages)
 
-    total_input_tokens_t, total_output_tokens_t = 0, 0
-    total_input_tokens_v, total_output_tokens_v = 0, 0
+    def log_time(self, key, label, stage_start):
+        time_taken = time.time() - stage_start
+        print(f'{label} time: {time_taken:.2f} seconds')
+        self.detail_log[key] = self.detail_log.get(key, 0) + time_taken
 
     # Step 1: Parse the raw poster
-    input_token, output_token, raw_result = parse_raw(args, agent_config_t, version=2)
-    total_input_tokens_t += input_token
-    total_output_tokens_t += output_token
-
-    _, _, images, tables = gen_image_and_table(args, raw_result)
-
-    print(f'Parsing token consumption: {input_token} -> {output_token}')
-
-    parser_time_taken = time.time() - start_time
-    print(f'Parser time: {parser_time_taken:.2f} seconds')
-    detail_log['parser_time'] = parser_time_taken
-
-    parser_time = time.time()
-
-    detail_log['parser_in_t'] = input_token
-    detail_log['parser_out_t'] = output_token
-
-    # Initialize LogoManager
-    logo_manager = LogoManager()
-    institution_logo_path = args.institution_logo_path
-    conference_logo_path = args.conference_logo_path
-
-    # Auto-detect institution from paper if not provided
-    # Now using the raw_result directly instead of reading from file
-    if not institution_logo_path:
-        print("\n" + "="*60)
-        print("🔍 AUTO-DETECTING INSTITUTION FROM PAPER")
-        print("="*60)
-
-        # Use the raw_result we already have from the parser
-        if raw_result:
-            print(f"📄 Using parsed paper content")
-            # Extract text content from the ConversionResult object
-            try:
-                paper_text = raw_result.document.export_to_markdown()
-            except:
-                # Fallback: try to get text content in another way
-                paper_text = str(raw_result)
-
-            print("🔎 Searching for FIRST AUTHOR's institution...")
-            first_author_inst = logo_manager.extract_first_author_institution(paper_text)
-
-            if first_author_inst:
-                print(f"\n✅ FIRST AUTHOR INSTITUTION: {first_author_inst}")
-                print(f"🔍 Searching for logo: {first_author_inst}")
-
-                inst_logo_path = logo_manager.get_logo_path(first_author_inst, category="institute", use_google=args.use_google_search)
-                if inst_logo_path:
-                    institution_logo_path = str(inst_logo_path)
-                    print(f"✅ Institution logo found: {institution_logo_path}")
+    def convert(self):
+        """Convert the PDF and export its figures (CPU bound)."""
+        stage_start = time.time()
+        args = self.args
+
+        def _convert():
+            documents, paper_text = convert_pdf(
+                args.poster_path,
+                cache_dir=None if args.no_cache else DOCLING_CACHE_DIR,
+                shard_pages=args.shard_pages,
+                shard_workers=args.shard_workers,
+                page_images=args.save_page_images,
+                text_layer=not args.docling_text,
+            )
+            self.ctx.makedirs('contents')
+            with open(self.markdown_path, 'w', encoding='utf-8') as f:
+                f.write(paper_text)
+            _, _, images, tables = gen_image_and_table(args, documents)
+            return {'images': images, 'tables': tables}
+
+        _, convert_hit = self.cache.run_stage(
+            'convert',
+            {
+                'pdf': self.pdf_sha,
+                'images_scale': IMAGE_RESOLUTION_SCALE,
+                'preview_scale': PREVIEW_IMAGE_SCALE,
+                'page_images': args.save_page_images,
+                'doc_exports': args.save_doc_exports,
+                'asset_store': ASSET_STORE_VERSION,
+                'text_layer': None if args.docling_text else TEXT_LAYER_VERSION,
+            },
+            {
+                'figures': self.figure_dir,
+                'images.json': self.images_json_path,
+                'tables.json': self.tables_json_path,
+                'markdown.md': self.markdown_path,
+            },
+            _convert,
+        )
+        if convert_hit:
+            # The cached entry may come from a run with another poster name or model pair
+            relocate_figure_json(self.images_json_path, self.figure_dir)
+            relocate_figure_json(self.tables_json_path, self.figure_dir)
+        self.load_converted()
+        self.log_time('parser_time', 'Convert', stage_start)
+
+    def load_converted(self):
+        with open(self.markdown_path, 'r', encoding='utf-8') as f:
+            self.paper_text = f.read()
+        self.images = json.load(open(self.images_json_path, 'r'))
+        self.tables = json.load(open(self.tables_json_path, 'r'))
+        self.convert_sha = json_sha256([
+            strip_figure_paths(self.images), strip_figure_paths(self.tables), self.paper_text
+        ])
+
+    def gen_raw_content(self):
+        stage_start = time.time()
+        args = self.args
+
+        def _raw_content():
+            input_token, output_token, _ = parse_raw(args, self.agent_config_t, version=2, text_content=self.paper_text)
+            return {'input_token': input_token, 'output_token': output_token}
+
+        raw_content_result, raw_content_hit = self.cache.run_stage(
+            'raw_content',
+            {
+                'convert': self.convert_sha,
+                'model_t': args.model_name_t,
+                'prompt': file_sha256(project_path(RAW_CONTENT_PROMPTS[2])),
+                'version': 2,
+                'map_reduce': [
+                    args.raw_content_chunk_chars,
+                    file_sha256(project_path(RAW_CONTENT_MAP_PROMPT)),
+                    file_sha256(project_path(RAW_CONTENT_REDUCE_PROMPT)),
+                ] if args.raw_content_chunk_chars and len(self.paper_text) > args.raw_content_chunk_chars else None,
+                'structured_output': args.structured_output,
+                'max_sections': args.max_sections,
+            },
+            {'raw_content.json': self.raw_content_path},
+            _raw_content,
+        )
+        input_token, output_token = stage_tokens(raw_content_result, raw_content_hit)
+        self.raw_content_sha = file_sha256(self.raw_content_path)
+        self.total_input_tokens_t += input_token
+        self.total_output_tokens_t += output_token
+
+        print(f'Parsing token consumption: {input_token} -> {output_token}')
+        self.log_time('parser_time', 'Parser', stage_start)
+
+        self.detail_log['parser_in_t'] = input_token
+        self.detail_log['parser_out_t'] = output_token
+
+    def resolve_logos(self):
+        """Find the institution and conference logos; returns their paths (or None)."""
+        stage_start = time.time()
+        args = self.args
+        paper_text = self.paper_text
+        institution_logo_path = self.institution_logo_path
+        conference_logo_path = self.conference_logo_path
+
+        # Initialize LogoManager
+        logo_manager = LogoManager()
+
+        # Auto-detect institution from paper if not provided
+        # Now using the parsed paper text directly instead of reading from file
+        if not institution_logo_path:
+            print("\n" + "="*60)
+            print("🔍 AUTO-DETECTING INSTITUTION FROM PAPER")
+            print("="*60)
+
+            # Use the paper text we already have from the parser
+            if paper_text:
+                print(f"📄 Using parsed paper content")
+
+                print("🔎 Searching for FIRST AUTHOR's institution...")
+                first_author_inst = logo_manager.extract_first_author_institution(paper_text)
+
+                if first_author_inst:
+                    print(f"\n✅ FIRST AUTHOR INSTITUTION: {first_author_inst}")
+                    print(f"🔍 Searching for logo: {first_author_inst}")
+
+                    inst_logo_path = logo_manager.get_logo_path(first_author_inst, category="institute", use_google=args.use_google_search)
+                    if inst_logo_path:
+                        institution_logo_path = str(inst_logo_path)
+                        print(f"✅ Institution logo found: {institution_logo_path}")
+                    else:
+                        print(f"❌ Could not find/download logo for: {first_author_inst}")
                 else:
-                    print(f"❌ Could not find/download logo for: {first_author_inst}")
+                    print("❌ No first author institution detected or matched with available logos")
             else:
-                print("❌ No first author institution detected or matched with available logos")
-        else:
-            print("❌ No parsed content available")
-        print("="*60 + "\n")
-
-    # Handle conference logo
-    if args.conference_venue and not conference_logo_path:
-        print("\n" + "="*60)
-        print("🏛️ SEARCHING FOR CONFERENCE LOGO")
-        print("="*60)
-        print(f"📍 Conference: {args.conference_venue}")
-        print(f"🔍 Searching for logo...")
-
-        conf_logo_path = logo_manager.get_logo_path(args.conference_venue, category="conference", use_google=args.use_google_search)
-        if conf_logo_path:
-            conference_logo_path = str(conf_logo_path)
-            print(f"✅ Conference logo found: {conference_logo_path}")
-        else:
-            print(f"❌ Could not find/download logo for: {args.conference_venue}")
-            # Note: Web search is now handled inside get_logo_path automatically
-        print("="*60 + "\n")
+                print("❌ No parsed content available")
+            print("="*60 + "\n")
+
+        # Handle conference logo
+        if args.conference_venue and not conference_logo_path:
+            print("\n" + "="*60)
+            print("🏛️ SEARCHING FOR CONFERENCE LOGO")
+            print("="*60)
+            print(f"📍 Conference: {args.conference_venue}")
+            print(f"🔍 Searching for logo...")
+
+            conf_logo_path = logo_manager.get_logo_path(args.conference_venue, category="conference", use_google=args.use_google_search)
+            if conf_logo_path:
+                conference_logo_path = str(conf_logo_path)
+                print(f"✅ Conference logo found: {conference_logo_path}")
+            else:
+                print(f"❌ Could not find/download logo for: {args.conference_venue}")
+                # Note: Web search is now handled inside get_logo_path automatically
+            print("="*60 + "\n")
+
+        self.log_time('logo_time', 'Logo', stage_start)
+        return institution_logo_path, conference_logo_path
+
+    def start_logo_resolution(self):
+        """
+        Resolve logos in the background; they are only needed at render time, so
+        the institution extraction and web search overlap with the LLM stages.
+        """
+        if self.logo_future is not None:
+            return
+        if self.args.resume:
+            record = self.manifest.completed('logos')
+            if record is not None:
+                print('⏭️  Resuming with logos found by the previous run')
+                for attr, value in record['state']['attrs'].items():
+                    setattr(self, attr, value)
+                return
+        self.logo_future = _logo_executor.submit(contextvars.copy_context().run, self._resolve_logos_traced)
+
+    def _resolve_logos_traced(self):
+        with trace_context(poster=self.poster_name, stage='logos'), span('stage', name='logos'):
+            return self.resolve_logos()
+
+    def join_logos(self):
+        """Wait for the background logo resolution, if any, and record its result."""
+        if self.logo_future is None:
+            return
+        wait_start = time.time()
+        try:
+            self.institution_logo_path, self.conference_logo_path = self.logo_future.result()
+        except Exception as e:
+            # Logos are decoration; a failed lookup should not cost the poster
+            print(f'❌ Logo resolution failed: {e}')
+        self.logo_future = None
+        self.detail_log['logo_wait_time'] = time.time() - wait_start
+        self.manifest.record('logos', self.stage_state(['institution_logo_path', 'conference_logo_path']), [])
 
     # Step 2: Filter unnecessary images and tables
-    input_token, output_token = filter_image_table(args, agent_config_t)
-    total_input_tokens_t += input_token
-    total_output_tokens_t += output_token
-    print(f'Filter figures token consumption: {input_token} -> {output_token}')
-
-    filter_time_taken = time.time() - parser_time
-    print(f'Filter time: {filter_time_taken:.2f} seconds')
-    detail_log['filter_time'] = filter_time_taken
-
-    filter_time = time.time()
-
-    detail_log['filter_in_t'] = input_token
-    detail_log['filter_out_t'] = output_token
-
-    # Step 3: Generate outline
-    input_token, output_token, panels, figures = gen_outline_layout_v2(args, agent_config_t)
-    total_input_tokens_t += input_token
-    total_output_tokens_t += output_token
-    print(f'Outline token consumption: {input_token} -> {output_token}')
-
-    outline_time_taken = time.time() - filter_time
-    print(f'Outline time: {outline_time_taken:.2f} seconds')
-    detail_log['outline_time'] = outline_time_taken
-
-    outline_time = time.time()
-
-    detail_log['outline_in_t'] = input_token
-    detail_log['outline_out_t'] = output_token
-
-    if args.ablation_no_tree_layout:
-        panel_arrangement, figure_arrangement, text_arrangement, input_token, output_token = no_tree_get_layout(
-            poster_width,
-            poster_height,
-            panels,
-            figures,
-            agent_config_t
-        )
-        total_input_tokens_t += input_token
-        total_output_tokens_t += output_token
-        print(f'No tree layout token consumption: {input_token} -> {output_token}')
-        detail_log['no_tree_layout_in_t'] = input_token
-        detail_log['no_tree_layout_out_t'] = output_token
-    else:
-
-        # Step 4: Learn and generate layout
-        panel_model_params, figure_model_params = main_train()
-
-        panel_arrangement, figure_arrangement, text_arrangement = main_inference(
-            panels,
-            panel_model_params,
-            figure_model_params,
-            poster_width,
-            poster_height,
-            shrink_margin=3
+    def filter_figures(self):
+        stage_start = time.time()
+        args = self.args
+
+        def _filter():
+            input_token, output_token = filter_image_table(args, self.agent_config_t)
+            return {'input_token': input_token, 'output_token': output_token}
+
+        filter_result, filter_hit = self.cache.run_stage(
+            'filter',
+            {
+                'convert': self.convert_sha,
+                'raw_content': self.raw_content_sha,
+                'model_t': args.model_name_t,
+                'prompt': prompt_template_sha('image_table_filter_agent'),
+                'prefix_caching': args.prefix_caching,
+                'structured_output': args.structured_output,
+            },
+            {'images_filtered.json': self.images_filtered_path, 'tables_filtered.json': self.tables_filtered_path},
+            _filter,
         )
+        if filter_hit:
+            relocate_figure_json(self.images_filtered_path, self.figure_dir)
+            relocate_figure_json(self.tables_filtered_path, self.figure_dir)
+        input_token, output_token = stage_tokens(filter_result, filter_hit)
+        self.filter_sha = json_sha256([
+            strip_figure_paths(json.load(open(self.images_filtered_path, 'r'))),
+            strip_figure_paths(json.load(open(self.tables_filtered_path, 'r'))),
+        ])
+        self.total_input_tokens_t += input_token
+        self.total_output_tokens_t += output_token
+        print(f'Filter figures token consumption: {input_token} -> {output_token}')
+        self.log_time('filter_time', 'Filter', stage_start)
+
+        self.detail_log['filter_in_t'] = input_token
+        self.detail_log['filter_out_t'] = output_token
 
-        text_arrangement_title = text_arrangement[0]
-        text_arrangement = text_arrangement[1:]
-        # Split the title textbox into two parts
-        text_arrangement_title_top, text_arrangement_title_bottom = split_textbox(
-            text_arrangement_title,
-            0.8
+    # Step 3: Generate outline
+    def gen_outline(self):
+        stage_start = time.time()
+        args = self.args
+
+        def _outline():
+            input_token, output_token, panels, figures = gen_outline_layout_v2(args, self.agent_config_t)
+            return {'input_token': input_token, 'output_token': output_token, 'panels': panels, 'figures': figures}
+
+        outline_result, outline_hit = self.cache.run_stage(
+            'outline',
+            {
+                'raw_content': self.raw_content_sha,
+                'filter': self.filter_sha,
+                'model_t': args.model_name_t,
+                'prompt': prompt_template_sha('poster_planner_new_v2'),
+                'prefix_caching': args.prefix_caching,
+                'structured_output': args.structured_output,
+            },
+            {},
+            _outline,
         )
-        # Add the split textboxes back to the list
-        text_arrangement = [text_arrangement_title_top, text_arrangement_title_bottom] + text_arrangement
-
-    for i in range(len(figure_arrangement)):
-        panel_id = figure_arrangement[i]['panel_id']
-        panel_section_name = panels[panel_id]['section_name']
-        figure_info = figures[panel_section_name]
-        if 'image' in figure_info:
-            figure_id = figure_info['image']
-            if not figure_id in images:
-                figure_path = images[str(figure_id)]['image_path']
+        input_token, output_token = stage_tokens(outline_result, outline_hit)
+        self.panels, self.figures = outline_result['panels'], outline_result['figures']
+        self.total_input_tokens_t += input_token
+        self.total_output_tokens_t += output_token
+        print(f'Outline token consumption: {input_token} -> {output_token}')
+        self.log_time('outline_time', 'Outline', stage_start)
+
+        self.detail_log['outline_in_t'] = input_token
+        self.detail_log['outline_out_t'] = output_token
+
+    # Step 4: Learn and generate layout
+    def gen_layout(self):
+        stage_start = time.time()
+        args = self.args
+        poster_width, poster_height = self.poster_width, self.poster_height
+        panels, figures = self.panels, self.figures
+        images, tables = self.images, self.tables
+
+        def _layout():
+            if args.ablation_no_tree_layout:
+                panel_arrangement, figure_arrangement, text_arrangement, input_token, output_token = no_tree_get_layout(
+                    poster_width,
+                    poster_height,
+                    panels,
+                    figures,
+                    self.agent_config_t
+                )
+                print(f'No tree layout token consumption: {input_token} -> {output_token}')
             else:
-                figure_path = images[figure_id]['image_path']
-        elif 'table' in figure_info:
-            figure_id = figure_info['table']
-            if not figure_id in tables:
-                figure_path = tables[str(figure_id)]['table_path']
-            else:
-                figure_path = tables[figure_id]['table_path']
+                panel_model_params, figure_model_params = self.layout_models
+
+                panel_arrangement, figure_arrangement, text_arrangement = main_inference(
+                    panels,
+                    panel_model_params,
+                    figure_model_params,
+                    poster_width,
+                    poster_height,
+                    shrink_margin=3,
+                    num_candidates=args.layout_candidates,
+                    num_figure_samples=args.figure_samples,
+                    capacity_weight=args.layout_capacity_weight,
+                )
+
+                text_arrangement_title = text_arrangement[0]
+                text_arrangement = text_arrangement[1:]
+                # Split the title textbox into two parts
+                text_arrangement_title_top, text_arrangement_title_bottom = split_textbox(
+                    text_arrangement_title,
+                    0.8
+                )
+                # Add the split textboxes back to the list
+                text_arrangement = [text_arrangement_title_top, text_arrangement_title_bottom] + text_arrangement
+                input_token, output_token = 0, 0
+            return {
+                'panels': panels,
+                'panel_arrangement': panel_arrangement,
+                'figure_arrangement': figure_arrangement,
+                'text_arrangement': text_arrangement,
+                'input_token': input_token,
+                'output_token': output_token,
+            }
+
+        layout_inputs = {
+            'outline': json_sha256([panels, figures]),
+            'poster_width': poster_width,
+            'poster_height': poster_height,
+            'ablation_no_tree_layout': args.ablation_no_tree_layout,
+        }
+        if args.ablation_no_tree_layout:
+            layout_inputs['model_t'] = args.model_name_t
+            layout_inputs['prompt'] = file_sha256(project_path('prompt_templates/ablation_no_tree_layout.yaml'))
+        else:
+            if self.layout_models is None:
+                self.layout_models = load_layout_models()
+            layout_inputs['layout_models'] = self.layout_models[0].get('training_set_sha')
+            layout_inputs['candidates'] = [args.layout_candidates, args.figure_samples]
+            layout_inputs['capacity_weight'] = args.layout_capacity_weight
+        layout_result, layout_hit = self.cache.run_stage('layout', layout_inputs, {}, _layout)
+        panels = self.panels = layout_result['panels']
+        panel_arrangement = layout_result['panel_arrangement']
+        figure_arrangement = layout_result['figure_arrangement']
+        text_arrangement = layout_result['text_arrangement']
+        if args.ablation_no_tree_layout:
+            input_token, output_token = stage_tokens(layout_result, layout_hit)
+            self.total_input_tokens_t += input_token
+            self.total_output_tokens_t += output_token
+            self.detail_log['no_tree_layout_in_t'] = input_token
+            self.detail_log['no_tree_layout_out_t'] = output_token
+
+        for i in range(len(figure_arrangement)):
+            panel_id = figure_arrangement[i]['panel_id']
+            panel_section_name = panels[panel_id]['section_name']
+            figure_info = figures[panel_section_name]
+            if 'image' in figure_info:
+                figure_id = figure_info['image']
+                if not figure_id in images:
+                    figure_path = images[str(figure_id)]['image_path']
+                else:
+                    figure_path = images[figure_id]['image_path']
+            elif 'table' in figure_info:
+                figure_id = figure_info['table']
+                if not figure_id in tables:
+                    figure_path = tables[str(figure_id)]['table_path']
+                else:
+                    figure_path = tables[figure_id]['table_path']
 
-        figure_arrangement[i]['figure_path'] = figure_path
+            figure_arrangement[i]['figure_path'] = figure_path
 
-    for text_arrangement_item in text_arrangement:
-        num_chars = char_capacity(
-            bbox=(text_arrangement_item['x'], text_arrangement_item['y'], text_arrangement_item['height'], text_arrangement_item['width'])
-        )
-        text_arrangement_item['num_chars'] = num_chars
-
-
-    width_inch, height_inch, panel_arrangement_inches, figure_arrangement_inches, text_arrangement_inches = get_arrangments_in_inches(
-        poster_width, poster_height, panel_arrangement, figure_arrangement, text_arrangement, 25
-    )
-
-    # Save to file
-    tree_split_results = {
-        'poster_width': poster_width,
-        'poster_height': poster_height,
-        'poster_width_inches': width_inch,
-        'poster_height_inches': height_inch,
-        'panels': panels,
-        'panel_arrangement': panel_arrangement,
-        'figure_arrangement': figure_arrangement,
-        'text_arrangement': text_arrangement,
-        'panel_arrangement_inches': panel_arrangement_inches,
-        'figure_arrangement_inches': figure_arrangement_inches,
-        'text_arrangement_inches': text_arrangement_inches,
-    }
-    os.makedirs('tree_splits', exist_ok=True)
-    with open(f'tree_splits/<{args.model_name_t}_{args.model_name_v}>_{args.poster_name}_tree_split_{args.index}.json', 'w') as f:
-        json.dump(tree_split_results, f, indent=4)
+        for text_arrangement_item in text_arrangement:
+            num_chars = char_capacity(
+                bbox=(text_arrangement_item['x'], text_arrangement_item['y'], text_arrangement_item['height'], text_arrangement_item['width'])
+            )
+            text_arrangement_item['num_chars'] = num_chars
 
-    layout_time_taken = time.time() - outline_time
-    print(f'Layout time: {layout_time_taken:.2f} seconds')
-    detail_log['layout_time'] = layout_time_taken
 
-    layout_time = time.time()
+        width_inch, height_inch, panel_arrangement_inches, figure_arrangement_inches, text_arrangement_inches = get_arrangments_in_inches(
+            poster_width, poster_height, panel_arrangement, figure_arrangement, text_arrangement, 25
+        )
+        self.width_inch, self.height_inch = width_inch, height_inch
+        self.panel_arrangement_inches = panel_arrangement_inches
+        self.figure_arrangement_inches = figure_arrangement_inches
+        self.text_arrangement_inches = text_arrangement_inches
+
+        # Save to file
+        tree_split_results = {
+            'poster_width': poster_width,
+            'poster_height': poster_height,
+            'poster_width_inches': width_inch,
+            'poster_height_inches': height_inch,
+            'panels': panels,
+            'panel_arrangement': panel_arrangement,
+            'figure_arrangement': figure_arrangement,
+            'text_arrangement': text_arrangement,
+            'panel_arrangement_inches': panel_arrangement_inches,
+            'figure_arrangement_inches': figure_arrangement_inches,
+            'text_arrangement_inches': text_arrangement_inches,
+        }
+        self.ctx.makedirs('tree_splits')
+        with open(self.tree_split_path, 'w') as f:
+            json.dump(tree_split_results, f, indent=4)
+        self.layout_sha = json_sha256([
+            panels,
+            panel_arrangement_inches,
+            strip_figure_paths(figure_arrangement_inches),
+            text_arrangement_inches,
+        ])
+        self.log_time('layout_time', 'Layout', stage_start)
 
     # === Configuration Loading ===
-    print("\n📋 Loading configuration from YAML files...", flush=True)
-    yaml_cfg = load_poster_yaml_config(args.poster_path)
-
-    # Extract configuration values
-    bullet_fs, title_fs, poster_title_fs, poster_author_fs = extract_font_sizes(yaml_cfg)
-    title_text_color, title_fill_color, main_text_color, main_text_fill_color = extract_colors(yaml_cfg)
-    section_title_vertical_align = extract_vertical_alignment(yaml_cfg)
-    section_title_symbol = extract_section_title_symbol(yaml_cfg)
-
-    # Normalize configuration values
-    bullet_fs, title_fs, poster_title_fs, poster_author_fs, \
-    title_text_color, title_fill_color, main_text_color, main_text_fill_color = normalize_config_values(
-        bullet_fs, title_fs, poster_title_fs, poster_author_fs,
-        title_text_color, title_fill_color, main_text_color, main_text_fill_color
-    )
-
-    # Store configuration in args
-    setattr(args, 'bullet_font_size', bullet_fs)
-    setattr(args, 'section_title_font_size', title_fs)
-    setattr(args, 'poster_title_font_size', poster_title_fs)
-    setattr(args, 'poster_author_font_size', poster_author_fs)
-    setattr(args, 'title_text_color', title_text_color)
-    setattr(args, 'title_fill_color', title_fill_color)
-    setattr(args, 'main_text_color', main_text_color)
-    setattr(args, 'main_text_fill_color', main_text_fill_color)
-    setattr(args, 'section_title_vertical_align', section_title_vertical_align)
+    def load_style_config(self):
+        args = self.args
+        print("\n📋 Loading configuration from YAML files...", flush=True)
+        yaml_cfg = load_poster_yaml_config(args.poster_path)
+
+        # Extract configuration values
+        bullet_fs, title_fs, poster_title_fs, poster_author_fs = extract_font_sizes(yaml_cfg)
+        title_text_color, title_fill_color, main_text_color, main_text_fill_color = extract_colors(yaml_cfg)
+        self.section_title_vertical_align = extract_vertical_alignment(yaml_cfg)
+        self.section_title_symbol = extract_section_title_symbol(yaml_cfg)
+
+        # Normalize configuration values
+        bullet_fs, title_fs, poster_title_fs, poster_author_fs, \
+        title_text_color, title_fill_color, main_text_color, main_text_fill_color = normalize_config_values(
+            bullet_fs, title_fs, poster_title_fs, poster_author_fs,
+            title_text_color, title_fill_color, main_text_color, main_text_fill_color
+        )
+        self.font_sizes = [bullet_fs, title_fs, poster_title_fs, poster_author_fs]
+        self.colors = [title_text_color, title_fill_color, main_text_color, main_text_fill_color]
+
+        # Store configuration in args
+        setattr(args, 'bullet_font_size', bullet_fs)
+        setattr(args, 'section_title_font_size', title_fs)
+        setattr(args, 'poster_title_font_size', poster_title_fs)
+        setattr(args, 'poster_author_font_size', poster_author_fs)
+        setattr(args, 'title_text_color', title_text_color)
+        setattr(args, 'title_fill_color', title_fill_color)
+        setattr(args, 'main_text_color', main_text_color)
+        setattr(args, 'main_text_fill_color', main_text_fill_color)
+        setattr(args, 'section_title_vertical_align', self.section_title_vertical_align)
 
     # Step 5: Generate content
-    print(f"\n✍️ Generating poster content (max_workers={args.max_workers})...", flush=True)
-    input_token_t, output_token_t, input_token_v, output_token_v = gen_bullet_point_content(args, agent_config_t, agent_config_v, tmp_dir=args.tmp_dir)
-    total_input_tokens_t += input_token
-    total_output_tokens_t += output_token
-    total_input_tokens_v += input_token_v
-    total_output_tokens_v += output_token_v
-    print(f'Content generation token consumption T: {input_token_t} -> {output_token_t}')
-    print(f'Content generation token consumption V: {input_token_v} -> {output_token_v}')
-
-    content_time_taken = time.time() - layout_time
-    print(f'Content generation time: {content_time_taken:.2f} seconds')
-    detail_log['content_time'] = content_time_taken
-
-    content_time = time.time()
-
-    bullet_content = json.load(open(f'contents/<{args.model_name_t}_{args.model_name_v}>_{args.poster_name}_bullet_point_content_{args.index}.json', 'r'))
-
-    detail_log['content_in_t'] = input_token_t
-    detail_log['content_out_t'] = output_token_t
-    detail_log['content_in_v'] = input_token_v
-    detail_log['content_out_v'] = output_token_v
-
-    # === Style Application ===
-    print("\n🎨 Applying styles and colors...", flush=True)
-
-    # Resolve colors with fallbacks
-    final_title_text_color, final_title_fill_color, final_main_text_color, final_main_text_fill_color = resolve_colors(
-        getattr(args, 'title_text_color', None),
-        getattr(args, 'title_fill_color', None),
-        getattr(args, 'main_text_color', None),
-        getattr(args, 'main_text_fill_color', None)
-    )
-
-    # Apply all styles in one go
-    bullet_content = apply_all_styles(
-        bullet_content,
-        title_text_color=final_title_text_color,
-        title_fill_color=final_title_fill_color,
-        main_text_color=final_main_text_color,
-        main_text_fill_color=final_main_text_fill_color,
-        section_title_symbol=section_title_symbol,
-        main_text_font_size=bullet_fs
-    )
-
-    # === Poster Generation ===
-    print("\n🎯 Generating PowerPoint code...", flush=True)
-
-    # Create theme with alignment
-    base_theme = get_default_theme()
-    theme_with_alignment = create_theme_with_alignment(
-        base_theme,
-        getattr(args, 'section_title_vertical_align', None)
-    )
-
-    poster_code = generate_poster_code(
-        panel_arrangement_inches,
-        text_arrangement_inches,
-        figure_arrangement_inches,
-        presentation_object_name='poster_presentation',
-        slide_object_name='poster_slide',
-        utils_functions=utils_functions,
-        slide_width=width_inch,
-        slide_height=height_inch,
-        img_path=None,
-        save_path=f'{args.tmp_dir}/poster.pptx',
-        visible=False,
-        content=bullet_content,
-        theme=theme_with_alignment,
-        tmp_dir=args.tmp_dir,
-    )
-
-    # Add logos to the poster
-    print("\n🖼️ Adding logos to poster...", flush=True)
-    poster_code = add_logos_to_poster_code(
-        poster_code,
-        width_inch,
-        height_inch,
-        institution_logo_path=institution_logo_path,
-        conference_logo_path=conference_logo_path
-    )
-
-    output, err = run_code(poster_code)
-    if err is not None:
-        raise RuntimeError(f'Error in generating PowerPoint: {err}')
-
-    # Step 8: Create a folder in the output directory
-    output_dir = f'<{args.model_name_t}_{args.model_name_v}>_generated_posters/{args.poster_path.replace("paper.pdf", "")}'
-    os.makedirs(output_dir, exist_ok=True)
-
-    # Copy logos to output directory for reference
-    logos_dir = os.path.join(output_dir, 'logos')
-    if institution_logo_path or conference_logo_path:
-        os.makedirs(logos_dir, exist_ok=True)
-        if institution_logo_path and os.path.exists(institution_logo_path):
-            shutil.copy2(institution_logo_path, os.path.join(logos_dir, 'institution_logo' + os.path.splitext(institution_logo_path)[1]))
-        if conference_logo_path and os.path.exists(conference_logo_path):
-            shutil.copy2(conference_logo_path, os.path.join(logos_dir, 'conference_logo' + os.path.splitext(conference_logo_path)[1]))
-
-    # Step 9: Move poster.pptx to the output directory
-    pptx_path = os.path.join(output_dir, f'{poster_name}.pptx')
-    os.rename(f'{args.tmp_dir}/poster.pptx', pptx_path)
-    print(f'Poster PowerPoint saved to {pptx_path}')
-    # Step 10: Convert the PowerPoint to images
-    ppt_to_images(pptx_path, output_dir)
-    print(f'Poster images saved to {output_dir}')
-
-    end_time = time.time()
-    time_taken = end_time - start_time
-
-    render_time_taken = time.time() - content_time
-    print(f'Render time: {render_time_taken:.2f} seconds')
-    detail_log['render_time'] = render_time_taken
-
-    # log
-    log_file = os.path.join(output_dir, 'log.json')
-    with open(log_file, 'w') as f:
-        log_data = {
-            'input_tokens_t': total_input_tokens_t,
-            'output_tokens_t': total_output_tokens_t,
-            'input_tokens_v': total_input_tokens_v,
-            'output_tokens_v': total_output_tokens_v,
+    def gen_content(self):
+        stage_start = time.time()
+        args = self.args
+
+        if self.content_source is not None:
+            shutil.copy2(self.content_source.bullet_content_path, self.bullet_content_path)
+            print(f'♻️  Reusing bullet content of size {self.content_source.size_label}, its text capacity is close enough')
+            self.detail_log['content_reused_from'] = self.content_source.size_label
+            self.log_time('content_time', 'Content generation', stage_start)
+            return
+
+        def _content():
+            print(f"\n✍️ Generating poster content (max_workers={args.max_workers})...", flush=True)
+            input_token_t, output_token_t, input_token_v, output_token_v = gen_bullet_point_content(
+                args, self.agent_config_t, self.agent_config_v, tmp_dir=self.tmp_dir
+            )
+            return {
+                'input_token_t': input_token_t,
+                'output_token_t': output_token_t,
+                'input_token_v': input_token_v,
+                'output_token_v': output_token_v,
+            }
+
+        critic_agent_name = 'critic_overlap_agent_v3_short' if args.model_name_v == 'vllm_qwen_vl' else 'critic_overlap_agent_v3'
+        content_result, content_hit = self.cache.run_stage(
+            'content',
+            {
+                'raw_content': self.raw_content_sha,
+                'layout': self.layout_sha,
+                'model_t': args.model_name_t,
+                'model_v': args.model_name_v,
+                'prompts': [
+                    prompt_template_sha('bullet_point_agent'),
+                    prompt_template_sha(critic_agent_name),
+                    prompt_template_sha('poster_title_agent'),
+                ],
+                'structured_output': args.structured_output,
+                'estimate_chars': args.estimate_chars,
+                'no_blank_detection': args.no_blank_detection,
+                'ablation_no_commenter': args.ablation_no_commenter,
+                'ablation_no_example': args.ablation_no_example,
+                'font_sizes': self.font_sizes,
+            },
+            {'bullet_point_content.json': self.bullet_content_path},
+            _content,
+        )
+        if content_hit:
+            input_token_t = output_token_t = input_token_v = output_token_v = 0
+        else:
+            input_token_t = content_result['input_token_t']
+            output_token_t = content_result['output_token_t']
+            input_token_v = content_result['input_token_v']
+            output_token_v = content_result['output_token_v']
+        self.total_input_tokens_t += input_token_t
+        self.total_output_tokens_t += output_token_t
+        self.total_input_tokens_v += input_token_v
+        self.total_output_tokens_v += output_token_v
+        print(f'Content generation token consumption T: {input_token_t} -> {output_token_t}')
+        print(f'Content generation token consumption V: {input_token_v} -> {output_token_v}')
+        self.log_time('content_time', 'Content generation', stage_start)
+
+        self.detail_log['content_in_t'] = input_token_t
+        self.detail_log['content_out_t'] = output_token_t
+        self.detail_log['content_in_v'] = input_token_v
+        self.detail_log['content_out_v'] = output_token_v
+
+    def placed_figures(self):
+        """
+        Write the placement level of every placed figure: the figure at
+        `--figure_dpi` for its placed size.
+
+        Figures are re-rendered from the PDF (or taken from the original crop
+        when no PDF box is known), downsampled and encoded as JPEG or PNG.
+        Pages, boxes and crop files come from the asset index. Returns the
+        figure arrangement pointing at the prepared files and a per-figure
+        size/time report.
+        """
+        args = self.args
+        asset_index = load_asset_index(self.figure_dir, args.poster_name)
+        sources = {}
+        for info in self.images.values():
+            sources[os.path.basename(info['image_path'])] = asset_index[info['asset']]
+        for info in self.tables.values():
+            sources[os.path.basename(info['table_path'])] = asset_index[info['asset']]
+
+        placed_dir = os.path.join(self.tmp_dir, 'placed_figures')
+        os.makedirs(placed_dir, exist_ok=True)
+        figure_arrangement = copy.deepcopy(self.figure_arrangement_inches)
+        report = []
+        for f in figure_arrangement:
+            name = os.path.basename(f['figure_path'])
+            if name not in sources:
+                continue
+            asset = sources[name]
+            source_path = asset_file(self.figure_dir, asset)
+            figure_start = time.time()
+            with span('rasterize', name=name) as attrs:
+                image = None
+                if asset['bbox']:
+                    scale = placed_render_scale(asset['bbox'], f['width'], args.figure_dpi)
+                    attrs['scale'] = scale
+                    image = render_pdf_region(args.poster_path, asset['page_no'], asset['bbox'], scale)
+                if image is None:
+                    image = Image.open(source_path)
+                entry = encode_placed_image(
+                    image,
+                    os.path.join(placed_dir, os.path.splitext(name)[0]),
+                    f['width'],
+                    f['height'],
+                    args.figure_dpi,
+                    image_format=args.figure_format,
+                    jpeg_quality=args.jpeg_quality,
+                )
+            seconds = time.time() - figure_start
+            # For comparison: the crop at IMAGE_RESOLUTION_SCALE, which the pptx used to embed as is
+            baseline_bytes = None
+            if asset['bbox']:
+                baseline = render_pdf_region(args.poster_path, asset['page_no'], asset['bbox'], IMAGE_RESOLUTION_SCALE)
+                if baseline is not None:
+                    baseline_bytes = png_bytes(baseline)
+            f['figure_path'] = entry['path']
+            report.append({
+                'figure': name,
+                'placed_inches': [f['width'], f['height']],
+                'baseline_bytes': baseline_bytes,
+                **entry,
+                'seconds': seconds,
+            })
+        return figure_arrangement, report
+
+    def render(self):
+        """Build the pptx and its preview image (LibreOffice bound)."""
+        self.join_logos()
+        stage_start = time.time()
+        args = self.args
+        tmp_dir = self.tmp_dir
+        output_dir = self.output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        bullet_fs = self.font_sizes[0]
+        figure_report_path = os.path.join(output_dir, 'figure_report.json')
+
+        def _render():
+            bullet_content = json.load(open(self.bullet_content_path, 'r'))
+
+            # === Style Application ===
+            print("\n🎨 Applying styles and colors...", flush=True)
+
+            # Resolve colors with fallbacks
+            final_title_text_color, final_title_fill_color, final_main_text_color, final_main_text_fill_color = resolve_colors(
+                getattr(args, 'title_text_color', None),
+                getattr(args, 'title_fill_color', None),
+                getattr(args, 'main_text_color', None),
+                getattr(args, 'main_text_fill_color', None)
+            )
+
+            # Apply all styles in one go
+            bullet_content = apply_all_styles(
+                bullet_content,
+                title_text_color=final_title_text_color,
+                title_fill_color=final_title_fill_color,
+                main_text_color=final_main_text_color,
+                main_text_fill_color=final_main_text_fill_color,
+                section_title_symbol=self.section_title_symbol,
+                main_text_font_size=bullet_fs
+            )
+
+            # === Poster Generation ===
+            print("\n🎯 Generating PowerPoint code...", flush=True)
+
+            # Create theme with alignment
+            base_theme = get_default_theme()
+            theme_with_alignment = create_theme_with_alignment(
+                base_theme,
+                getattr(args, 'section_title_vertical_align', None)
+            )
+
+            figure_arrangement, figure_report = self.placed_figures()
+            output_bytes = sum(r['bytes'] for r in figure_report)
+            # Only figures with a PDF box have a baseline size
+            measured = [r for r in figure_report if r['baseline_bytes'] is not None]
+            baseline_bytes = sum(r['baseline_bytes'] for r in measured)
+            measured_output_bytes = sum(r['bytes'] for r in measured)
+            with open(figure_report_path, 'w') as f:
+                json.dump({
+                    'figure_dpi': args.figure_dpi,
+                    'baseline_bytes': baseline_bytes,
+                    'baseline_output_bytes': measured_output_bytes,
+                    'output_bytes': output_bytes,
+                    'seconds': sum(r['seconds'] for r in figure_report),
+                    'figures': figure_report,
+                }, f, indent=4)
+            print(
+                f'Prepared {len(figure_report)} figures ({output_bytes / 1e6:.1f} MB); '
+                f'{len(measured)} with a PDF box: {baseline_bytes / 1e6:.1f} MB as {IMAGE_RESOLUTION_SCALE:g}x PNG crops '
+                f'-> {measured_output_bytes / 1e6:.1f} MB'
+            )
+
+            poster_code = generate_poster_code(
+                self.panel_arrangement_inches,
+                self.text_arrangement_inches,
+                figure_arrangement,
+                presentation_object_name='poster_presentation',
+                slide_object_name='poster_slide',
+                utils_functions=utils_functions,
+                slide_width=self.width_inch,
+                slide_height=self.height_inch,
+                img_path=None,
+                save_path=f'{tmp_dir}/poster.pptx',
+                visible=False,
+                content=bullet_content,
+                theme=theme_with_alignment,
+                tmp_dir=tmp_dir,
+            )
+
+            # Add logos to the poster
+            print("\n🖼️ Adding logos to poster...", flush=True)
+            poster_code = add_logos_to_poster_code(
+                poster_code,
+                self.width_inch,
+                self.height_inch,
+                institution_logo_path=self.institution_logo_path,
+                conference_logo_path=self.conference_logo_path
+            )
+
+            output, err = run_code(poster_code)
+            if err is not None:
+                raise RuntimeError(f'Error in generating PowerPoint: {err}')
+
+            # Step 9: Move poster.pptx to the output directory
+            os.rename(f'{tmp_dir}/poster.pptx', self.pptx_path)
+            print(f'Poster PowerPoint saved to {self.pptx_path}')
+            # Step 10: Convert the PowerPoint to images
+            ppt_to_images(self.pptx_path, output_dir)
+            return {}
+
+        self.cache.run_stage(
+            'render',
+            {
+                'convert': self.convert_sha,
+                'content': file_sha256(self.bullet_content_path),
+                'layout': self.layout_sha,
+                'style': self.colors + [
+                    self.section_title_vertical_align, self.section_title_symbol, bullet_fs,
+                ],
+                'theme': get_default_theme(),
+                'figure_dpi': args.figure_dpi,
+                'figure_format': [args.figure_format, args.jpeg_quality],
+                'logos': [file_sha256(self.institution_logo_path), file_sha256(self.conference_logo_path)],
+            },
+            {
+                'poster.pptx': self.pptx_path,
+                'poster.png': os.path.join(output_dir, 'poster.png'),
+                'figure_report.json': figure_report_path,
+            },
+            _render,
+        )
+        with open(figure_report_path, 'r') as f:
+            figure_report = json.load(f)
+        # Reports cached before the baseline was measured have no baseline sizes
+        self.detail_log['figure_baseline_bytes'] = figure_report.get('baseline_bytes')
+        self.detail_log['figure_baseline_output_bytes'] = figure_report.get('baseline_output_bytes')
+        self.detail_log['figure_output_bytes'] = figure_report['output_bytes']
+        self.detail_log['figure_prepare_time'] = figure_report['seconds']
+        self.detail_log['pptx_bytes'] = os.path.getsize(self.pptx_path)
+
+        # Copy logos to output directory for reference
+        institution_logo_path, conference_logo_path = self.institution_logo_path, self.conference_logo_path
+        logos_dir = os.path.join(output_dir, 'logos')
+        if institution_logo_path or conference_logo_path:
+            os.makedirs(logos_dir, exist_ok=True)
+            if institution_logo_path and os.path.exists(institution_logo_path):
+                shutil.copy2(institution_logo_path, os.path.join(logos_dir, 'institution_logo' + os.path.splitext(institution_logo_path)[1]))
+            if conference_logo_path and os.path.exists(conference_logo_path):
+                shutil.copy2(conference_logo_path, os.path.join(logos_dir, 'conference_logo' + os.path.splitext(conference_logo_path)[1]))
+
+        print(f'Poster images saved to {output_dir}')
+        self.log_time('render_time', 'Render', stage_start)
+
+    def finish(self):
+        """Write the run logs and return a dict describing the generated poster."""
+        output_dir = self.output_dir
+        time_taken = time.time() - self.start_time
+        self.detail_log['cache_hits'] = self.cache.hits
+
+        # log
+        log_file = os.path.join(output_dir, 'log.json')
+        with open(log_file, 'w') as f:
+            log_data = {
+                'input_tokens_t': self.total_input_tokens_t,
+                'output_tokens_t': self.total_output_tokens_t,
+                'input_tokens_v': self.total_input_tokens_v,
+                'output_tokens_v': self.total_output_tokens_v,
+                'time_taken': time_taken,
+                'institution_logo': self.institution_logo_path,
+                'conference_logo': self.conference_logo_path,
+            }
+            json.dump(log_data, f, indent=4)
+
+        detail_log_file = os.path.join(output_dir, 'detail_log.json')
+        with open(detail_log_file, 'w') as f:
+            json.dump(self.detail_log, f, indent=4)
+
+        print(f'\nTotal time: {time_taken:.2f} seconds')
+        print(f'Total text model tokens: {self.total_input_tokens_t} -> {self.total_output_tokens_t}')
+        print(f'Total vision model tokens: {self.total_input_tokens_v} -> {self.total_output_tokens_v}')
+
+        if self.institution_logo_path:
+            print(f'Institution logo added: {self.institution_logo_path}')
+        if self.conference_logo_path:
+            print(f'Conference logo added: {self.conference_logo_path}')
+
+        return {
+            'poster_name': self.poster_name,
+            'output_dir': output_dir,
+            'pptx_path': self.pptx_path,
             'time_taken': time_taken,
-            'institution_logo': institution_logo_path,
-            'conference_logo': conference_logo_path,
         }
-        json.dump(log_data, f, indent=4)
 
-    detail_log_file = os.path.join(output_dir, 'detail_log.json')
-    with open(detail_log_file, 'w') as f:
-        json.dump(detail_log, f, indent=4)
+    def stage_artifacts(self, stage):
+        return {
+            'convert': [self.figure_dir, self.images_json_path, self.tables_json_path, self.markdown_path],
+            'raw_content': [self.raw_content_path],
+            'filter': [self.images_filtered_path, self.tables_filtered_path],
+            'layout': [self.tree_split_path],
+            'content': [self.bullet_content_path],
+            'render': [self.pptx_path],
+        }.get(stage, [])
+
+    def stage_state(self, state_attrs):
+        return {
+            'attrs': {attr: getattr(self, attr) for attr in state_attrs},
+            'totals': [
+                self.total_input_tokens_t, self.total_output_tokens_t,
+                self.total_input_tokens_v, self.total_output_tokens_v,
+            ],
+            'detail_log': self.detail_log,
+        }
+
+    def restore_stage_state(self, stage, state):
+        for attr, value in state['attrs'].items():
+            setattr(self, attr, value)
+        self.total_input_tokens_t, self.total_output_tokens_t, \
+        self.total_input_tokens_v, self.total_output_tokens_v = state['totals']
+        self.detail_log = dict(state['detail_log'])
+        if stage == 'convert':
+            self.load_converted()
+
+    def run_stages(self, stages):
+        """Run `stages` in order, replaying the ones a resumed manifest already completed."""
+        stage_names = list(self.STAGES)
+        for stage in stages:
+            method_name, state_attrs = self.STAGES[stage]
+            if state_attrs is None:
+                self.run_stage_traced(stage, method_name)
+                continue
+
+            if self.resuming:
+                record = self.manifest.completed(stage)
+                if record is not None:
+                    print(f'⏭️  Resuming past completed stage "{stage}"')
+                    self.restore_stage_state(stage, record['state'])
+                    continue
+                # Everything from the first incomplete stage on is recomputed
+                print(f'▶️  Resuming at stage "{stage}"')
+                self.resuming = False
+                self.manifest.invalidate_from(stage_names[stage_names.index(stage):])
+
+            self.run_stage_traced(stage, method_name)
+            self.manifest.record(stage, self.stage_state(state_attrs), self.stage_artifacts(stage))
+
+    def run_stage_traced(self, stage, method_name):
+        with trace_context(poster=self.poster_name, stage=stage), span('stage', name=stage):
+            getattr(self, method_name)()
+
+    def variant(self, size_label, width_inches, height_inches):
+        """
+        A copy of this run for another poster size. It shares everything up to the
+        outline and gets its own layout, content, render, paths and manifest.
+        """
+        run = copy.copy(self)
+        run.args = copy.copy(self.args)
+        run.args.poster_width_inches = width_inches
+        run.args.poster_height_inches = height_inches
+        run.args.index = f'{self.args.index}_{size_label}'
+        # main_inference annotates the panels in place
+        run.panels = copy.deepcopy(self.panels)
+        run.detail_log = dict(self.detail_log)
+        run.cache = copy.copy(self.cache)
+        run.cache.hits, run.cache.misses = list(self.cache.hits), list(self.cache.misses)
+        run.size_label = size_label
+        run.content_source = None
+        run.configure_size()
+        return run
+
+    def text_capacity(self):
+        """Character budget of every panel's textboxes, by panel id."""
+        capacity = {}
+        for textbox in self.text_arrangement_inches:
+            capacity.setdefault(textbox['panel_id'], []).append(textbox['num_chars'])
+        return capacity
+
+    def capacity_close_to(self, other, tolerance):
+        """Whether bullet content written for `other` fits this layout as well."""
+        mine, theirs = self.text_capacity(), other.text_capacity()
+        if mine.keys() != theirs.keys():
+            return False
+        for panel_id, chars in mine.items():
+            other_chars = theirs[panel_id]
+            if len(chars) != len(other_chars):
+                return False
+            total, other_total = sum(chars), sum(other_chars)
+            if abs(total - other_total) > tolerance * max(total, other_total, 1):
+                return False
+        return True
+
+    def run_sizes(self, sizes):
+        """
+        Generate one poster per size from a single parse/filter/outline run.
+
+        Layout, content and render fan out per size in parallel. A size whose
+        text capacity is within `--content_reuse_tolerance` of the first size
+        reuses its bullet content instead of generating new content.
+        """
+        self.run_stages(self.CONVERT_STAGES)
+        self.start_logo_resolution()
+        self.run_stages(self.PLAN_STAGES)
+        if self.layout_models is None and not self.args.ablation_no_tree_layout:
+            self.layout_models = load_layout_models()
+
+        variants = [self.variant(*size) for size in parse_poster_sizes(sizes)]
+        reference = variants[0]
+
+        with ThreadPoolExecutor(max_workers=len(variants)) as executor:
+            def _fan_out(runs, stages):
+                futures = [executor.submit(contextvars.copy_context().run, run.run_stages, stages) for run in runs]
+                for future in futures:
+                    future.result()
+
+            _fan_out(variants, ['layout', 'style'])
+            for run in variants[1:]:
+                if run.capacity_close_to(reference, self.args.content_reuse_tolerance):
+                    run.content_source = reference
+            _fan_out([run for run in variants if run.content_source is None], ['content'])
+            _fan_out([run for run in variants if run.content_source is not None], ['content'])
+            _fan_out(variants, self.RENDER_STAGES)
+
+        return [run.finish() for run in variants]
+
+    def run_llm_stages(self):
+        """
+        Everything between parsing and rendering; dominated by LLM/VLM calls.
+
+        Logos are joined at the end so the run can be handed to another process to render.
+        """
+        self.start_logo_resolution()
+        self.run_stages(self.LLM_STAGES)
+        self.join_logos()
+
+    def run(self):
+        self.run_stages(self.CONVERT_STAGES)
+        self.run_llm_stages()
+        self.run_stages(self.RENDER_STAGES)
+        return self.finish()
+
+
+def run_pipeline(args, layout_models=None):
+    """
+    Run the full poster pipeline for `args.poster_path`.
+
+    Returns a dict describing the generated poster, or a list of them with
+    `--sizes`; see `PosterRun`.
+    """
+    run = PosterRun(args, layout_models=layout_models)
+    if args.sizes:
+        return run.run_sizes(args.sizes)
+    return run.run()
 
-    print(f'\nTotal time: {time_taken:.2f} seconds')
-    print(f'Total text model tokens: {total_input_tokens_t} -> {total_output_tokens_t}')
-    print(f'Total vision model tokens: {total_input_tokens_v} -> {total_output_tokens_v}')
 
-    if institution_logo_path:
-        print(f'Institution logo added: {institution_logo_path}')
-    if conference_logo_path:
-        print(f'Conference logo added: {conference_logo_path}')
+if __name__ == '__main__':
+    run_pipeline(build_parser().parse_args())
@@ -1,67 +1,271 @@
 from dotenv import load_dotenv
 from utils.src.utils import get_json_from_response
-from utils.src.model_utils import parse_pdf
+from utils.src.model_utils import parse_pdf, get_marker_models
 import json
 import random
 
 from camel.models import ModelFactory
 from camel.agents import ChatAgent
 from tenacity import retry, stop_after_attempt
-from docling_core.types.doc import ImageRefMode, PictureItem, TableItem
+from docling_core.types.doc import DoclingDocument, ImageRefMode, PictureItem, TableItem
 
 from docling.datamodel.base_models import InputFormat
 from docling.datamodel.pipeline_options import PdfPipelineOptions
 from docling.document_converter import DocumentConverter, PdfFormatOption
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from importlib.metadata import version as package_version
+import contextvars
+import multiprocessing
 from pathlib import Path
+import os
+import shutil
+import tempfile
 
-import PIL
-
-from marker.models import create_model_dict
+import pypdfium2 as pdfium
 
 from utils.wei_utils import *
+from utils.run_context import get_run_context, project_path
+from utils.tracing import span, trace_context
+from utils.cache_utils import file_sha256, json_sha256
+from utils.text_layer import TEXT_LAYER_VERSION, extract_text_layer, text_layer_markdown
+from utils.asset_store import FigureAssetStore
+from utils.json_schemas import structured_config, schema_errors
 
 from utils.pptx_utils import *
 from utils.critic_utils import *
-import torch
 from jinja2 import Template
 import re
 import argparse
 
 load_dotenv()
+# Scale the recorded figure/table width and height refer to; layout and prompts are tuned to it
 IMAGE_RESOLUTION_SCALE = 5.0
-
-pipeline_options = PdfPipelineOptions()
-pipeline_options.images_scale = IMAGE_RESOLUTION_SCALE
-pipeline_options.generate_page_images = True
-pipeline_options.generate_picture_images = True
+# Scale of the crops exported at parse time. They are only looked at by the
+# filter step; the crops placed on the poster are re-rendered from the PDF at a
+# DPI matching their placed size (see utils.raster_utils).
+PREVIEW_IMAGE_SCALE = 2.0
+
+
+def make_pipeline_options(page_images=False, figures_only=False):
+    """
+    Docling options; `figures_only` skips OCR and table structure for papers
+    whose text comes from the PDF text layer and only need figure/table crops.
+    """
+    options = PdfPipelineOptions()
+    options.images_scale = PREVIEW_IMAGE_SCALE
+    options.generate_page_images = page_images
+    options.generate_picture_images = True
+    options.generate_table_images = True
+    if figures_only:
+        options.do_ocr = False
+        options.do_table_structure = False
+    return options
+
+
+pipeline_options = make_pipeline_options()
 
 doc_converter = DocumentConverter(
     format_options={
         InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)
     }
 )
+_doc_converters = {(False, False): doc_converter}
 
-@retry(stop=stop_after_attempt(5))
-def parse_raw(args, actor_config, version=1):
-    raw_source = args.poster_path
-    markdown_clean_pattern = re.compile(r"<!--[\s\S]*?-->")
 
-    raw_result = doc_converter.convert(raw_source)
+def get_doc_converter(page_images=False, figures_only=False):
+    """Shared converter per option set; full page images are rendered only when asked for."""
+    key = (page_images, figures_only)
+    if key not in _doc_converters:
+        _doc_converters[key] = DocumentConverter(
+            format_options={
+                InputFormat.PDF: PdfFormatOption(pipeline_options=make_pipeline_options(page_images, figures_only))
+            }
+        )
+    return _doc_converters[key]
+
+RAW_CONTENT_PROMPTS = {
+    1: "utils/prompts/gen_poster_raw_content.txt",
+    2: "utils/prompts/gen_poster_raw_content_v2.txt",
+}
+RAW_CONTENT_MAP_PROMPT = "utils/prompts/gen_poster_raw_content_map.txt"
+RAW_CONTENT_REDUCE_PROMPT = "utils/prompts/gen_poster_raw_content_reduce.txt"
+MARKDOWN_HEADING = re.compile(r'^#{1,6} ', re.MULTILINE)
+
+# Converted documents, keyed by PDF hash and conversion options
+DOCLING_CACHE_DIR = os.path.join('cache', 'docling')
+
+
+def docling_cache_key(raw_source, page_range=None, page_images=False, text_layer=False):
+    options = make_pipeline_options(page_images)
+    return json_sha256({
+        'pdf': file_sha256(raw_source),
+        'page_range': page_range,
+        'docling': package_version('docling'),
+        'images_scale': options.images_scale,
+        'page_images': options.generate_page_images,
+        'picture_images': options.generate_picture_images,
+        'table_images': options.generate_table_images,
+        'text_layer': TEXT_LAYER_VERSION if text_layer else None,
+    })
+
+
+def load_converted_document(cache_dir, key):
+    """Return the stored (document, text_content) for `key`, or None."""
+    entry_dir = os.path.join(cache_dir, key)
+    document_path = os.path.join(entry_dir, 'document.json')
+    text_path = os.path.join(entry_dir, 'text.md')
+    if not (os.path.exists(document_path) and os.path.exists(text_path)):
+        return None
+    try:
+        document = DoclingDocument.load_from_json(Path(document_path))
+        with open(text_path, 'r', encoding='utf-8') as f:
+            text_content = f.read()
+    except Exception as e:
+        print(f'Ignoring unreadable docling cache entry {entry_dir}: {e}')
+        return None
+    return document, text_content
+
+
+def store_converted_document(cache_dir, key, document, text_content):
+    """
+    Persist a converted document (JSON with its page and figure images embedded)
+    and the extracted text. The entry is written to a temporary directory and
+    renamed into place, so concurrent runs never read a partial entry.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(prefix=f'.{key}.', dir=cache_dir)
+    try:
+        document.save_as_json(Path(staging_dir) / 'document.json', image_mode=ImageRefMode.EMBEDDED)
+        with open(os.path.join(staging_dir, 'text.md'), 'w', encoding='utf-8') as f:
+            f.write(text_content)
+        os.rename(staging_dir, os.path.join(cache_dir, key))
+    except OSError:
+        # Another run stored the same PDF first
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+def convert_pdf_pages(raw_source, page_range=None, cache_dir=DOCLING_CACHE_DIR, page_images=False, text_layer=True):
+    """
+    Convert a PDF, or the 1-based inclusive `page_range` of it, with docling,
+    falling back to marker when docling yields (almost) no text.
+
+    With `text_layer`, the text of pages with a clean PDF text layer is taken
+    from it directly. If every page is clean, docling only runs its layout
+    model for the figure and table crops (no OCR, no table structure); pages
+    with a missing or garbled layer get their text from the full pipeline.
+
+    Conversions are stored under `cache_dir` by PDF hash, so retries and reruns
+    only redo the LLM steps; pass `cache_dir=None` to always convert.
+    Returns (document, text_content).
+    """
+    key = docling_cache_key(raw_source, page_range, page_images, text_layer) if cache_dir else None
+    if key is not None:
+        cached = load_converted_document(cache_dir, key)
+        if cached is not None:
+            print(f'♻️  Reusing docling conversion of {raw_source} ({key[:12]})')
+            return cached
+
+    markdown_clean_pattern = re.compile(r"<!--[\s\S]*?-->")
 
-    raw_markdown = raw_result.document.export_to_markdown()
+    layer_markdown, layer_pages = {}, []
+    if text_layer:
+        with span('convert', name='text_layer.extract', source=raw_source, page_range=page_range) as attrs:
+            layer_pages = extract_text_layer(raw_source, page_range)
+            layer_markdown = text_layer_markdown(layer_pages)
+            attrs['pages'] = len(layer_pages)
+            attrs['fallback_pages'] = len(layer_pages) - len(layer_markdown)
+    figures_only = bool(layer_pages) and len(layer_markdown) == len(layer_pages)
+
+    with span('convert', name='docling.convert', source=raw_source, page_range=page_range,
+              figures_only=figures_only) as attrs:
+        converter = get_doc_converter(page_images, figures_only)
+        if page_range is None:
+            raw_result = converter.convert(raw_source)
+        else:
+            raw_result = converter.convert(raw_source, page_range=page_range)
+        attrs['pages'] = len(raw_result.pages)
+    document = raw_result.document
+
+    if layer_pages:
+        page_texts = []
+        for page in layer_pages:
+            if page['page_no'] in layer_markdown:
+                page_texts.append(layer_markdown[page['page_no']])
+            else:
+                page_texts.append(document.export_to_markdown(page_no=page['page_no']))
+        raw_markdown = '\n\n'.join(page_texts)
+        if not figures_only:
+            print(f'Text layer unusable on pages {[p["page_no"] for p in layer_pages if not p["ok"]]}, '
+                  f'took their text from docling')
+    else:
+        raw_markdown = document.export_to_markdown()
     text_content = markdown_clean_pattern.sub("", raw_markdown)
 
+    # For a shard this is judged per shard, so one scanned appendix does not send the whole paper to marker
     if len(text_content) < 500:
         print('\nParsing with docling failed, using marker instead\n')
-        parser_model = create_model_dict(device='cuda', dtype=torch.float16)
-        text_content, rendered = parse_pdf(raw_source, model_lst=parser_model, save_file=False)
-
-    if version == 1:
-        template = Template(open("utils/prompts/gen_poster_raw_content.txt").read())
-    elif version == 2:
-        template = Template(open("utils/prompts/gen_poster_raw_content_v2.txt").read())
+        with span('convert', name='marker.convert', source=raw_source, page_range=page_range):
+            parser_model = get_marker_models()
+            marker_page_range = None if page_range is None else f'{page_range[0] - 1}-{page_range[1] - 1}'
+            text_content, rendered = parse_pdf(
+                raw_source, model_lst=parser_model, save_file=False, page_range=marker_page_range
+            )
 
+    if key is not None:
+        store_converted_document(cache_dir, key, document, text_content)
+    return document, text_content
+
+
+def pdf_page_count(raw_source):
+    pdf = pdfium.PdfDocument(raw_source)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def convert_pdf(raw_source, cache_dir=DOCLING_CACHE_DIR, shard_pages=None, shard_workers=4, page_images=False,
+                text_layer=True):
+    """
+    Convert a PDF into docling documents and markdown text.
+
+    With `shard_pages`, a PDF longer than that is split into page shards that
+    are converted in a process pool; shards are returned in page order.
+    Full page images are only rendered with `page_images`; `text_layer` is
+    passed on to `convert_pdf_pages`.
+    Returns (documents, text_content).
+    """
+    page_count = pdf_page_count(raw_source) if shard_pages else 0
+    if not shard_pages or page_count <= shard_pages:
+        document, text_content = convert_pdf_pages(
+            raw_source, cache_dir=cache_dir, page_images=page_images, text_layer=text_layer
+        )
+        return [document], text_content
+
+    page_ranges = [
+        (start, min(start + shard_pages - 1, page_count))
+        for start in range(1, page_count + 1, shard_pages)
+    ]
+    print(f'Converting {page_count} pages in {len(page_ranges)} shards of up to {shard_pages} pages')
+    with ProcessPoolExecutor(
+        max_workers=min(shard_workers, len(page_ranges)),
+        mp_context=multiprocessing.get_context('spawn'),
+    ) as executor:
+        shards = list(executor.map(
+            convert_pdf_pages,
+            [raw_source] * len(page_ranges),
+            page_ranges,
+            [cache_dir] * len(page_ranges),
+            [page_images] * len(page_ranges),
+            [text_layer] * len(page_ranges),
+        ))
+
+    documents = [document for document, _ in shards]
+    text_content = '\n\n'.join(text for _, text in shards)
+    return documents, text_content
+
+def create_actor_agent(args, actor_config):
     if args.model_name_t.startswith('vllm_qwen'):
         actor_model = ModelFactory.create(
             model_platform=actor_config['model_platform'],
@@ -78,33 +282,166 @@ def parse_raw(args, actor_config, version=1):
 
     actor_sys_msg = 'You are the author of the paper, and you will create a poster for the paper.'
 
-    actor_agent = ChatAgent(
+    return ChatAgent(
         system_message=actor_sys_msg,
         model=actor_model,
         message_window_size=10,
         token_limit=actor_config.get('token_limit', None)
     )
 
-    while True:
-        prompt = template.render(
-            markdown_document=text_content, 
-        )
+
+def split_markdown_chunks(text_content, max_chars):
+    """
+    Split markdown into chunks of at most `max_chars`, cutting at headings.
+
+    Consecutive sections are packed into one chunk while they fit; a section
+    longer than `max_chars` is cut at paragraph breaks (or hard, for a single
+    huge paragraph).
+    """
+    starts = [m.start() for m in MARKDOWN_HEADING.finditer(text_content)]
+    if not starts or starts[0] != 0:
+        starts = [0] + starts
+    sections = [text_content[a:b] for a, b in zip(starts, starts[1:] + [len(text_content)])]
+
+    pieces = []
+    for section in sections:
+        if len(section) <= max_chars:
+            pieces.append(section)
+            continue
+        for paragraph in section.split('\n\n'):
+            for k in range(0, len(paragraph), max_chars):
+                pieces.append(paragraph[k:k + max_chars] + '\n\n')
+
+    chunks = ['']
+    for piece in pieces:
+        if chunks[-1] and len(chunks[-1]) + len(piece) > max_chars:
+            chunks.append('')
+        chunks[-1] += piece
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def request_sections(args, actor_config, prompt, schema_name, max_attempts=3):
+    """Ask a fresh agent for a `{"sections": [...]}` object; returns (json, input_token, output_token)."""
+    actor_agent = create_actor_agent(args, structured_config(actor_config, schema_name))
+    input_token, output_token = 0, 0
+    for _ in range(max_attempts):
         actor_agent.reset()
         response = actor_agent.step(prompt)
-        input_token, output_token = account_token(response)
-
+        step_in, step_out = account_token(response)
+        input_token += step_in
+        output_token += step_out
         content_json = get_json_from_response(response.msgs[0].content)
+        errors = schema_errors(content_json, schema_name)
+        if not errors:
+            return content_json, input_token, output_token
+        print(f'Error: Invalid response ({"; ".join(errors[:3])}), retrying...')
+    raise RuntimeError('The LLM did not return any sections')
+
+
+def map_reduce_raw_content(args, actor_config, text_content, chunk_chars):
+    """
+    Summarize a long paper chunk by chunk, then merge the partial sections.
+
+    Chunks are summarized concurrently (up to `--max_workers`), so latency is
+    bounded by the slowest chunk rather than one prompt over the whole paper,
+    and nothing past the model's context window is dropped.
+    Returns (content_json, input_token, output_token).
+    """
+    chunks = split_markdown_chunks(text_content, chunk_chars)
+    print(f'Summarizing {len(text_content)} chars in {len(chunks)} chunks')
+    map_template = Template(open(project_path(RAW_CONTENT_MAP_PROMPT)).read())
+    reduce_template = Template(open(project_path(RAW_CONTENT_REDUCE_PROMPT)).read())
+
+    def _map_chunk(index):
+        with trace_context(chunk=index):
+            prompt = map_template.render(
+                markdown_document=chunks[index],
+                chunk_index=index + 1,
+                num_chunks=len(chunks),
+            )
+            return request_sections(args, actor_config, prompt, 'raw_content_map')
+
+    max_workers = min(getattr(args, 'max_workers', 4), len(chunks))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        mapped = list(executor.map(
+            lambda index: contextvars.copy_context().run(_map_chunk, index), range(len(chunks))
+        ))
+
+    input_token = sum(tokens_in for _, tokens_in, _ in mapped)
+    output_token = sum(tokens_out for _, _, tokens_out in mapped)
+    parts = [json.dumps(part['sections'], ensure_ascii=False, indent=1) for part, _, _ in mapped]
+
+    max_sections = getattr(args, 'max_sections', 9)
+    prompt = reduce_template.render(
+        parts=parts,
+        max_sections=max_sections,
+        min_sections=min(5, max_sections),
+    )
+    content_json, reduce_in, reduce_out = request_sections(args, actor_config, prompt, 'raw_content')
+    return content_json, input_token + reduce_in, output_token + reduce_out
+
+
+def limit_sections(sections, max_sections):
+    """
+    Keep at most `max_sections` sections (0 keeps all): the first 2, a random
+    sample of the middle ones in paper order, and the last 2. With a limit
+    below 4, fewer first and last ones are kept; the title section always is.
+    """
+    if not max_sections or len(sections) <= max_sections:
+        return sections
+    head = min(2, (max_sections + 1) // 2)
+    tail = min(2, max_sections - head)
+    middle = sections[head:len(sections) - tail]
+    picked = sorted(random.sample(range(len(middle)), max_sections - head - tail))
+    return sections[:head] + [middle[i] for i in picked] + sections[len(sections) - tail:]
+
 
-        if len(content_json) > 0:
-            break
-        print('Error: Empty response, retrying...')
-        if args.model_name_t.startswith('vllm_qwen'):
-            text_content = text_content[:80000]
+@retry(stop=stop_after_attempt(5))
+def parse_raw(args, actor_config, version=1, text_content=None):
+    raw_source = args.poster_path
+
+    if text_content is None:
+        documents, text_content = convert_pdf(
+            raw_source,
+            shard_pages=getattr(args, 'shard_pages', None),
+            shard_workers=getattr(args, 'shard_workers', 4),
+            page_images=getattr(args, 'save_page_images', False),
+            text_layer=not getattr(args, 'docling_text', False),
+        )
+    else:
+        # Caller already converted the PDF
+        documents = None
+
+    chunk_chars = getattr(args, 'raw_content_chunk_chars', None)
+    if chunk_chars and len(text_content) > chunk_chars:
+        content_json, input_token, output_token = map_reduce_raw_content(args, actor_config, text_content, chunk_chars)
+    else:
+        template = Template(open(project_path(RAW_CONTENT_PROMPTS[version])).read())
+        actor_agent = create_actor_agent(args, structured_config(actor_config, 'raw_content'))
+
+        input_token, output_token = 0, 0
+        for attempt in range(3):
+            prompt = template.render(
+                markdown_document=text_content, 
+            )
+            actor_agent.reset()
+            response = actor_agent.step(prompt)
+            step_input_token, step_output_token = account_token(response)
+            input_token += step_input_token
+            output_token += step_output_token
+
+            content_json = get_json_from_response(response.msgs[0].content)
+
+            errors = schema_errors(content_json, 'raw_content')
+            if not errors:
+                break
+            print(f'Error: Invalid response ({"; ".join(errors[:3])}), retrying...')
+            if args.model_name_t.startswith('vllm_qwen'):
+                text_content = text_content[:80000]
+        else:
+            raise RuntimeError(f'The raw content agent did not follow the format: {errors[:3]}')
 
-    if len(content_json['sections']) > 9:
-        # First 2 sections + randomly select 5 sections + last 2 sections
-        selected_sections = content_json['sections'][:2] + random.sample(content_json['sections'][2:-2], 5) + content_json['sections'][-2:]
-        content_json['sections'] = selected_sections
+    content_json['sections'] = limit_sections(content_json['sections'], getattr(args, 'max_sections', 9))
 
     has_title = False
 
@@ -120,97 +457,149 @@ def parse_raw(args, actor_config, version=1):
         print('Ouch! The response is invalid, the LLM is not following the format :(')
         raise
 
-    os.makedirs('contents', exist_ok=True)
-    json.dump(content_json, open(f'contents/<{args.model_name_t}_{args.model_name_v}>_{args.poster_name}_raw_content.json', 'w'), indent=4)
-    return input_token, output_token, raw_result
-
-
-def gen_image_and_table(args, conv_res):
+    ctx = get_run_context(args)
+    ctx.makedirs('contents')
+    json.dump(content_json, open(ctx.path(f'contents/<{args.model_name_t}_{args.model_name_v}>_{args.poster_name}_raw_content.json'), 'w'), indent=4)
+    return input_token, output_token, documents
+
+
+def reference_size(crop):
+    """Size of a preview crop expressed at IMAGE_RESOLUTION_SCALE."""
+    factor = IMAGE_RESOLUTION_SCALE / PREVIEW_IMAGE_SCALE
+    return round(crop.width * factor), round(crop.height * factor)
+
+
+def element_location(element, document):
+    """Page number and top-left-origin bbox (PDF points) of a picture or table, for re-rendering."""
+    if not element.prov:
+        return {}
+    prov = element.prov[0]
+    page_height = document.pages[prov.page_no].size.height
+    bbox = prov.bbox.to_top_left_origin(page_height=page_height)
+    return {'page_no': prov.page_no, 'bbox': [bbox.l, bbox.t, bbox.r, bbox.b]}
+
+
+def gen_image_and_table(args, documents):
+    """
+    Export figure/table crops (plus page images and document exports when
+    requested) and their captions.
+
+    `documents` are the page-ordered shards from `convert_pdf` (a single
+    document is accepted too); pictures and tables are numbered across all of
+    them, so the numbering is the same whether or not the PDF was sharded.
+    Crops go through a `FigureAssetStore`: duplicates and sub-figures are left
+    out of the returned images/tables, and every entry names its `asset` in
+    the store's index (`load_asset_index`).
+    """
+    if isinstance(documents, DoclingDocument):
+        documents = [documents]
     input_token, output_token = 0, 0
     raw_source = args.poster_path
+    ctx = get_run_context(args)
 
-    output_dir = Path(f'<{args.model_name_t}_{args.model_name_v}>_images_and_tables/{args.poster_name}')
+    output_dir = Path(ctx.path(f'<{args.model_name_t}_{args.model_name_v}>_images_and_tables/{args.poster_name}'))
 
     output_dir.mkdir(parents=True, exist_ok=True)
     doc_filename = args.poster_name
-
-    # Save page images
-    for page_no, page in conv_res.document.pages.items():
-        page_no = page.page_no
-        page_image_filename = output_dir / f"{doc_filename}-{page_no}.png"
-        with page_image_filename.open("wb") as fp:
-            page.image.pil_image.save(fp, format="PNG")
-
-    # Save images of figures and tables
+    store = FigureAssetStore(str(output_dir), doc_filename)
+
+    # Save page images (opt-in; only the figure and table crops are used downstream)
+    if getattr(args, 'save_page_images', False):
+        page_images = [
+            (page.image.pil_image, output_dir / f"{doc_filename}-{page.page_no}.png")
+            for document in documents
+            for page in document.pages.values()
+            if page.image is not None
+        ]
+        with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:
+            list(executor.map(lambda item: item[0].save(item[1], format="PNG"), page_images))
+
+    # Register images of figures and tables; sizes are read from memory rather than from the written files
     table_counter = 0
     picture_counter = 0
-    for element, _level in conv_res.document.iterate_items():
-        if isinstance(element, TableItem):
-            table_counter += 1
-            element_image_filename = (
-                output_dir / f"{doc_filename}-table-{table_counter}.png"
-            )
-            with element_image_filename.open("wb") as fp:
-                element.get_image(conv_res.document).save(fp, "PNG")
-
-        if isinstance(element, PictureItem):
-            picture_counter += 1
-            element_image_filename = (
-                output_dir / f"{doc_filename}-picture-{picture_counter}.png"
-            )
-            with element_image_filename.open("wb") as fp:
-                element.get_image(conv_res.document).save(fp, "PNG")
-
-    # Save markdown with embedded pictures
-    md_filename = output_dir / f"{doc_filename}-with-images.md"
-    conv_res.document.save_as_markdown(md_filename, image_mode=ImageRefMode.EMBEDDED)
-
-    # Save markdown with externally referenced pictures
-    md_filename = output_dir / f"{doc_filename}-with-image-refs.md"
-    conv_res.document.save_as_markdown(md_filename, image_mode=ImageRefMode.REFERENCED)
-
-    # Save HTML with externally referenced pictures
-    html_filename = output_dir / f"{doc_filename}-with-image-refs.html"
-    conv_res.document.save_as_html(html_filename, image_mode=ImageRefMode.REFERENCED)
-
-    tables = {}
-
-    table_index = 1
-    for table in conv_res.document.tables:
-        caption = table.caption_text(conv_res.document)
-        if len(caption) > 0:
-            table_img_path = f'<{args.model_name_t}_{args.model_name_v}>_images_and_tables/{args.poster_name}/{args.poster_name}-table-{table_index}.png'
-            table_img = PIL.Image.open(table_img_path)
-            tables[str(table_index)] = {
-                'caption': caption,
-                'table_path': table_img_path,
-                'width': table_img.width,
-                'height': table_img.height,
-                'figure_size': table_img.width * table_img.height,
-                'figure_aspect': table_img.width / table_img.height,
-            }
-
-        table_index += 1
-
-    images = {}
-    image_index = 1
-    for image in conv_res.document.pictures:
-        caption = image.caption_text(conv_res.document)
-        if len(caption) > 0:
-            image_img_path = f'<{args.model_name_t}_{args.model_name_v}>_images_and_tables/{args.poster_name}/{args.poster_name}-picture-{image_index}.png'
-            image_img = PIL.Image.open(image_img_path)
-            images[str(image_index)] = {
-                'caption': caption,
-                'image_path': image_img_path,
-                'width': image_img.width,
-                'height': image_img.height,
-                'figure_size': image_img.width * image_img.height,
-                'figure_aspect': image_img.width / image_img.height,
-            }
-        image_index += 1
-
-    json.dump(images, open(f'<{args.model_name_t}_{args.model_name_v}>_images_and_tables/{args.poster_name}_images.json', 'w'), indent=4)
-    json.dump(tables, open(f'<{args.model_name_t}_{args.model_name_v}>_images_and_tables/{args.poster_name}_tables.json', 'w'), indent=4)
+    for document in documents:
+        for element, _level in document.iterate_items():
+            if isinstance(element, TableItem):
+                kind = 'table'
+                table_counter += 1
+                index = table_counter
+            elif isinstance(element, PictureItem):
+                kind = 'picture'
+                picture_counter += 1
+                index = picture_counter
+            else:
+                continue
+            element_image = element.get_image(document)
+            if element_image is None:
+                continue
+            width, height = reference_size(element_image)
+            location = element_location(element, document)
+            store.add(kind, index, element_image, width, height, location.get('page_no'), location.get('bbox'))
+
+    # Markdown/HTML exports of the whole document are only for inspection
+    if getattr(args, 'save_doc_exports', False):
+        for shard_index, document in enumerate(documents):
+            shard_suffix = f"-part{shard_index + 1}" if len(documents) > 1 else ""
+
+            # Save markdown with embedded pictures
+            md_filename = output_dir / f"{doc_filename}{shard_suffix}-with-images.md"
+            document.save_as_markdown(md_filename, image_mode=ImageRefMode.EMBEDDED)
+
+            # Save markdown with externally referenced pictures
+            md_filename = output_dir / f"{doc_filename}{shard_suffix}-with-image-refs.md"
+            document.save_as_markdown(md_filename, image_mode=ImageRefMode.REFERENCED)
+
+            # Save HTML with externally referenced pictures
+            html_filename = output_dir / f"{doc_filename}{shard_suffix}-with-image-refs.html"
+            document.save_as_html(html_filename, image_mode=ImageRefMode.REFERENCED)
+
+    def _asset_entry(key, caption, path_key):
+        # Size, page, box and pyramid files are in the asset index under `asset`
+        asset = store.assets[key]
+        return {
+            'caption': caption,
+            path_key: store.path(key),
+            'asset': key,
+            'width': asset['width'],
+            'height': asset['height'],
+            'figure_size': asset['width'] * asset['height'],
+            'figure_aspect': asset['aspect'],
+        }
+
+    def _collect(kind, items, path_key):
+        candidates = []
+        for index, (document, element) in enumerate(items, start=1):
+            caption = element.caption_text(document)
+            key = store.key(kind, index)
+            if len(caption) > 0 and key in store.assets:
+                store.set_caption(key, caption)
+                candidates.append((index, key, caption))
+
+        # Largest crops first, so a sub-figure is always checked against its parent
+        accepted = []
+        by_area = sorted(candidates, key=lambda c: -store.assets[c[1]]['width'] * store.assets[c[1]]['height'])
+        for index, key, _ in by_area:
+            duplicate_of = store.find_duplicate(key, accepted)
+            if duplicate_of is not None:
+                print(f'Skipping {kind} {index}, a duplicate of {duplicate_of}')
+                store.mark_duplicate(key, duplicate_of)
+            else:
+                accepted.append(key)
+
+        return {
+            str(index): _asset_entry(key, caption, path_key)
+            for index, key, caption in candidates
+            if key in accepted
+        }
+
+    tables = _collect('table', [(d, t) for d in documents for t in d.tables], 'table_path')
+    images = _collect('picture', [(d, p) for d in documents for p in d.pictures], 'image_path')
+
+    with span('export', name='asset_store.save', assets=len(store.assets)):
+        store.save(max_workers=min(8, os.cpu_count() or 1))
+
+    json.dump(images, open(ctx.path(f'<{args.model_name_t}_{args.model_name_v}>_images_and_tables/{args.poster_name}_images.json'), 'w'), indent=4)
+    json.dump(tables, open(ctx.path(f'<{args.model_name_t}_{args.model_name_v}>_images_and_tables/{args.poster_name}_tables.json'), 'w'), indent=4)
 
     return input_token, output_token, images, tables
 
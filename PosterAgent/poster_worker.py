@@ -0,0 +1,178 @@
+from PosterAgent.new_pipeline import build_parser, run_pipeline
+from PosterAgent.parse_raw import get_doc_converter
+from PosterAgent.tree_split_layout import load_layout_models
+from utils.src.utils import set_soffice_profile_root, warm_up_soffice
+
+from docling.datamodel.base_models import InputFormat
+
+import argparse
+import json
+import os
+import shutil
+import time
+import traceback
+
+
+class PosterWorker:
+    """
+    A resident poster generator.
+
+    Everything that `python -m PosterAgent.new_pipeline` pays for on every start
+    (library imports, the docling pipeline, the layout models from `load_layout_models()`
+    and the LibreOffice profile) is set up once here and reused for every job.
+    """
+
+    def __init__(self, soffice_profile_dir='tmp/soffice_profiles'):
+        start_time = time.time()
+        print('Warming up poster worker...')
+
+        for figures_only in (True, False):
+            get_doc_converter(figures_only=figures_only).initialize_pipeline(InputFormat.PDF)
+        self.layout_models = load_layout_models()
+
+        set_soffice_profile_root(soffice_profile_dir)
+        warm_up_soffice()
+
+        self.parser = build_parser()
+        print(f'Worker ready in {time.time() - start_time:.2f} seconds')
+
+    def make_args(self, job):
+        """
+        Turn a job dict (`poster_path` plus any `new_pipeline` CLI option, by
+        its argparse dest name) into an args namespace with CLI defaults.
+        """
+        args = self.parser.parse_args([])
+        for key, value in job.items():
+            if key == 'job_id':
+                continue
+            if not hasattr(args, key):
+                raise ValueError(f'Unknown pipeline option in job: {key}')
+            setattr(args, key, value)
+        if not args.poster_path:
+            raise ValueError('Job is missing poster_path')
+        return args
+
+    def run_job(self, job):
+        args = self.make_args(job)
+        return run_pipeline(args, layout_models=self.layout_models)
+
+
+def load_job(job_path):
+    with open(job_path, 'r') as f:
+        return json.load(f)
+
+
+def claim_spool_job(spool_dir):
+    """
+    Move the oldest job in `<spool_dir>/incoming` to `<spool_dir>/processing`.
+
+    The rename is atomic, so several workers can share one spool directory.
+    Returns the claimed path, or None if there is nothing to do.
+    """
+    incoming_dir = os.path.join(spool_dir, 'incoming')
+    processing_dir = os.path.join(spool_dir, 'processing')
+    os.makedirs(incoming_dir, exist_ok=True)
+    os.makedirs(processing_dir, exist_ok=True)
+
+    job_files = sorted(
+        (f for f in os.listdir(incoming_dir) if f.endswith('.json')),
+        key=lambda f: os.path.getmtime(os.path.join(incoming_dir, f))
+    )
+    for job_file in job_files:
+        claimed_path = os.path.join(processing_dir, job_file)
+        try:
+            os.rename(os.path.join(incoming_dir, job_file), claimed_path)
+        except FileNotFoundError:
+            # Another worker got there first
+            continue
+        return claimed_path
+    return None
+
+
+def finish_spool_job(spool_dir, claimed_path, result=None, error=None):
+    status_dir = os.path.join(spool_dir, 'failed' if error else 'done')
+    os.makedirs(status_dir, exist_ok=True)
+    job_file = os.path.basename(claimed_path)
+    shutil.move(claimed_path, os.path.join(status_dir, job_file))
+
+    job_stem = os.path.splitext(job_file)[0]
+    if error:
+        with open(os.path.join(status_dir, f'{job_stem}.error.txt'), 'w') as f:
+            f.write(error)
+    else:
+        with open(os.path.join(status_dir, f'{job_stem}.result.json'), 'w') as f:
+            json.dump(result, f, indent=4)
+
+
+def serve_spool(worker, spool_dir, poll_interval=2.0, exit_when_empty=False):
+    while True:
+        claimed_path = claim_spool_job(spool_dir)
+        if claimed_path is None:
+            if exit_when_empty:
+                return
+            time.sleep(poll_interval)
+            continue
+
+        print(f'\n📥 Job: {claimed_path}')
+        try:
+            result = worker.run_job(load_job(claimed_path))
+        except Exception:
+            error = traceback.format_exc()
+            print(f'❌ Job failed: {claimed_path}\n{error}')
+            finish_spool_job(spool_dir, claimed_path, error=error)
+        else:
+            finish_spool_job(spool_dir, claimed_path, result=result)
+
+
+def serve_manifest(worker, manifest_path):
+    """
+    Run every job line of a JSONL manifest in order.
+
+    Outcomes are appended to `<manifest>.results.jsonl`; jobs already recorded
+    there are skipped, so an interrupted manifest can simply be rerun.
+    """
+    results_path = manifest_path + '.results.jsonl'
+    finished = set()
+    if os.path.exists(results_path):
+        with open(results_path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    finished.add(json.loads(line)['line'])
+
+    with open(manifest_path, 'r') as f:
+        jobs = [(i, json.loads(line)) for i, line in enumerate(f) if line.strip()]
+
+    for line_no, job in jobs:
+        if line_no in finished:
+            continue
+        print(f'\n📥 Job {line_no}: {job.get("job_id", job.get("poster_path"))}')
+        record = {'line': line_no, 'job_id': job.get('job_id')}
+        try:
+            record['result'] = worker.run_job(job)
+            record['status'] = 'done'
+        except Exception:
+            record['status'] = 'failed'
+            record['error'] = traceback.format_exc()
+            print(f'❌ Job {line_no} failed\n{record["error"]}')
+        with open(results_path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Long-lived poster worker')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--spool_dir', type=str,
+                       help='Directory spool; drop job JSON files into <spool_dir>/incoming')
+    group.add_argument('--manifest', type=str,
+                       help='JSONL file with one job per line')
+    parser.add_argument('--poll_interval', type=float, default=2.0)
+    parser.add_argument('--exit_when_empty', action='store_true',
+                        help='Stop once the spool is drained instead of polling')
+    parser.add_argument('--soffice_profile_dir', type=str, default='tmp/soffice_profiles')
+    args = parser.parse_args()
+
+    worker = PosterWorker(soffice_profile_dir=args.soffice_profile_dir)
+    if args.spool_dir:
+        serve_spool(worker, args.spool_dir, args.poll_interval, args.exit_when_empty)
+    else:
+        serve_manifest(worker, args.manifest)
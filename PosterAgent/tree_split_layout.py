@@ -2,11 +2,35 @@ from lxml import etree
 import os
 import copy
 import glob
+import json
+import hashlib
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 from sklearn.linear_model import LinearRegression, LogisticRegression
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 
+from utils.run_context import project_path
+from utils.cache_utils import file_sha256
+
+# Figures take at most this fraction of their panel's height
+FIGURE_MAX_HEIGHT_RATIO = 0.60
+
+# Bump when the features or fitted parameters change, so stored layout models are retrained
+LAYOUT_MODEL_VERSION = 1
+LAYOUT_MODEL_DIR = os.path.join('cache', 'layout_models')
+# Bump when feature extraction changes, so cached per-poster features are recomputed
+LAYOUT_FEATURE_VERSION = 1
+LAYOUT_FEATURE_DIR = os.path.join('cache', 'layout_features')
+# Fewer posters than this to parse are not worth starting a process pool for
+LAYOUT_FEATURE_POOL_MIN = 64
+
+# Column order of the feature arrays from `extract_poster_features`
+PANEL_FEATURE_COLUMNS = ("tp", "gp", "sp", "rp")
+FIGURE_FEATURE_COLUMNS = ("sp", "rp", "lp", "sg", "rg", "hg", "ug")
+
 def parse_xml_with_recovery(xml_file_path):
     parser = etree.XMLParser(recover=True)
     tree = etree.parse(xml_file_path, parser)
@@ -41,8 +65,11 @@ def parse_poster_xml(xml_file):
         ]
       }
     """
-    root = parse_xml_with_recovery(xml_file)
+    return poster_data_from_root(parse_xml_with_recovery(xml_file))
+
 
+def poster_data_from_root(root):
+    """`parse_poster_xml` on an already parsed <Poster> element."""
     # Poster dimensions
     poster_w = float(root.get("Width", "1"))
     poster_h = float(root.get("Height", "1"))
@@ -191,24 +218,14 @@ def train_panel_attribute_inference(panel_records):
         'sigma_r': float
       }
     """
-    # Build data arrays
-    X_list  = []
-    sp_list = []
-    rp_list = []
-
-    for rec in panel_records:
-        tp = rec['tp']
-        gp = rec['gp']
-        sp = rec['sp']
-        rp = rec['rp']
-        # X = [tp, gp, 1]
-        X_list.append([tp, gp, 1.0])
-        sp_list.append(sp)
-        rp_list.append(rp)
-
-    X_array = np.array(X_list, dtype=float)
-    y_sp = np.array(sp_list, dtype=float)
-    y_rp = np.array(rp_list, dtype=float)
+    return fit_panel_model(records_to_columns(panel_records, PANEL_FEATURE_COLUMNS))
+
+
+def fit_panel_model(panel_features):
+    """`train_panel_attribute_inference` on a (N, 4) array in PANEL_FEATURE_COLUMNS order."""
+    tp, gp, y_sp, y_rp = panel_features.T
+    # X = [tp, gp, 1]
+    X_array = np.column_stack([tp, gp, np.ones(len(panel_features))])
 
     # Fit linear regression for sp
     linreg_sp = LinearRegression(fit_intercept=False)
@@ -236,8 +253,11 @@ def train_panel_attribute_inference(panel_records):
 
 
 def parse_poster_xml_for_figures(xml_path):
-    root = parse_xml_with_recovery(xml_path)
+    return figure_records_from_root(parse_xml_with_recovery(xml_path))
+
 
+def figure_records_from_root(root):
+    """`parse_poster_xml_for_figures` on an already parsed <Poster> element."""
     poster_w = float(root.get("Width", "1"))
     poster_h = float(root.get("Height", "1"))
     poster_area = poster_w * poster_h
@@ -274,13 +294,15 @@ def parse_poster_xml_for_figures(xml_path):
 
 
 def train_figure_model(figure_records):
-    X_hg, y_hg, X_ug, y_ug = [], [], [], []
-    for r in figure_records:
-        feats = [r["sp"], r["lp"], r["sg"], 1.0]
-        X_hg.append(feats)
-        y_hg.append(r["hg"])
-        X_ug.append(feats)
-        y_ug.append(r["ug"])
+    return fit_figure_model(records_to_columns(figure_records, FIGURE_FEATURE_COLUMNS))
+
+
+def fit_figure_model(figure_features):
+    """`train_figure_model` on a (N, 7) array in FIGURE_FEATURE_COLUMNS order."""
+    columns = {name: figure_features[:, i] for i, name in enumerate(FIGURE_FEATURE_COLUMNS)}
+    feats = np.column_stack([columns["sp"], columns["lp"], columns["sg"], np.ones(len(figure_features))])
+    X_hg, y_hg = feats, columns["hg"].astype(int)
+    X_ug, y_ug = feats, columns["ug"]
 
     clf_hg = LogisticRegression(multi_class="multinomial", solver="lbfgs", fit_intercept=False)
     clf_hg.fit(X_hg, y_hg)
@@ -297,35 +319,294 @@ def train_figure_model(figure_records):
     }
 
 
-def main_train():
-    poster_dataset_path = 'assets/poster_data/Train'
+def records_to_columns(records, columns):
+    """Stack a list of feature dicts into a (len(records), len(columns)) float array."""
+    return np.array([[rec[c] for c in columns] for rec in records], dtype=float).reshape(-1, len(columns))
+
+
+def extract_poster_features(xml_file):
+    """
+    Parse one training poster once and compute both feature sets.
+
+    Returns (panel_features, figure_features) as float arrays in
+    PANEL_FEATURE_COLUMNS and FIGURE_FEATURE_COLUMNS order.
+    """
+    root = parse_xml_with_recovery(xml_file)
+    panel_records = compute_panel_attributes(poster_data_from_root(root))
+    figure_records = figure_records_from_root(root)
+    return (
+        records_to_columns(panel_records, PANEL_FEATURE_COLUMNS),
+        records_to_columns(figure_records, FIGURE_FEATURE_COLUMNS),
+    )
+
+
+class TrainingFeatureCache:
+    """
+    Per-poster feature arrays, stored by content hash under `cache_dir`.
+
+    An index maps each training file's path to its mtime, size and hash, so
+    unchanged files are neither re-hashed nor re-parsed. Only new or edited
+    posters are extracted, across a process pool when there are many.
+    """
+
+    def __init__(self, cache_dir=LAYOUT_FEATURE_DIR):
+        self.root = os.path.join(cache_dir, f'v{LAYOUT_FEATURE_VERSION}')
+        self.index_path = os.path.join(self.root, 'index.json')
+        self.index = {}
+        if os.path.isfile(self.index_path):
+            with open(self.index_path, 'r') as f:
+                self.index = json.load(f)
+        self.dirty = False
+
+    def file_sha(self, xml_file):
+        """Content hash of a training file, reusing the indexed one while mtime and size match."""
+        path = os.path.abspath(xml_file)
+        stat = os.stat(path)
+        entry = self.index.get(path)
+        if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return entry['sha']
+        sha = file_sha256(path)
+        self.index[path] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha': sha}
+        self.dirty = True
+        return sha
+
+    def features_path(self, sha):
+        return os.path.join(self.root, f'{sha}.npz')
+
+    def features(self, xml_files, max_workers=None):
+        """
+        Feature arrays of all `xml_files`, concatenated in file order.
+
+        Args:
+            xml_files: Training posters
+            max_workers: Processes for extracting uncached posters (default: CPU count)
+
+        Returns:
+            (panel_features, figure_features)
+        """
+        shas = [self.file_sha(xml_file) for xml_file in xml_files]
+        missing = {}
+        for xml_file, sha in zip(xml_files, shas):
+            if sha not in missing and not os.path.isfile(self.features_path(sha)):
+                missing[sha] = xml_file
+
+        if missing:
+            print(f'Extracting layout features from {len(missing)} of {len(xml_files)} posters...')
+            os.makedirs(self.root, exist_ok=True)
+            files = list(missing.values())
+            if len(files) >= LAYOUT_FEATURE_POOL_MIN and (max_workers is None or max_workers > 1):
+                with ProcessPoolExecutor(
+                    max_workers=max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                ) as executor:
+                    extracted = list(executor.map(extract_poster_features, files, chunksize=16))
+            else:
+                extracted = [extract_poster_features(xml_file) for xml_file in files]
+            for sha, (panel_features, figure_features) in zip(missing, extracted):
+                tmp_path = f'{self.features_path(sha)}.tmp{os.getpid()}.npz'
+                np.savez(tmp_path, panels=panel_features, figures=figure_features)
+                os.replace(tmp_path, self.features_path(sha))
+        self.save()
+
+        panel_parts, figure_parts = [], []
+        for sha in shas:
+            with np.load(self.features_path(sha)) as data:
+                panel_parts.append(data['panels'])
+                figure_parts.append(data['figures'])
+        return (
+            np.concatenate(panel_parts) if panel_parts else np.empty((0, len(PANEL_FEATURE_COLUMNS))),
+            np.concatenate(figure_parts) if figure_parts else np.empty((0, len(FIGURE_FEATURE_COLUMNS))),
+        )
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f'{self.index_path}.tmp{os.getpid()}'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self.index_path)
+        self.dirty = False
+
+
+def training_xml_files(poster_dataset_path=None):
+    """All poster layout files of the training set, in a stable order."""
+    poster_dataset_path = poster_dataset_path or project_path('assets/poster_data/Train')
     # loop through all folders in the dataset
     xml_files = []
-    for folder in os.listdir(poster_dataset_path):
+    for folder in sorted(os.listdir(poster_dataset_path)):
         folder_path = os.path.join(poster_dataset_path, folder)
         if os.path.isdir(folder_path):
             # find all XML files in this folder
-            xml_files.extend(glob.glob(os.path.join(folder_path, "*.txt")))
+            xml_files.extend(sorted(glob.glob(os.path.join(folder_path, "*.txt"))))
+    return xml_files
+
 
-    all_panel_records = []
+def training_set_sha(xml_files, poster_dataset_path=None, feature_cache=None):
+    """Hash of the training set: every file's path relative to the dataset and its contents."""
+    poster_dataset_path = poster_dataset_path or project_path('assets/poster_data/Train')
+    feature_cache = feature_cache or TrainingFeatureCache()
+    digest = hashlib.sha256(f'layout-models-v{LAYOUT_MODEL_VERSION}'.encode('utf-8'))
     for xml_file in xml_files:
-        poster_data = parse_poster_xml(xml_file)
-        # compute tp, gp, sp, rp
-        panel_attrs = compute_panel_attributes(poster_data)
-        # each panel_attrs entry is {tp, gp, sp, rp}
-        all_panel_records.extend(panel_attrs)
+        digest.update(os.path.relpath(xml_file, poster_dataset_path).encode('utf-8'))
+        digest.update(feature_cache.file_sha(xml_file).encode('utf-8'))
+    feature_cache.save()
+    return digest.hexdigest()
+
 
-    all_figure_records = []
-    for xml_path in xml_files:
-        recs = parse_poster_xml_for_figures(xml_path)
-        all_figure_records.extend(recs)
+def main_train(poster_dataset_path=None, feature_cache=None, max_workers=None):
+    xml_files = training_xml_files(poster_dataset_path)
+    feature_cache = feature_cache or TrainingFeatureCache()
+    panel_features, figure_features = feature_cache.features(xml_files, max_workers=max_workers)
 
-    panel_model_params = train_panel_attribute_inference(all_panel_records)
-    figure_model_params = train_figure_model(all_figure_records)
+    panel_model_params = fit_panel_model(panel_features)
+    figure_model_params = fit_figure_model(figure_features)
 
     return panel_model_params, figure_model_params
 
-def place_text_and_figures_exact(panel_dict, figure_model_params, section_title_height=32):
+
+class SoftmaxClassifier:
+    """
+    The fitted multinomial logistic regression for figure alignment, reduced
+    to its coefficients, so it can be stored as JSON and used without sklearn.
+    """
+
+    def __init__(self, coef, classes):
+        self.coef_ = np.asarray(coef, dtype=float)
+        self.classes_ = np.asarray(classes)
+
+    @classmethod
+    def from_sklearn(cls, clf):
+        return cls(clf.coef_, clf.classes_)
+
+    def predict_proba(self, X):
+        logits = np.asarray(X, dtype=float) @ self.coef_.T
+        if logits.shape[1] == 1:
+            # sklearn keeps a single coefficient row for two classes
+            logits = np.hstack([-logits, logits])
+        logits = logits - logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+
+def layout_model_path(training_sha, model_dir=LAYOUT_MODEL_DIR):
+    return os.path.join(model_dir, f'layout_models_v{LAYOUT_MODEL_VERSION}_{training_sha[:16]}.json')
+
+
+def save_layout_models(panel_model_params, figure_model_params, path, training_sha):
+    """
+    Write fitted layout models as a versioned JSON artifact.
+
+    Only fitted parameters are stored (regression weights, residual
+    variances and the alignment classifier's coefficients), never pickles.
+    """
+    clf_hg = figure_model_params["clf_hg"]
+    artifact = {
+        "version": LAYOUT_MODEL_VERSION,
+        "training_set_sha": training_sha,
+        "panel_model": {
+            "w_s": np.asarray(panel_model_params["w_s"], dtype=float).tolist(),
+            "sigma_s": float(panel_model_params["sigma_s"]),
+            "w_r": np.asarray(panel_model_params["w_r"], dtype=float).tolist(),
+            "sigma_r": float(panel_model_params["sigma_r"]),
+        },
+        "figure_model": {
+            "hg_coef": np.asarray(clf_hg.coef_, dtype=float).tolist(),
+            "hg_classes": np.asarray(clf_hg.classes_).tolist(),
+            "w_u": np.asarray(figure_model_params["w_u"], dtype=float).tolist(),
+            "sigma_u": float(figure_model_params["sigma_u"]),
+        },
+    }
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'w') as f:
+        json.dump(artifact, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def read_layout_models(path):
+    """
+    Read an artifact written by `save_layout_models`.
+
+    Returns (panel_model_params, figure_model_params) in the form `main_train`
+    returns them, or None if the file is missing or from another version.
+    """
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'r') as f:
+        artifact = json.load(f)
+    if artifact.get("version") != LAYOUT_MODEL_VERSION:
+        return None
+    panel = artifact["panel_model"]
+    figure = artifact["figure_model"]
+    panel_model_params = {
+        "w_s": np.array(panel["w_s"]),
+        "sigma_s": panel["sigma_s"],
+        "w_r": np.array(panel["w_r"]),
+        "sigma_r": panel["sigma_r"],
+        "training_set_sha": artifact["training_set_sha"],
+    }
+    figure_model_params = {
+        "clf_hg": SoftmaxClassifier(figure["hg_coef"], figure["hg_classes"]),
+        "w_u": np.array(figure["w_u"]),
+        "sigma_u": figure["sigma_u"],
+    }
+    return panel_model_params, figure_model_params
+
+
+def train_layout_models(poster_dataset_path=None, model_dir=LAYOUT_MODEL_DIR, max_workers=None):
+    """Fit the layout models on the training set and store them; returns the artifact path."""
+    xml_files = training_xml_files(poster_dataset_path)
+    feature_cache = TrainingFeatureCache()
+    training_sha = training_set_sha(xml_files, poster_dataset_path, feature_cache)
+    panel_model_params, figure_model_params = main_train(poster_dataset_path, feature_cache, max_workers)
+    path = layout_model_path(training_sha, model_dir)
+    save_layout_models(panel_model_params, figure_model_params, path, training_sha)
+    return path
+
+
+def load_layout_models(poster_dataset_path=None, model_dir=LAYOUT_MODEL_DIR, retrain=False):
+    """
+    Layout models for the current training set, trained only if no stored
+    artifact matches it.
+
+    The artifact is keyed by a hash of the training files, so editing the
+    training set (or bumping LAYOUT_MODEL_VERSION) triggers one retrain.
+
+    Returns (panel_model_params, figure_model_params) as `main_train` does;
+    `panel_model_params["training_set_sha"]` identifies the artifact.
+    """
+    xml_files = training_xml_files(poster_dataset_path)
+    feature_cache = TrainingFeatureCache()
+    training_sha = training_set_sha(xml_files, poster_dataset_path, feature_cache)
+    path = layout_model_path(training_sha, model_dir)
+    models = None if retrain else read_layout_models(path)
+    if models is None:
+        print(f'Training layout models on {len(xml_files)} posters...')
+        panel_model_params, figure_model_params = main_train(poster_dataset_path, feature_cache)
+        save_layout_models(panel_model_params, figure_model_params, path, training_sha)
+        models = read_layout_models(path)
+    return models
+
+def figure_placement_params(panel_dict, figure_model_params):
+    """
+    Alignment class (hg) and the mean / std of the width fraction (ug) the
+    figure models predict for a panel's figure.
+    """
+    feat      = np.array([panel_dict["sp"],
+                          panel_dict["text_len"],
+                          panel_dict["figure_size"],
+                          1.0]).reshape(1, -1)
+
+    clf_hg    = figure_model_params["clf_hg"]
+    hg_sample = int(np.argmax(clf_hg.predict_proba(feat)[0]))
+
+    mean_ug   = float(np.dot(figure_model_params["w_u"], feat.flatten()))
+    sigma_u   = float(np.sqrt(figure_model_params["sigma_u"]))
+    return hg_sample, mean_ug, sigma_u
+
+
+def place_text_and_figures_exact(panel_dict, figure_model_params, section_title_height=32, ug_sample=None):
     """
     Lay out text and figure boxes inside a panel.
 
@@ -333,6 +614,8 @@ def place_text_and_figures_exact(panel_dict, figure_model_params, section_title_
         • width  ≤ panel width
         • height ≤ 0.60 × panel height      (empirical upper‑bound you already used)
         • width / height == panel_dict["figure_aspect"]
+
+    `ug_sample` fixes the figure's width fraction instead of drawing it.
     """
     # ---------------- Constants used for text layout -----------------
     char_width_px  = 7
@@ -390,24 +673,16 @@ def place_text_and_figures_exact(panel_dict, figure_model_params, section_title_
     # Case 2 — there *is* a figure
     # -----------------------------------------------------------------------
     # 1.  Sample horizontal‑alignment class (hg) and raw width fraction (ug)
-    feat      = np.array([panel_dict["sp"],
-                          panel_dict["text_len"],
-                          panel_dict["figure_size"],
-                          1.0]).reshape(1, -1)
-
-    clf_hg    = figure_model_params["clf_hg"]
-    hg_sample = int(np.argmax(clf_hg.predict_proba(feat)[0]))
-
-    mean_ug   = float(np.dot(figure_model_params["w_u"], feat.flatten()))
-    sigma_u   = float(np.sqrt(figure_model_params["sigma_u"]))
-    ug_sample = float(np.clip(np.random.normal(mean_ug, sigma_u), 0.10, 0.80))  # 10‑80 % of width
+    hg_sample, mean_ug, sigma_u = figure_placement_params(panel_dict, figure_model_params)
+    if ug_sample is None:
+        ug_sample = float(np.clip(np.random.normal(mean_ug, sigma_u), 0.10, 0.80))  # 10‑80 % of width
 
     # 2.  **Size the figure while *preserving* aspect ratio**
     aspect     = float(panel_dict["figure_aspect"])       # width / height
     fig_w      = ug_sample * w_p                          # preliminary width
     fig_h      = fig_w / aspect
 
-    max_fig_h  = 0.60 * h_p                               # same limit you had
+    max_fig_h  = FIGURE_MAX_HEIGHT_RATIO * h_p            # same limit you had
     if fig_h > max_fig_h:                                 # too tall → scale down
         scale  = max_fig_h / fig_h
         fig_w *= scale
@@ -504,50 +779,201 @@ def infer_panel_attrs(panel_model, tp, gp):
     return sp, rp
 
 
-def panel_layout_generation(panels, x, y, w, h):
-    # If only 1 panel, place it entirely
-    if len(panels) == 1:
-        p = panels[0]
-        cur_rp = (w/h) if h>1e-9 else p["rp"]
-        loss = abs(p["rp"] - cur_rp)
-        arrangement = [{
-            "panel_name": p["section_name"],
-            "panel_id": p["panel_id"],
-            "x": x, "y": y,
-            "width": w, "height": h
-        }]
-        return loss, arrangement
-
-    best_loss = float('inf')
-    best_arr = []
-    total_sp = sum(pp["sp"] for pp in panels)
+# The layout DP tabulates each panel run's loss over box aspect ratios (w / h)
+# on a log grid spanning [1 / LAYOUT_ASPECT_LIMIT, LAYOUT_ASPECT_LIMIT]
+LAYOUT_ASPECT_GRID = 512
+LAYOUT_ASPECT_LIMIT = 1000.0
+# Splits whose estimate is within this fraction of the best one are compared exactly
+LAYOUT_NEAR_TIE = 0.01
+
+# Text capacity estimates use the default font metrics of
+# utils.wei_utils.char_capacity, which sizes the textboxes later
+CAPACITY_FONT_SIZE = 40 * (96 / 72)
+CAPACITY_CHAR_WIDTH_RATIO = 0.54
+
+# Candidate scoring (see score_layout_candidates)
+CANDIDATE_CAPACITY_WEIGHT = 1.0
+CANDIDATE_FIGURE_WEIGHT = 0.5
+
+
+def estimated_text_capacity(width, height, figure_height=0.0, title_height=0.0):
+    """
+    Characters that fit in a panel (lines x characters per line, without
+    char_capacity's constant factor) once its figure and heading are taken
+    out. Works elementwise on numpy arrays.
+    """
+    text_height = height - figure_height - title_height
+    chars_per_line = np.maximum(1, np.floor(width / (CAPACITY_FONT_SIZE * CAPACITY_CHAR_WIDTH_RATIO)))
+    lines = np.maximum(0, np.floor(text_height / CAPACITY_FONT_SIZE))
+    return chars_per_line * lines
+
+
+def panel_layout_generation(panels, x, y, w, h, capacity_weight=0.0, figure_ug=None):
+    """
+    Best guillotine split of the box (x, y, w, h) into `panels`; see
+    `panel_layout_candidates`. Returns (loss, arrangement).
+    """
+    return panel_layout_candidates(
+        panels, x, y, w, h, num_candidates=1, capacity_weight=capacity_weight, figure_ug=figure_ug
+    )[0]
+
+
+def panel_layout_candidates(
+    panels, x, y, w, h, num_candidates=1, capacity_weight=0.0, figure_ug=None, section_title_height=32
+):
+    """
+    Find the guillotine split of the box (x, y, w, h) into `panels`, in order,
+    whose panel aspect ratios best match their targets (`rp`).
+
+    Every split cuts a contiguous run of panels in two, horizontally or
+    vertically, at the point that gives each side its share of `sp`; the loss
+    is the summed |rp - w/h| over all panels. A split scales the box's aspect
+    ratio by a factor that only depends on the run, so the best loss of a run
+    is a function of its box aspect alone. That function is tabulated for all
+    O(n^2) runs, shortest first, in O(n^3) vectorized steps. The tree is then
+    built top-down at the exact geometry; where the interpolated estimates of
+    several splits are within LAYOUT_NEAR_TIE, each is built and the best
+    exact loss wins. Ties are broken as in an exhaustive search: first split
+    point, horizontal before vertical.
+
+    With `num_candidates` > 1, every first split of the box is built and the
+    best `num_candidates` distinct arrangements are returned. Split trees that
+    only differ in the order of their cuts give the same boxes and count once;
+    when that leaves too few, the next-best subtrees of each first split are
+    combined as well.
+
+    With `capacity_weight` > 0, each panel's loss also includes the relative
+    gap between its text capacity (`estimated_text_capacity`, after its
+    heading and its figure at width fraction `figure_ug[panel_id]`) and its
+    share of the text. That share is `text_len` over all panels, applied to
+    the capacity all panels would have at their target aspect ratios. A
+    panel's area is fixed by its `sp` share, so this too depends only on its
+    aspect ratio, and the search above still applies.
+
+    Returns a list of (loss, arrangement), best first, with one box per
+    panel in panel order in each arrangement.
+    """
     n = len(panels)
+    if n == 0:
+        return [(float('inf'), [])]
+
+    prefix_sp = np.concatenate([[0.0], np.cumsum([p["sp"] for p in panels])])
+    log_aspects = np.linspace(-np.log(LAYOUT_ASPECT_LIMIT), np.log(LAYOUT_ASPECT_LIMIT), LAYOUT_ASPECT_GRID)
+    aspects = np.exp(log_aspects)
+    figure_ug = figure_ug or {}
+    areas = [p["sp"] / prefix_sp[-1] * w * h for p in panels]
+
+    def panel_capacity(i, bw, bh):
+        p = panels[i]
+        figure_height = 0.0
+        if p["figure_size"] > 0 and p["panel_id"] in figure_ug:
+            figure_height = np.minimum(
+                figure_ug[p["panel_id"]] * bw / p["figure_aspect"], FIGURE_MAX_HEIGHT_RATIO * bh
+            )
+        return estimated_text_capacity(bw, bh, figure_height, np.minimum(section_title_height, bh))
+
+    if capacity_weight > 0:
+        ideal_capacity = sum(
+            float(panel_capacity(i, np.sqrt(areas[i] * p["rp"]), np.sqrt(areas[i] / p["rp"])))
+            for i, p in enumerate(panels)
+        )
+        total_text = max(sum(p["text_len"] for p in panels), 1)
+        target_capacity = [max(p["text_len"] / total_text * ideal_capacity, 1.0) for p in panels]
+
+    def leaf_loss(i, bw, bh):
+        loss = np.abs(panels[i]["rp"] - bw / bh)
+        if capacity_weight > 0:
+            loss = loss + capacity_weight * np.abs(panel_capacity(i, bw, bh) - target_capacity[i]) / target_capacity[i]
+        return loss
+
+    def split_ratios(start, end):
+        total_sp = prefix_sp[end] - prefix_sp[start]
+        for i in range(start + 1, end):
+            ratio = (prefix_sp[i] - prefix_sp[start]) / total_sp
+            if 0 < ratio < 1:
+                yield i, ratio
+
+    # (start, end) -> best loss of panels[start:end] at each grid aspect
+    run_loss = {}
+    for i in range(n):
+        # A panel's box of a given aspect has width sqrt(area * aspect) and height sqrt(area / aspect)
+        run_loss[(i, i + 1)] = leaf_loss(i, np.sqrt(areas[i] * aspects), np.sqrt(areas[i] / aspects))
+    for length in range(2, n + 1):
+        for start in range(n - length + 1):
+            end = start + length
+            best = np.full(LAYOUT_ASPECT_GRID, np.inf)
+            for i, ratio in split_ratios(start, end):
+                first, second = run_loss[(start, i)], run_loss[(i, end)]
+                log_first, log_second = np.log(ratio), np.log(1 - ratio)
+                # horizontal: each side keeps the width, so its aspect grows by 1 / ratio
+                np.minimum(best, np.interp(log_aspects - log_first, log_aspects, first)
+                           + np.interp(log_aspects - log_second, log_aspects, second), out=best)
+                # vertical: each side keeps the height, so its aspect shrinks by ratio
+                np.minimum(best, np.interp(log_aspects + log_first, log_aspects, first)
+                           + np.interp(log_aspects + log_second, log_aspects, second), out=best)
+            run_loss[(start, end)] = best
+
+    def estimated_loss(start, end, bw, bh):
+        return float(np.interp(np.log(bw / bh), log_aspects, run_loss[(start, end)]))
+
+    def arrangement_key(arrangement):
+        return tuple(
+            (round(b["x"], 4), round(b["y"], 4), round(b["width"], 4), round(b["height"], 4)) for b in arrangement
+        )
 
-    for i in range(1, n):
-        subset1 = panels[:i]
-        subset2 = panels[i:]
-        sp1 = sum(pp["sp"] for pp in subset1)
-        ratio = sp1 / total_sp
-
-        # horizontal
-        h_top = ratio * h
-        if 0 < h_top < h:
-            l1, a1 = panel_layout_generation(subset1, x, y, w, h_top)
-            l2, a2 = panel_layout_generation(subset2, x, y + h_top, w, h - h_top)
-            if (l1 + l2) < best_loss:
-                best_loss = l1 + l2
-                best_arr = a1 + a2
-
-        # vertical
-        w_left = ratio * w
-        if 0 < w_left < w:
-            l1, a1 = panel_layout_generation(subset1, x, y, w_left, h)
-            l2, a2 = panel_layout_generation(subset2, x + w_left, y, w - w_left, h)
-            if (l1 + l2) < best_loss:
-                best_loss = l1 + l2
-                best_arr = a1 + a2
-
-    return best_loss, best_arr
+    def build(start, end, bx, by, bw, bh, keep=1):
+        if end - start == 1:
+            p = panels[start]
+            loss = float(leaf_loss(start, bw, bh)) if bh > 1e-9 else 0.0
+            return [(loss, [{
+                "panel_name": p["section_name"],
+                "panel_id": p["panel_id"],
+                "x": bx, "y": by,
+                "width": bw, "height": bh
+            }])]
+
+        candidates = []
+        for i, ratio in split_ratios(start, end):
+            h_top = ratio * bh
+            candidates.append((estimated_loss(start, i, bw, h_top) + estimated_loss(i, end, bw, bh - h_top), i, True, h_top))
+            w_left = ratio * bw
+            candidates.append((estimated_loss(start, i, w_left, bh) + estimated_loss(i, end, bw - w_left, bh), i, False, w_left))
+        if not candidates:
+            return [(float('inf'), [])]
+
+        # Grid estimates are interpolated, so every split close to the best one is built exactly
+        cutoff = min(c[0] for c in candidates) * (1 + LAYOUT_NEAR_TIE) + 1e-9
+
+        def build_splits(child_keep):
+            built = []
+            for estimate, i, horizontal, size in candidates:
+                if keep == 1 and estimate > cutoff:
+                    continue
+                if horizontal:
+                    firsts = build(start, i, bx, by, bw, size, child_keep)
+                    seconds = build(i, end, bx, by + size, bw, bh - size, child_keep)
+                else:
+                    firsts = build(start, i, bx, by, size, bh, child_keep)
+                    seconds = build(i, end, bx + size, by, bw - size, bh, child_keep)
+                built.extend((l1 + l2, a1 + a2) for l1, a1 in firsts for l2, a2 in seconds)
+            # Stable sort: ties keep the split order
+            built.sort(key=lambda item: item[0])
+            # Different split orders often give the same boxes; keep the first of each
+            distinct, seen = [], set()
+            for loss, arrangement in built:
+                key = arrangement_key(arrangement)
+                if key not in seen:
+                    seen.add(key)
+                    distinct.append((loss, arrangement))
+            return distinct
+
+        built = build_splits(1)
+        if len(built) < keep:
+            # Too few distinct first splits; combine the next-best subtrees too
+            built = build_splits(keep)
+        return built[:keep]
+
+    return build(0, n, x, y, w, h, keep=max(1, num_candidates))
 
 def split_textbox(textbox, ratio):
     """
@@ -588,6 +1014,12 @@ def split_textbox(textbox, ratio):
     return top_box, bottom_box
 
 def generate_constrained_layout(paper_panels, poster_w, poster_h, title_height_ratio=0.1):
+    return generate_constrained_layout_candidates(paper_panels, poster_w, poster_h, title_height_ratio)[0]
+
+
+def generate_constrained_layout_candidates(
+    paper_panels, poster_w, poster_h, title_height_ratio=0.1, num_candidates=1, capacity_weight=0.0, figure_ug=None
+):
     # Find title panel explicitly
     try:
         title_panel = next(p for p in paper_panels if ('title' in p["section_name"].lower()))
@@ -605,15 +1037,97 @@ def generate_constrained_layout(paper_panels, poster_w, poster_h, title_height_r
     }
 
     # Generate recursive layout on remaining space for other panels
-    layout_loss, remaining_layout = panel_layout_generation(
+    candidates = panel_layout_candidates(
         other_panels,
         x=0, y=title_h,
-        w=poster_w, h=poster_h - title_h
+        w=poster_w, h=poster_h - title_h,
+        num_candidates=num_candidates,
+        capacity_weight=capacity_weight,
+        figure_ug=figure_ug
     )
 
     # Combine title panel with others
-    complete_layout = [title_layout] + remaining_layout
-    return layout_loss, complete_layout
+    return [(layout_loss, [title_layout] + remaining_layout) for layout_loss, remaining_layout in candidates]
+
+
+def score_layout_candidates(candidate_panels, aspect_losses, ug_samples, section_title_height=32):
+    """
+    Score every (panel tree, figure sample) combination in one batch.
+
+    Args:
+        candidate_panels: One list of merged panel dicts (as built in
+            `main_inference`) per tree, all listing the same panels in the same order
+        aspect_losses: Aspect-ratio loss of each tree
+        ug_samples: (S, P) figure width fractions; column j is used for
+            panel j of every tree, ignored for panels without a figure
+        section_title_height: Height reserved for a section heading
+
+    Returns:
+        (T, S) array of scores; lower is better. A score adds the tree's
+        aspect loss, how far each section's share of the text capacity is
+        from its share of the paper text, and how much of the room available
+        to each figure it leaves unused.
+    """
+    first = candidate_panels[0]
+    width = np.array([[p["width"] for p in panels] for panels in candidate_panels], dtype=float)[:, None, :]
+    height = np.array([[p["height"] for p in panels] for panels in candidate_panels], dtype=float)[:, None, :]
+    text_len = np.array([p["text_len"] for p in first], dtype=float)
+    aspect = np.array([p["figure_aspect"] for p in first], dtype=float)
+    has_figure = np.array([p["figure_size"] > 0 for p in first])
+    is_section = np.array(["title" not in p["panel_name"].lower() for p in first])
+
+    # Figure size as in place_text_and_figures_exact: ug of the width, capped in height
+    fig_w = ug_samples[None, :, :] * width
+    fig_h = fig_w / aspect
+    max_fig_h = FIGURE_MAX_HEIGHT_RATIO * height
+    fig_w = np.where(fig_h > max_fig_h, fig_w * max_fig_h / np.maximum(fig_h, 1e-9), fig_w)
+    fig_h = np.minimum(fig_h, max_fig_h)
+    fig_w = np.where(has_figure, fig_w, 0.0)
+    fig_h = np.where(has_figure, fig_h, 0.0)
+
+    title_h = np.where(is_section, np.minimum(section_title_height, height), 0.0)
+    capacity = np.where(is_section, estimated_text_capacity(width, height, fig_h, title_h), 0.0)
+    capacity_share = capacity / np.maximum(capacity.sum(axis=-1, keepdims=True), 1e-9)
+    text_share = np.where(is_section, text_len, 0.0) / max(float(text_len[is_section].sum()), 1e-9)
+    capacity_loss = np.abs(capacity_share - text_share).sum(axis=-1)
+
+    # Figure fill: the figure's width against the widest it could be in its panel
+    max_fig_w = np.minimum(width, max_fig_h * aspect)
+    fill = np.where(has_figure, fig_w / np.maximum(max_fig_w, 1e-9), 1.0)
+    figure_loss = (1.0 - fill).sum(axis=-1) / max(int(has_figure.sum()), 1)
+
+    return (
+        np.asarray(aspect_losses, dtype=float)[:, None]
+        + CANDIDATE_CAPACITY_WEIGHT * capacity_loss
+        + CANDIDATE_FIGURE_WEIGHT * figure_loss
+    )
+
+
+def mean_figure_ug(paper_panels, figure_model_params):
+    """Predicted mean width fraction of every panel's figure, by panel id."""
+    figure_ug = {}
+    for p in paper_panels:
+        if p["figure_size"] > 0:
+            _, mean_ug, _ = figure_placement_params(p, figure_model_params)
+            figure_ug[p["panel_id"]] = float(np.clip(mean_ug, 0.10, 0.80))
+    return figure_ug
+
+
+def merge_panel(pa, panel, shrink_margin=0):
+    """Merge a panel's bounding box from the arrangement with its section data."""
+    return {
+        "panel_id": pa["panel_id"],
+        "panel_name": pa['panel_name'],
+        "x": pa["x"] + shrink_margin,
+        "y": pa["y"] + shrink_margin,
+        "width": pa["width"] - 2 * shrink_margin,
+        "height": pa["height"] - 2 * shrink_margin,
+        "sp": panel["sp"],
+        "rp": panel["rp"],
+        "text_len": panel["text_len"],
+        "figure_size": panel["figure_size"],
+        "figure_aspect": panel["figure_aspect"]
+    }
 
 
 def main_inference(
@@ -622,51 +1136,248 @@ def main_inference(
     figure_model_params,
     poster_width=1200,
     poster_height=800,
-    shrink_margin=0
+    shrink_margin=0,
+    num_candidates=1,
+    num_figure_samples=1,
+    capacity_weight=0.0
 ):
+    """
+    Lay out panels, figures and textboxes for a poster.
+
+    With `num_candidates` trees and `num_figure_samples` draws of every
+    figure's width, all combinations are scored in one batch
+    (`score_layout_candidates`) and the best is laid out. With both at 1,
+    the best tree is used with a single random draw per figure.
+    `capacity_weight` adds a text capacity term to the tree search itself
+    (see `panel_layout_candidates`), with figures at their mean predicted width.
+    """
     for p in paper_panels:
         sp, rp = infer_panel_attrs(panel_model_params, p["tp"], p["gp"])
         p["sp"] = sp
         p["rp"] = rp
 
-    layout_loss, panel_arrangement = generate_constrained_layout(paper_panels, poster_width, poster_height, title_height_ratio=0.1)
-    print("Panel layout cost:", layout_loss)
-    for p in panel_arrangement:
-        print("Panel:", p)
+    figure_ug = mean_figure_ug(paper_panels, figure_model_params) if capacity_weight > 0 else {}
+
+    candidates = generate_constrained_layout_candidates(
+        paper_panels, poster_width, poster_height, title_height_ratio=0.1, num_candidates=num_candidates,
+        capacity_weight=capacity_weight, figure_ug=figure_ug
+    )
 
     panel_map = {}
     for p in paper_panels:
         panel_map[p["panel_id"]] = p
 
-    final_panels = []
-    for pa in panel_arrangement:
-        # Merge bounding box with the original sp,rp data
-        pid = pa["panel_id"]
-        merged_panel = {
-            "panel_id": pid,
-            "panel_name": pa['panel_name'],
-            "x": pa["x"] + shrink_margin,
-            "y": pa["y"] + shrink_margin,
-            "width": pa["width"] - 2 * shrink_margin,
-            "height": pa["height"] - 2 * shrink_margin,
-            "sp": panel_map[pid]["sp"],
-            "rp": panel_map[pid]["rp"],
-            "text_len": panel_map[pid]["text_len"],
-            "figure_size": panel_map[pid]["figure_size"],
-            "figure_aspect": panel_map[pid]["figure_aspect"]
-        }
-        final_panels.append(merged_panel)
+    def merge_panels(panel_arrangement):
+        return [merge_panel(pa, panel_map[pa["panel_id"]], shrink_margin) for pa in panel_arrangement]
+
+    ug_by_panel = None
+    if len(candidates) == 1 and num_figure_samples <= 1:
+        layout_loss, panel_arrangement = candidates[0]
+    else:
+        # Same panel order in every tree, so the samples line up across trees
+        candidate_panels = [
+            sorted(merge_panels(arrangement), key=lambda p: p["panel_id"]) for _, arrangement in candidates
+        ]
+        ug_samples = np.zeros((max(1, num_figure_samples), len(candidate_panels[0])))
+        for j, p in enumerate(candidate_panels[0]):
+            if p["figure_size"] > 0:
+                _, mean_ug, sigma_u = figure_placement_params(p, figure_model_params)
+                ug_samples[:, j] = np.clip(np.random.normal(mean_ug, sigma_u, size=len(ug_samples)), 0.10, 0.80)
+        scores = score_layout_candidates(candidate_panels, [loss for loss, _ in candidates], ug_samples)
+        best_tree, best_sample = np.unravel_index(int(np.argmin(scores)), scores.shape)
+        print(f"Layout candidates: {scores.shape[0]} trees x {scores.shape[1]} figure samples, "
+              f"best score {scores[best_tree, best_sample]:.4f} (tree {best_tree}, sample {best_sample})")
+        layout_loss, panel_arrangement = candidates[best_tree]
+        ug_by_panel = {p["panel_id"]: float(ug_samples[best_sample, j]) for j, p in enumerate(candidate_panels[0])}
+
+    print("Panel layout cost:", layout_loss)
+    for p in panel_arrangement:
+        print("Panel:", p)
 
     text_arrangement = []
     figure_arrangement = []
 
-    for p in final_panels:
-        text_boxes, fig_boxes = place_text_and_figures_exact(p, figure_model_params)
+    for p in merge_panels(panel_arrangement):
+        ug_sample = None if ug_by_panel is None else ug_by_panel[p["panel_id"]]
+        text_boxes, fig_boxes = place_text_and_figures_exact(p, figure_model_params, ug_sample=ug_sample)
         text_arrangement.extend(text_boxes)          # text arrangement
         figure_arrangement.extend(fig_boxes)       # figure arrangement
 
     return panel_arrangement, figure_arrangement, text_arrangement
 
+def layout_tree(panel_arrangement, start=0, end=None):
+    """
+    Recover the guillotine split tree of `panel_arrangement[start:end]`.
+
+    Boxes must be in the order the layout search returns them, so that every
+    split separates two consecutive runs of the list.
+
+    Returns the root node. Every node has `start`, `end`, its bounding box
+    (`x`, `y`, `width`, `height`), and `split` (the index where its second
+    child starts) and `horizontal`, both None for a single panel, and `children`.
+    """
+    end = len(panel_arrangement) if end is None else end
+
+    def bbox(lo, hi):
+        boxes = panel_arrangement[lo:hi]
+        x0 = min(b["x"] for b in boxes)
+        y0 = min(b["y"] for b in boxes)
+        x1 = max(b["x"] + b["width"] for b in boxes)
+        y1 = max(b["y"] + b["height"] for b in boxes)
+        return x0, y0, x1, y1
+
+    def build(lo, hi):
+        x0, y0, x1, y1 = bbox(lo, hi)
+        node = {
+            "start": lo, "end": hi,
+            "x": x0, "y": y0, "width": x1 - x0, "height": y1 - y0,
+            "split": None, "horizontal": None, "children": [],
+        }
+        if hi - lo == 1:
+            return node
+        tol = 1e-6 * max(x1 - x0, y1 - y0, 1.0)
+        for i in range(lo + 1, hi):
+            first, second = bbox(lo, i), bbox(i, hi)
+            if first[3] <= second[1] + tol:
+                node["horizontal"] = True
+            elif first[2] <= second[0] + tol:
+                node["horizontal"] = False
+            else:
+                continue
+            node["split"] = i
+            node["children"] = [build(lo, i), build(i, hi)]
+            return node
+        raise ValueError(f'Panels {lo}..{hi - 1} do not form a guillotine layout in arrangement order')
+
+    return build(start, end)
+
+
+def _smallest_subtree(node, lo, hi):
+    """Deepest node with at least two panels whose range covers [lo, hi)."""
+    for child in node["children"]:
+        if child["start"] <= lo and hi <= child["end"] and child["end"] - child["start"] >= 2:
+            return _smallest_subtree(child, lo, hi)
+    return node
+
+
+def _box_changed(old, new, tol=1e-6):
+    return any(abs(old[k] - new[k]) > tol for k in ("x", "y", "width", "height"))
+
+
+def incremental_relayout(
+    paper_panels,
+    panel_arrangement,
+    figure_arrangement,
+    text_arrangement,
+    changed_panel_ids,
+    panel_model_params,
+    figure_model_params,
+    shrink_margin=0,
+    capacity_weight=0.0
+):
+    """
+    Update a layout after some sections changed, touching as little as possible.
+
+    Only the smallest subtree of the split tree that holds every changed
+    panel is laid out again, inside its existing box, so every panel outside
+    it keeps its geometry. Inside the subtree, only panels whose box moved, or
+    that changed themselves, get new text and figure boxes. All other boxes
+    are carried over unchanged, including the random figure sizes. A changed
+    title panel keeps its box and only has its contents placed again.
+
+    Args:
+        paper_panels: Panels as passed to `main_inference`, with the changed
+            sections' tp, gp, text_len, figure_size and figure_aspect updated
+        panel_arrangement, figure_arrangement, text_arrangement: The
+            previous `main_inference` result
+        changed_panel_ids: Ids of the panels whose section changed
+        panel_model_params, figure_model_params: The layout models
+        shrink_margin, capacity_weight: As given to `main_inference`
+
+    Returns:
+        Dict with the new `panel_arrangement`, `figure_arrangement` and
+        `text_arrangement`, plus the diff against the previous layout:
+        `relaid_panels` (panel ids placed again), `changed_textboxes`,
+        `added_textboxes`, `removed_textboxes` and `changed_figures` (box
+        names), and `changed_panels` (ids of panels with any of those boxes;
+        besides the changed sections themselves, these are the only
+        sections whose content must be fitted again)
+    """
+    for p in paper_panels:
+        sp, rp = infer_panel_attrs(panel_model_params, p["tp"], p["gp"])
+        p["sp"] = sp
+        p["rp"] = rp
+    panel_map = {p["panel_id"]: p for p in paper_panels}
+    changed_panel_ids = set(changed_panel_ids)
+
+    new_panel_arrangement = list(panel_arrangement)
+    relaid = {pa["panel_id"] for pa in panel_arrangement if pa["panel_id"] in changed_panel_ids}
+
+    # The title strip is fixed; the split tree covers the panels below it
+    first = 1 if "title" in panel_arrangement[0]["panel_name"].lower() else 0
+    positions = [
+        k for k, pa in enumerate(panel_arrangement)
+        if k >= first and pa["panel_id"] in changed_panel_ids
+    ]
+    if positions and len(panel_arrangement) - first >= 2:
+        tree = layout_tree(panel_arrangement, start=first)
+        node = _smallest_subtree(tree, min(positions), max(positions) + 1)
+        run = [panel_map[pa["panel_id"]] for pa in panel_arrangement[node["start"]:node["end"]]]
+        figure_ug = mean_figure_ug(run, figure_model_params) if capacity_weight > 0 else {}
+        _, sub_arrangement = panel_layout_generation(
+            run, node["x"], node["y"], node["width"], node["height"],
+            capacity_weight=capacity_weight, figure_ug=figure_ug
+        )
+        if sub_arrangement:
+            new_panel_arrangement[node["start"]:node["end"]] = sub_arrangement
+            for old, new in zip(panel_arrangement[node["start"]:node["end"]], sub_arrangement):
+                if _box_changed(old, new):
+                    relaid.add(new["panel_id"])
+
+    new_text_arrangement = []
+    new_figure_arrangement = []
+    for pa in new_panel_arrangement:
+        pid = pa["panel_id"]
+        if pid in relaid:
+            text_boxes, fig_boxes = place_text_and_figures_exact(
+                merge_panel(pa, panel_map[pid], shrink_margin), figure_model_params
+            )
+        else:
+            text_boxes = [t for t in text_arrangement if t["panel_id"] == pid]
+            fig_boxes = [f for f in figure_arrangement if f["panel_id"] == pid]
+        new_text_arrangement.extend(text_boxes)
+        new_figure_arrangement.extend(fig_boxes)
+
+    old_text = {t["textbox_name"]: t for t in text_arrangement}
+    new_text = {t["textbox_name"]: t for t in new_text_arrangement}
+    old_figures = {f["figure_name"]: f for f in figure_arrangement}
+    new_figures = {f["figure_name"]: f for f in new_figure_arrangement}
+    changed_textboxes = [name for name in new_text if name in old_text and _box_changed(old_text[name], new_text[name])]
+    added_textboxes = [name for name in new_text if name not in old_text]
+    removed_textboxes = [name for name in old_text if name not in new_text]
+    changed_figures = [
+        name for name in set(new_figures) | set(old_figures)
+        if name not in new_figures or name not in old_figures or _box_changed(old_figures[name], new_figures[name])
+    ]
+    changed_panels = sorted(
+        {new_text[name]["panel_id"] for name in changed_textboxes + added_textboxes}
+        | {old_text[name]["panel_id"] for name in removed_textboxes}
+        | {(new_figures.get(name) or old_figures[name])["panel_id"] for name in changed_figures}
+    )
+
+    return {
+        "panel_arrangement": new_panel_arrangement,
+        "figure_arrangement": new_figure_arrangement,
+        "text_arrangement": new_text_arrangement,
+        "relaid_panels": sorted(relaid),
+        "changed_textboxes": changed_textboxes,
+        "added_textboxes": added_textboxes,
+        "removed_textboxes": removed_textboxes,
+        "changed_figures": sorted(changed_figures),
+        "changed_panels": changed_panels,
+    }
+
+
 def visualize_complete_layout(
     panels, text_boxes, figure_boxes, poster_width, poster_height
 ):
@@ -747,4 +1458,20 @@ def get_arrangments_in_inches(
         t["height"] = to_inches(t["height"], units_per_inch)
 
     width_inch, height_inch = to_inches(width, units_per_inch), to_inches(height, units_per_inch)
-    return width_inch, height_inch, panel_arrangement_inches, figure_arrangement_inches, text_arrangement_inches
\ No newline at end of file
+    return width_inch, height_inch, panel_arrangement_inches, figure_arrangement_inches, text_arrangement_inches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Layout model artifacts')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    train_parser = subparsers.add_parser('train', help='Fit the layout models and store them')
+    train_parser.add_argument('--dataset_dir', type=str, default=None,
+                              help='Training posters (default: assets/poster_data/Train)')
+    train_parser.add_argument('--model_dir', type=str, default=LAYOUT_MODEL_DIR)
+    train_parser.add_argument('--workers', type=int, default=None,
+                              help='Processes for extracting features of new posters (default: CPU count)')
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        path = train_layout_models(args.dataset_dir, args.model_dir, args.workers)
+        print(f'Layout models written to {path}')
@@ -0,0 +1,23 @@
+import pytest
+
+from PosterAgent.parse_raw import limit_sections
+
+
+@pytest.mark.parametrize("max_sections", range(1, 12))
+def test_limit_sections_holds_the_limit(max_sections):
+    sections = [{'title': f'Section {i}', 'content': ''} for i in range(12)]
+    limited = limit_sections(sections, max_sections)
+    assert len(limited) == max_sections
+    # The title section comes first and the paper order is kept
+    assert limited[0] is sections[0]
+    positions = [sections.index(section) for section in limited]
+    assert positions == sorted(positions)
+    if max_sections >= 4:
+        assert limited[:2] == sections[:2]
+        assert limited[-2:] == sections[-2:]
+
+
+def test_limit_sections_keeps_short_papers():
+    sections = [{'title': f'Section {i}', 'content': ''} for i in range(5)]
+    assert limit_sections(sections, 9) == sections
+    assert limit_sections(sections * 3, 0) == sections * 3
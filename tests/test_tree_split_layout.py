@@ -0,0 +1,165 @@
+import random
+
+import numpy as np
+import pytest
+
+from PosterAgent.tree_split_layout import (
+    SoftmaxClassifier,
+    incremental_relayout,
+    layout_tree,
+    main_inference,
+    panel_layout_candidates,
+    panel_layout_generation,
+)
+
+
+def exhaustive_layout(panels, x, y, w, h):
+    """The original exhaustive split search, kept as the reference for the interval DP."""
+    if len(panels) == 1:
+        p = panels[0]
+        cur_rp = (w / h) if h > 1e-9 else p["rp"]
+        return abs(p["rp"] - cur_rp), [{
+            "panel_name": p["section_name"],
+            "panel_id": p["panel_id"],
+            "x": x, "y": y,
+            "width": w, "height": h
+        }]
+
+    best_loss = float('inf')
+    best_arr = []
+    total_sp = sum(pp["sp"] for pp in panels)
+    for i in range(1, len(panels)):
+        ratio = sum(pp["sp"] for pp in panels[:i]) / total_sp
+        h_top = ratio * h
+        if 0 < h_top < h:
+            l1, a1 = exhaustive_layout(panels[:i], x, y, w, h_top)
+            l2, a2 = exhaustive_layout(panels[i:], x, y + h_top, w, h - h_top)
+            if l1 + l2 < best_loss:
+                best_loss, best_arr = l1 + l2, a1 + a2
+        w_left = ratio * w
+        if 0 < w_left < w:
+            l1, a1 = exhaustive_layout(panels[:i], x, y, w_left, h)
+            l2, a2 = exhaustive_layout(panels[i:], x + w_left, y, w - w_left, h)
+            if l1 + l2 < best_loss:
+                best_loss, best_arr = l1 + l2, a1 + a2
+    return best_loss, best_arr
+
+
+def random_panels(n, seed):
+    rng = random.Random(seed)
+    panels = []
+    for i in range(n):
+        has_figure = rng.random() < 0.5
+        panels.append({
+            "section_name": f"Section {i}",
+            "panel_id": i,
+            "sp": rng.uniform(0.05, 0.3),
+            "rp": rng.uniform(0.3, 3.0),
+            "text_len": rng.randint(300, 5000),
+            "figure_size": rng.randint(10000, 200000) if has_figure else 0,
+            "figure_aspect": rng.uniform(0.5, 2.0),
+        })
+    return panels
+
+
+def boxes(arrangement):
+    return [value for b in arrangement for value in (b["panel_id"], b["x"], b["y"], b["width"], b["height"])]
+
+
+def box_key(arrangement):
+    return tuple((round(b["x"], 4), round(b["y"], 4), round(b["width"], 4), round(b["height"], 4)) for b in arrangement)
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_dp_matches_exhaustive_search(seed):
+    n = random.Random(seed).randint(1, 7)
+    panels = random_panels(n, seed)
+    expected_loss, expected = exhaustive_layout(panels, 0, 90, 1200, 810)
+    loss, arrangement = panel_layout_generation(panels, 0, 90, 1200, 810)
+    assert loss == pytest.approx(expected_loss, rel=1e-9, abs=1e-9)
+    assert boxes(arrangement) == pytest.approx(boxes(expected))
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_candidates_are_distinct_and_sorted(seed):
+    n = random.Random(seed).randint(3, 10)
+    panels = random_panels(n, seed)
+    for capacity_weight in (0.0, 1.0):
+        candidates = panel_layout_candidates(panels, 0, 90, 1200, 810, num_candidates=4, capacity_weight=capacity_weight)
+        assert len(candidates) == 4
+        assert len({box_key(arrangement) for _, arrangement in candidates}) == 4
+        losses = [loss for loss, _ in candidates]
+        assert losses == sorted(losses)
+        # The best candidate is built from every first split, so it is never worse than the single search
+        best_loss, _ = panel_layout_generation(panels, 0, 90, 1200, 810, capacity_weight=capacity_weight)
+        assert candidates[0][0] <= best_loss + 1e-9
+
+
+def test_two_panels_have_two_candidates():
+    candidates = panel_layout_candidates(random_panels(2, 0), 0, 0, 1000, 800, num_candidates=4)
+    assert len(candidates) == 2
+    assert box_key(candidates[0][1]) != box_key(candidates[1][1])
+
+
+PANEL_MODEL = {
+    'w_s': np.array([0.5, 0.3, 0.02]), 'w_r': np.array([1.0, -0.5, 1.2]), 'sigma_s': 0.01, 'sigma_r': 0.1,
+}
+FIGURE_MODEL = {
+    'clf_hg': SoftmaxClassifier([[0.1, 0, 0, 0], [0, 0.001, 0, 0.2], [0, 0, 1, 0]], [0, 1, 2]),
+    'w_u': np.array([0.5, 0.00001, 0.0, 0.4]),
+    'sigma_u': 0.02,
+}
+
+
+def paper_panels(n, seed):
+    rng = random.Random(seed)
+    panels = [{
+        'section_name': 'Poster Title & Author', 'panel_id': 0, 'tp': 0.02, 'gp': 0,
+        'text_len': 100, 'figure_size': 0, 'figure_aspect': 1,
+    }]
+    for i in range(1, n):
+        has_figure = rng.random() < 0.5
+        panels.append({
+            'section_name': f'Section {i}', 'panel_id': i, 'tp': rng.uniform(0.05, 0.2),
+            'gp': rng.uniform(0, 0.3) if has_figure else 0, 'text_len': rng.randint(500, 5000),
+            'figure_size': rng.randint(10000, 200000) if has_figure else 0, 'figure_aspect': rng.uniform(0.5, 2),
+        })
+    return panels
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_incremental_relayout(seed):
+    np.random.seed(seed)
+    panel_arrangement, figure_arrangement, text_arrangement = main_inference(
+        paper_panels(10, seed), PANEL_MODEL, FIGURE_MODEL, 1200, 900, 3, capacity_weight=1.0
+    )
+    tree = layout_tree(panel_arrangement)
+    assert (tree['start'], tree['end']) == (0, len(panel_arrangement))
+
+    unchanged = incremental_relayout(
+        paper_panels(10, seed), panel_arrangement, figure_arrangement, text_arrangement, [],
+        PANEL_MODEL, FIGURE_MODEL, 3, capacity_weight=1.0,
+    )
+    assert unchanged['text_arrangement'] == text_arrangement
+    assert unchanged['figure_arrangement'] == figure_arrangement
+    assert unchanged['changed_panels'] == []
+
+    panels = paper_panels(10, seed)
+    panels[4]['tp'] *= 2
+    panels[4]['text_len'] *= 2
+    result = incremental_relayout(
+        panels, panel_arrangement, figure_arrangement, text_arrangement, [4],
+        PANEL_MODEL, FIGURE_MODEL, 3, capacity_weight=1.0,
+    )
+    relaid = set(result['relaid_panels'])
+    assert 4 in relaid
+    for old, new in zip(panel_arrangement, result['panel_arrangement']):
+        assert old['panel_id'] == new['panel_id']
+        if new['panel_id'] not in relaid:
+            assert old == new
+    for box in result['text_arrangement']:
+        if box['panel_id'] not in relaid:
+            assert box in text_arrangement
+    area = sum(b['width'] * b['height'] for b in result['panel_arrangement'])
+    assert area == pytest.approx(1200 * 900)
+    assert set(result['changed_panels']) <= relaid
@@ -6,11 +6,13 @@ from camel.models import ModelFactory
 from camel.agents import ChatAgent
 from camel.messages import BaseMessage
 from utils.src.utils import get_json_from_response
+from utils.run_context import project_path
+from utils.json_schemas import structured_config, schema_errors
 
 def no_tree_get_layout(poster_width, poster_height, panels, figures, agent_config):
     total_input_token, total_output_token = 0, 0
     agent_name = 'ablation_no_tree_layout'
-    with open(f"prompt_templates/{agent_name}.yaml", "r") as f:
+    with open(project_path(f"prompt_templates/{agent_name}.yaml"), "r") as f:
         planner_config = yaml.safe_load(f)
 
     jinja_env = Environment(undefined=StrictUndefined)
@@ -25,7 +27,7 @@ def no_tree_get_layout(poster_width, poster_height, panels, figures, agent_confi
     planner_model = ModelFactory.create(
         model_platform=agent_config['model_platform'],
         model_type=agent_config['model_type'],
-        model_config_dict=agent_config['model_config'],
+        model_config_dict=structured_config(agent_config, 'no_tree_layout')['model_config'],
     )
 
     planner_agent = ChatAgent(
@@ -49,14 +51,9 @@ def no_tree_get_layout(poster_width, poster_height, panels, figures, agent_confi
     
         arrangements = get_json_from_response(response.msgs[0].content)
 
-        if len(arrangements) == 0:
-            print('Error: Empty response, retrying...')
-            continue
-
-        if not 'panel_arrangement' in arrangements or\
-        not 'figure_arrangement' in arrangements or\
-        not 'text_arrangement' in arrangements:
-            print('Error: Invalid response, retrying...')
+        errors = schema_errors(arrangements, 'no_tree_layout')
+        if errors:
+            print(f'Error: Invalid response ({"; ".join(errors[:3])}), retrying...')
             continue
 
         if len(arrangements['panel_arrangement']) != len(panels) or\
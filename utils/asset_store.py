@@ -0,0 +1,217 @@
+"""
+Store for the figure and table crops extracted from a paper.
+
+Every crop is registered with its perceptual hash (dHash), page and bounding
+box. It is written once, as the original crop plus a thumbnail for VLM
+prompts. The third level, the placement image for the pptx, depends on the
+figure's printed size, so the render stage writes it once the layout is
+known (see `raster_utils.encode_placed_image`). The store detects exact and
+near duplicates, and sub-figures cropped out of a larger figure on the same
+page, so downstream stages only see one copy. A JSON index holds the size,
+aspect ratio, caption, page, box and files of every asset. Later stages read
+it with `load_asset_index` and never open an image just to learn its size.
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from PIL import Image
+
+# Bump when hashing, dedup rules or pyramid levels change, so cached conversions are redone
+ASSET_STORE_VERSION = 4
+
+# Levels written at parse time, by maximum side in pixels
+PYRAMID_LEVELS = {
+    'thumbnail': 512,
+}
+DHASH_DISTANCE = 6
+ASPECT_TOLERANCE = 0.1
+MIN_HASH_BITS = 8
+CONTAINMENT_RATIO = 0.9
+
+
+def dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """
+    Difference hash of an image; near-identical images differ in few bits.
+
+    Args:
+        image: Image to hash
+        hash_size: Hash is hash_size * hash_size bits
+
+    Returns:
+        The hash as an int
+    """
+    small = image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def bbox_containment(inner: List[float], outer: List[float]) -> float:
+    """Fraction of the `inner` box ([l, t, r, b]) that lies inside `outer`."""
+    width = min(inner[2], outer[2]) - max(inner[0], outer[0])
+    height = min(inner[3], outer[3]) - max(inner[1], outer[1])
+    area = (inner[2] - inner[0]) * (inner[3] - inner[1])
+    if width <= 0 or height <= 0 or area <= 0:
+        return 0.0
+    return width * height / area
+
+
+class FigureAssetStore:
+    """Crops of one paper, their pyramid files and their metadata index."""
+
+    def __init__(self, root: str, name: str):
+        """
+        Initialize an empty store.
+
+        Args:
+            root: Directory the image files are written to
+            name: File name prefix, usually the poster name
+        """
+        self.root = root
+        self.name = name
+        self.assets = {}
+        self.images = {}
+
+    @staticmethod
+    def key(kind: str, index: int) -> str:
+        return f'{kind}-{index}'
+
+    def add(
+        self,
+        kind: str,
+        index: int,
+        image: Image.Image,
+        width: int,
+        height: int,
+        page_no: Optional[int] = None,
+        bbox: Optional[List[float]] = None,
+    ) -> str:
+        """
+        Register a crop; nothing is written until `save`.
+
+        Args:
+            kind: "picture" or "table"
+            index: 1-based number of the crop within its kind
+            image: The crop
+            width: Width recorded for layout (may differ from the crop's pixel size)
+            height: Height recorded for layout
+            page_no: Page the crop comes from
+            bbox: Crop region in PDF points as [l, t, r, b]
+
+        Returns:
+            The asset key
+        """
+        key = self.key(kind, index)
+        files = {'original': f'{self.name}-{kind}-{index}.png'}
+        for level, max_side in PYRAMID_LEVELS.items():
+            if max(image.size) > max_side:
+                files[level] = f'{self.name}-{kind}-{index}-{level}.png'
+            else:
+                files[level] = files['original']
+        self.assets[key] = {
+            'kind': kind,
+            'index': index,
+            'width': width,
+            'height': height,
+            'aspect': width / height if height else 0.0,
+            'pixel_size': list(image.size),
+            'dhash': f'{dhash(image):016x}',
+            'page_no': page_no,
+            'bbox': bbox,
+            'files': files,
+            'caption': None,
+            'duplicate_of': None,
+        }
+        self.images[key] = image
+        return key
+
+    def path(self, key: str, level: str = 'original') -> str:
+        return os.path.join(self.root, self.assets[key]['files'][level])
+
+    def find_duplicate(self, key: str, candidates: List[str]) -> Optional[str]:
+        """
+        Return the first of `candidates` that `key` duplicates, if any.
+
+        An asset duplicates another one of the same kind when their hashes are
+        within DHASH_DISTANCE bits and their aspect ratios match, or when it is
+        a sub-figure: it lies almost entirely inside the other asset's box on
+        the same page. Containment is only checked one way, so callers
+        should check assets largest first.
+        """
+        asset = self.assets[key]
+        asset_hash = int(asset['dhash'], 16)
+        for other_key in candidates:
+            other = self.assets[other_key]
+            if asset['kind'] != other['kind']:
+                continue
+            # Mostly blank crops hash alike, so they also need a matching aspect ratio and some structure
+            if (
+                hamming_distance(asset_hash, int(other['dhash'], 16)) <= DHASH_DISTANCE
+                and abs(asset['aspect'] - other['aspect']) <= ASPECT_TOLERANCE * other['aspect']
+                and bin(asset_hash).count('1') >= MIN_HASH_BITS
+            ):
+                return other_key
+            if (
+                asset['bbox'] and other['bbox'] and asset['page_no'] == other['page_no']
+                and bbox_containment(asset['bbox'], other['bbox']) >= CONTAINMENT_RATIO
+            ):
+                return other_key
+        return None
+
+    def mark_duplicate(self, key: str, original_key: str) -> None:
+        self.assets[key]['duplicate_of'] = original_key
+
+    def set_caption(self, key: str, caption: str) -> None:
+        self.assets[key]['caption'] = caption
+
+    def save(self, max_workers: int = 8) -> None:
+        """Encode every asset's pyramid on a thread pool and write the index."""
+        os.makedirs(self.root, exist_ok=True)
+
+        def _write(key):
+            image = self.images[key]
+            files = self.assets[key]['files']
+            image.save(os.path.join(self.root, files['original']), format='PNG')
+            for level, max_side in PYRAMID_LEVELS.items():
+                if files[level] == files['original']:
+                    continue
+                level_image = image.copy()
+                level_image.thumbnail((max_side, max_side), Image.LANCZOS)
+                level_image.save(os.path.join(self.root, files[level]), format='PNG')
+
+        # Duplicates keep their original crop (for inspection) but no pyramid
+        for key, asset in self.assets.items():
+            if asset['duplicate_of'] is not None:
+                asset['files'] = {level: asset['files']['original'] for level in asset['files']}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(_write, self.assets))
+
+        with open(self.index_path, 'w') as f:
+            json.dump(self.assets, f, indent=4)
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.root, f'{self.name}_assets.json')
+
+
+def load_asset_index(root: str, name: str) -> Dict[str, Dict[str, Any]]:
+    """Read the metadata index written by `FigureAssetStore.save`."""
+    with open(os.path.join(root, f'{name}_assets.json'), 'r') as f:
+        return json.load(f)
+
+
+def asset_file(root: str, asset: Dict[str, Any], level: str = 'original') -> str:
+    """Path of one pyramid level of an index entry."""
+    return os.path.join(root, asset['files'][level])
@@ -0,0 +1,171 @@
+"""
+Content-addressed artifact cache for the poster generation pipeline.
+
+Every pipeline stage is keyed by a hash of its inputs (PDF hash, model names,
+prompt template contents and the arguments that affect the stage). When a
+stage is rerun with an unchanged key, its recorded result and output files
+are restored from the cache instead of being recomputed.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Any, Callable, Dict, Optional, Tuple
+
+DEFAULT_CACHE_DIR = os.path.join('cache', 'artifacts')
+CACHE_FORMAT_VERSION = 1
+
+
+def file_sha256(path: str) -> Optional[str]:
+    """
+    Hash a file's contents.
+
+    Args:
+        path: Path to the file
+
+    Returns:
+        Hex digest, or None if the file does not exist
+    """
+    if not path or not os.path.isfile(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def json_sha256(value: Any) -> str:
+    """Hash a JSON-serializable value in a key-order independent way."""
+    payload = json.dumps(value, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def stage_key(stage: str, inputs: Dict[str, Any]) -> str:
+    """
+    Compute the cache key of a pipeline stage.
+
+    Args:
+        stage: Stage name, e.g. "raw_content"
+        inputs: Everything the stage output depends on
+
+    Returns:
+        Hex digest identifying this stage invocation
+    """
+    return json_sha256({'version': CACHE_FORMAT_VERSION, 'stage': stage, 'inputs': inputs})
+
+
+class ArtifactCache:
+    """Stores stage results and output files under `<root>/<stage>/<key>/`."""
+
+    def __init__(self, root: str = DEFAULT_CACHE_DIR, enabled: bool = True):
+        """
+        Initialize the cache.
+
+        Args:
+            root: Cache directory, shared by all runs
+            enabled: When False, every stage is recomputed and nothing is stored
+        """
+        self.root = root
+        self.enabled = enabled
+        self.hits = []
+        self.misses = []
+
+    def _entry_dir(self, stage: str, key: str) -> str:
+        return os.path.join(self.root, stage, key)
+
+    def lookup(self, stage: str, key: str) -> Optional[Dict[str, Any]]:
+        """Return the recorded entry for a stage key, or None if it is not cached."""
+        if not self.enabled:
+            return None
+        entry_file = os.path.join(self._entry_dir(stage, key), 'entry.json')
+        if not os.path.exists(entry_file):
+            return None
+        try:
+            with open(entry_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def restore(self, stage: str, key: str, outputs: Dict[str, str]) -> None:
+        """Copy the cached output files of a stage back to their expected paths."""
+        files_dir = os.path.join(self._entry_dir(stage, key), 'files')
+        for name, dest in outputs.items():
+            src = os.path.join(files_dir, name)
+            if not os.path.exists(src):
+                continue
+            if os.path.dirname(dest):
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+            if os.path.isdir(src):
+                if os.path.isdir(dest):
+                    shutil.rmtree(dest)
+                shutil.copytree(src, dest)
+            else:
+                shutil.copy2(src, dest)
+
+    def store(self, stage: str, key: str, result: Any, outputs: Dict[str, str]) -> None:
+        """
+        Record a stage result and its output files.
+
+        The entry is assembled in a temporary directory and moved into place,
+        so concurrent runs never observe a half-written entry.
+        """
+        if not self.enabled:
+            return
+        stage_dir = os.path.join(self.root, stage)
+        os.makedirs(stage_dir, exist_ok=True)
+        staging_dir = tempfile.mkdtemp(prefix=f'.{key}.', dir=stage_dir)
+        try:
+            files_dir = os.path.join(staging_dir, 'files')
+            os.makedirs(files_dir)
+            for name, src in outputs.items():
+                if os.path.isdir(src):
+                    shutil.copytree(src, os.path.join(files_dir, name))
+                elif os.path.exists(src):
+                    shutil.copy2(src, os.path.join(files_dir, name))
+            with open(os.path.join(staging_dir, 'entry.json'), 'w', encoding='utf-8') as f:
+                json.dump({'stage': stage, 'key': key, 'result': result}, f, indent=4, default=str)
+
+            entry_dir = self._entry_dir(stage, key)
+            if os.path.exists(entry_dir):
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            os.rename(staging_dir, entry_dir)
+        except OSError:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            # Another run stored the same key first; its entry is equivalent.
+            if not os.path.exists(self._entry_dir(stage, key)):
+                raise
+
+    def run_stage(
+        self,
+        stage: str,
+        inputs: Dict[str, Any],
+        outputs: Dict[str, str],
+        compute: Callable[[], Any],
+    ) -> Tuple[Any, bool]:
+        """
+        Run a stage through the cache.
+
+        Args:
+            stage: Stage name
+            inputs: Everything the stage output depends on
+            outputs: Files or directories the stage writes, by artifact name
+            compute: Callable that runs the stage and returns a JSON-serializable result
+
+        Returns:
+            Tuple of (result, cache_hit)
+        """
+        key = stage_key(stage, inputs)
+        entry = self.lookup(stage, key)
+        if entry is not None:
+            self.restore(stage, key, outputs)
+            self.hits.append(stage)
+            print(f'♻️  Cache hit for stage "{stage}" ({key[:12]})')
+            return entry['result'], True
+
+        result = compute()
+        self.store(stage, key, result, outputs)
+        self.misses.append(stage)
+        return result, False
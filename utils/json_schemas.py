@@ -0,0 +1,180 @@
+"""
+JSON schemas of every agent output, for constrained decoding and validation.
+
+With structured output enabled on an agent config (see
+`get_agent_config(..., structured_output=True)`), `structured_config` adds a
+`response_format` of type `json_schema` to the model config. OpenAI uses it
+for structured outputs and vLLM turns it into guided JSON decoding, so
+responses parse on the first try instead of going through a retry loop.
+`schema_errors` checks a parsed response locally either way, so
+unconstrained models still get their malformed answers caught (and retried)
+at the call site.
+"""
+
+import copy
+from typing import Any, Dict, List
+
+_SECTIONS = {
+    'type': 'array',
+    'minItems': 1,
+    'items': {
+        'type': 'object',
+        'properties': {
+            'title': {'type': 'string'},
+            'content': {'type': 'string'},
+        },
+        'required': ['title', 'content'],
+    },
+}
+
+_FIGURE_ID = {'type': ['integer', 'string']}
+
+_BULLETS = {
+    'type': 'array',
+    'items': {'type': 'object'},
+}
+
+AGENT_SCHEMAS = {
+    'raw_content': {
+        'type': 'object',
+        'properties': {
+            'meta': {'type': 'object'},
+            'sections': _SECTIONS,
+        },
+        'required': ['meta', 'sections'],
+    },
+    'raw_content_map': {
+        'type': 'object',
+        'properties': {'sections': _SECTIONS},
+        'required': ['sections'],
+    },
+    'image_table_filter': {
+        'type': 'object',
+        'properties': {
+            'image_information': {'type': 'object'},
+            'table_information': {'type': 'object'},
+        },
+        'required': ['image_information', 'table_information'],
+    },
+    'outline': {
+        # Section title -> the figure placed in it, if any
+        'type': 'object',
+        'additionalProperties': {
+            'type': 'object',
+            'properties': {'image': _FIGURE_ID, 'table': _FIGURE_ID},
+        },
+    },
+    'no_tree_layout': {
+        'type': 'object',
+        'properties': {
+            'panel_arrangement': {'type': 'array', 'items': {'type': 'object'}},
+            'figure_arrangement': {'type': 'array', 'items': {'type': 'object'}},
+            'text_arrangement': {'type': 'array', 'items': {'type': 'object'}},
+        },
+        'required': ['panel_arrangement', 'figure_arrangement', 'text_arrangement'],
+    },
+    'bullet_point': {
+        'type': 'object',
+        'properties': {
+            'title': _BULLETS,
+            'textbox1': _BULLETS,
+            'textbox2': _BULLETS,
+        },
+        'required': ['title', 'textbox1'],
+        # The pptx generator tells one- and two-textbox sections apart by key count
+        'additionalProperties': False,
+    },
+    'poster_title': {
+        'type': 'object',
+        'properties': {'title': _BULLETS},
+        'required': ['title'],
+    },
+}
+
+_JSON_TYPES = {
+    'object': dict,
+    'array': list,
+    'string': str,
+    'integer': int,
+    'number': (int, float),
+    'boolean': bool,
+    'null': type(None),
+}
+
+
+def response_format(name: str) -> Dict[str, Any]:
+    """OpenAI-style `response_format` for an agent's schema; vLLM maps it to guided JSON."""
+    return {
+        'type': 'json_schema',
+        'json_schema': {'name': name, 'schema': AGENT_SCHEMAS[name], 'strict': False},
+    }
+
+
+def structured_config(agent_config: Dict[str, Any], name: str) -> Dict[str, Any]:
+    """
+    Agent config whose model constrains its output to the schema `name`.
+
+    Args:
+        agent_config: Config from `get_agent_config`
+        name: Key of AGENT_SCHEMAS
+
+    Returns:
+        A copy with `response_format` set, or `agent_config` itself when
+        structured output is off
+    """
+    if not agent_config.get('structured_output', False):
+        return agent_config
+    config = copy.copy(agent_config)
+    config['model_config'] = {**(agent_config.get('model_config') or {}), 'response_format': response_format(name)}
+    return config
+
+
+def _check_type(value: Any, expected: Any) -> bool:
+    expected = expected if isinstance(expected, list) else [expected]
+    for type_name in expected:
+        # bool is an int in Python but not in JSON
+        if type_name in ('integer', 'number') and isinstance(value, bool):
+            continue
+        if isinstance(value, _JSON_TYPES[type_name]):
+            return True
+    return False
+
+
+def _validate(value: Any, schema: Dict[str, Any], path: str, errors: List[str]) -> None:
+    if 'type' in schema and not _check_type(value, schema['type']):
+        errors.append(f'{path}: expected {schema["type"]}, got {type(value).__name__}')
+        return
+    if isinstance(value, dict):
+        for key in schema.get('required', []):
+            if key not in value:
+                errors.append(f'{path}: missing "{key}"')
+        properties = schema.get('properties', {})
+        for key, item in value.items():
+            if key in properties:
+                _validate(item, properties[key], f'{path}.{key}', errors)
+            elif schema.get('additionalProperties') is False:
+                errors.append(f'{path}: unexpected "{key}"')
+            elif isinstance(schema.get('additionalProperties'), dict):
+                _validate(item, schema['additionalProperties'], f'{path}.{key}', errors)
+    elif isinstance(value, list):
+        if len(value) < schema.get('minItems', 0):
+            errors.append(f'{path}: expected at least {schema["minItems"]} items')
+        if 'items' in schema:
+            for i, item in enumerate(value):
+                _validate(item, schema['items'], f'{path}[{i}]', errors)
+
+
+def schema_errors(value: Any, name: str) -> List[str]:
+    """
+    Validate a parsed agent response against its schema.
+
+    Args:
+        value: Parsed JSON
+        name: Key of AGENT_SCHEMAS
+
+    Returns:
+        Human-readable errors; empty when the response is valid
+    """
+    errors = []
+    _validate(value, AGENT_SCHEMAS[name], '$', errors)
+    return errors
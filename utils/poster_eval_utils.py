@@ -8,7 +8,7 @@ from camel.models import ModelFactory
 from math import ceil
 from openai import OpenAI
 from camel.messages import BaseMessage
-from utils.src.model_utils import parse_pdf
+from utils.src.model_utils import parse_pdf, get_marker_models
 from urllib.parse import unquote
 from copy import deepcopy
 from transformers import AutoTokenizer, AutoModelForCausalLM
@@ -21,8 +21,8 @@ import re
 import shutil
 import pytesseract
 from utils.wei_utils import account_token
+from utils.asset_store import FigureAssetStore, PYRAMID_LEVELS, asset_file, load_asset_index
 from camel.types import ModelPlatformType, ModelType
-from marker.models import create_model_dict
 from camel.configs import ChatGPTConfig
 from camel.agents import ChatAgent
 from jinja2 import Environment, StrictUndefined
@@ -471,7 +471,7 @@ def get_poster_text(poster_path, check_fail=True):
     text_content = markdown_clean_pattern.sub("", raw_markdown)
     if len(text_content) < 500 and check_fail:
         print('\nParsing with docling failed, using marker instead\n')
-        parser_model = create_model_dict(device='cuda', dtype=torch.float16)
+        parser_model = get_marker_models()
         text_content, rendered = parse_pdf(poster_path, model_lst=parser_model, save_file=False)
     return text_content
 
@@ -1102,25 +1102,23 @@ def gen_eval_markdown(paper_name, poster_method, poster_path, figure_count_only=
     output_dir.mkdir(parents=True, exist_ok=True)
     doc_filename = paper_name
 
-    # Save images of figures and tables
+    # Save images of figures and tables, with the thumbnails the captioner is prompted with
+    store = FigureAssetStore(str(output_dir), doc_filename)
     table_counter = 0
     picture_counter = 0
     for element, _level in list(conv_res.document.iterate_items()):
         if isinstance(element, TableItem):
             table_counter += 1
-            element_image_filename = (
-                output_dir / f"table-{table_counter}.png"
-            )
-            with element_image_filename.open("wb") as fp:
-                element.get_image(conv_res.document).save(fp, "PNG")
-
-        if isinstance(element, PictureItem):
+            kind, index = 'table', table_counter
+        elif isinstance(element, PictureItem):
             picture_counter += 1
-            element_image_filename = (
-                output_dir / f"picture-{picture_counter}.png"
-            )
-            with element_image_filename.open("wb") as fp:
-                element.get_image(conv_res.document).save(fp, "PNG")
+            kind, index = 'picture', picture_counter
+        else:
+            continue
+        element_image = element.get_image(conv_res.document)
+        if element_image is not None:
+            store.add(kind, index, element_image, element_image.width, element_image.height)
+    store.save()
 
     # # Save markdown with embedded pictures
     # md_filename = output_dir / f"{doc_filename}-with-images.md"
@@ -1138,9 +1136,20 @@ def gen_eval_markdown(paper_name, poster_method, poster_path, figure_count_only=
     images_and_text = extract_images_and_sections(markdown)
     if figure_count_only:
         return len(images_and_text)
+
+    # The markdown references its pictures in document order, so they map onto the stored crops
+    picture_assets = [asset for asset in load_asset_index(str(output_dir), doc_filename).values() if asset['kind'] == 'picture']
+    image_links = [unquote(link) for link in re.findall(r'!\[.*?\]\((.*?)\)', markdown)]
+    thumbnails = {}
+    if len(picture_assets) == len(image_links):
+        thumbnails = {link: asset_file(str(output_dir), asset, 'thumbnail') for link, asset in zip(image_links, picture_assets)}
+
     for res in images_and_text:
-        image_path = os.path.join('eval_poster_markdown', paper_name, poster_method, res['image_path'])
-        image_img = Image.open(image_path)
+        if res['image_path'] in thumbnails:
+            image_img = Image.open(thumbnails[res['image_path']])
+        else:
+            image_img = Image.open(os.path.join('eval_poster_markdown', paper_name, poster_method, res['image_path']))
+            image_img.thumbnail((PYRAMID_LEVELS['thumbnail'], PYRAMID_LEVELS['thumbnail']), Image.LANCZOS)
         section_text = res['section_text']
         image_clip_embedding = compute_clip_embedding(image_img, model, processor)
         section_text_clip_embedding = compute_clip_embedding(section_text, model, processor)
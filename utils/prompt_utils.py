@@ -0,0 +1,86 @@
+"""
+Prompt layout with a shared paper-context prefix.
+
+The figure filter and outline prompts both carry the paper's raw content, at
+different spots of different templates. With prefix caching on (see
+`get_agent_config(..., prefix_caching=True)`), every such call for a paper is
+laid out as
+
+    system: PAPER_CONTEXT_SYSTEM_MESSAGE
+    user:   <canonical paper context> <agent instructions> <agent prompt>
+
+so everything up to the agent instructions is byte-identical across calls.
+OpenAI caches such prefixes automatically, and vLLM does so when the server
+runs with automatic prefix caching (`--enable-prefix-caching`); that is a
+server setting, not a request option. The title and per-section bullet point
+prompts do not carry the paper, only the meta block or one section's
+summary, so they keep their own layout: prepending the paper to each of them
+would add more input tokens than the cache saves.
+"""
+
+import json
+from typing import Any, Dict, Tuple
+
+PAPER_CONTEXT_SYSTEM_MESSAGE = (
+    'You are the author of the paper below and you are creating an academic poster for it. '
+    'Follow the task instructions given after the paper content.'
+)
+PAPER_CONTEXT_REFERENCE = '(the paper content given at the top of this message)'
+
+
+def prefix_caching_enabled(agent_config: Dict[str, Any]) -> bool:
+    return bool(agent_config.get('prefix_caching', False))
+
+
+def paper_context_block(raw_content: Dict[str, Any]) -> str:
+    """
+    Serialize the paper's raw content the same way for every call.
+
+    Args:
+        raw_content: The parsed raw content (`raw_content.json`)
+
+    Returns:
+        The context block; identical bytes for identical content
+    """
+    body = json.dumps(raw_content, ensure_ascii=False, sort_keys=True, indent=1)
+    return f'<paper_content>\n{body}\n</paper_content>'
+
+
+def paper_content_arg(agent_config: Dict[str, Any], raw_content: Any) -> Any:
+    """
+    Value for a template's paper-content variable.
+
+    With prefix caching, the content is already in the shared prefix, so the
+    template only gets a reference to it instead of a second copy.
+    """
+    if prefix_caching_enabled(agent_config):
+        return PAPER_CONTEXT_REFERENCE
+    return raw_content
+
+
+def layout_prompt(
+    agent_config: Dict[str, Any],
+    system_prompt: str,
+    prompt: str,
+    raw_content: Dict[str, Any],
+) -> Tuple[str, str]:
+    """
+    Arrange an agent's system prompt and prompt around the shared paper prefix.
+
+    Args:
+        agent_config: Config from `get_agent_config`
+        system_prompt: The agent's own system prompt
+        prompt: The rendered task prompt
+        raw_content: The paper's raw content
+
+    Returns:
+        (system_message, user_message); unchanged when prefix caching is off
+    """
+    if not prefix_caching_enabled(agent_config):
+        return system_prompt, prompt
+    user_message = (
+        f'{paper_context_block(raw_content)}\n\n'
+        f'<task_instructions>\n{system_prompt}\n</task_instructions>\n\n'
+        f'{prompt}'
+    )
+    return PAPER_CONTEXT_SYSTEM_MESSAGE, user_message
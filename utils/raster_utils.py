@@ -0,0 +1,168 @@
+"""
+Rasterization of PDF regions at a resolution chosen from where they end up.
+
+Docling exports figure and table crops at one fixed scale while parsing.
+For the poster, each placed figure is re-rendered from the PDF so that its
+pixel density matches its printed size: a small inset is not stored at 5x,
+and a figure blown up to half a column does not go soft. Placed images are
+then encoded as JPEG (photos) or PNG (line art) to keep the pptx small.
+"""
+
+import io
+import os
+from typing import Any, Dict, List, Optional
+
+import pypdfium2 as pdfium
+from PIL import Image
+
+POINTS_PER_INCH = 72.0
+# Line art has at most this many distinct colors in a 256 px sample...
+PHOTO_MIN_COLORS = 4096
+# ...or a background covering at least this fraction of it
+LINE_ART_BACKGROUND = 0.4
+
+
+def placed_render_scale(
+    bbox: List[float],
+    placed_width_inches: float,
+    target_dpi: float,
+    min_scale: float = 1.0,
+    max_scale: float = 8.0,
+) -> float:
+    """
+    Render scale (pixels per PDF point) for a region printed at a given width.
+
+    Args:
+        bbox: Region in PDF points as [left, top, right, bottom]
+        placed_width_inches: Width of the region on the poster
+        target_dpi: Pixel density wanted on the printed poster
+        min_scale: Lower clamp, keeps tiny placements legible on screen
+        max_scale: Upper clamp, bounds memory for very large placements
+
+    Returns:
+        The clamped render scale
+    """
+    bbox_width = bbox[2] - bbox[0]
+    if bbox_width <= 0:
+        return min_scale
+    scale = placed_width_inches * target_dpi / bbox_width
+    return max(min_scale, min(max_scale, scale))
+
+
+def render_pdf_region(
+    pdf_path: str,
+    page_no: int,
+    bbox: List[float],
+    scale: float,
+) -> Optional[Image.Image]:
+    """
+    Render one region of a PDF page.
+
+    Args:
+        pdf_path: Source PDF
+        page_no: 1-based page number
+        bbox: Region in PDF points as [left, top, right, bottom], top-left origin
+        scale: Pixels per PDF point
+
+    Returns:
+        The rendered region, or None if it could not be rendered
+    """
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        if not 1 <= page_no <= len(pdf):
+            return None
+        page = pdf[page_no - 1]
+        page_width, page_height = page.get_size()
+        left, top, right, bottom = bbox
+        # pdfium crops by the margin to cut from each side: (left, bottom, right, top)
+        crop = (
+            max(0.0, left),
+            max(0.0, page_height - bottom),
+            max(0.0, page_width - right),
+            max(0.0, top),
+        )
+        if crop[0] + crop[2] >= page_width or crop[1] + crop[3] >= page_height:
+            return None
+        return page.render(scale=scale, crop=crop).to_pil()
+    finally:
+        pdf.close()
+
+
+def is_photo(image: Image.Image) -> bool:
+    """
+    Tell photographs (and other continuous-tone images) from line art.
+
+    Plots, diagrams and tables have a dominant background color and few
+    distinct colors; they compress losslessly and show JPEG artifacts.
+    """
+    sample = image.convert('RGB')
+    sample.thumbnail((256, 256))
+    colors = sample.getcolors(maxcolors=PHOTO_MIN_COLORS)
+    if colors is None:
+        background = 0.0
+    else:
+        background = max(count for count, _ in colors) / (sample.width * sample.height)
+    return colors is None and background < LINE_ART_BACKGROUND
+
+
+def png_bytes(image: Image.Image) -> int:
+    """Size of an image saved as a plain PNG, the way docling crops used to be written."""
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.tell()
+
+
+def encode_placed_image(
+    image: Image.Image,
+    out_base: str,
+    placed_width_inches: float,
+    placed_height_inches: float,
+    target_dpi: float,
+    image_format: str = 'auto',
+    jpeg_quality: int = 85,
+) -> Dict[str, Any]:
+    """
+    Downsample an image to `target_dpi` for its placed size and encode it for the pptx.
+
+    Images are never upsampled. With `image_format="auto"`, photos are written
+    as JPEG and line art as PNG; PowerPoint has no WebP support, so these are
+    the two formats offered.
+
+    Args:
+        image: Image to place
+        out_base: Output path without extension
+        placed_width_inches: Width on the poster
+        placed_height_inches: Height on the poster
+        target_dpi: Pixel density wanted on the printed poster
+        image_format: "auto", "png" or "jpeg"
+        jpeg_quality: Quality of JPEG output
+
+    Returns:
+        Report with the output `path`, `format`, source and output pixel sizes and `bytes`
+    """
+    source_size = image.size
+    target_size = (
+        max(1, round(placed_width_inches * target_dpi)),
+        max(1, round(placed_height_inches * target_dpi)),
+    )
+    if target_size[0] < image.width and target_size[1] < image.height:
+        # Keep the aspect ratio; the pptx stretches the picture to its box anyway
+        ratio = max(target_size[0] / image.width, target_size[1] / image.height)
+        image = image.resize((round(image.width * ratio), round(image.height * ratio)), Image.LANCZOS)
+
+    if image_format == 'auto':
+        image_format = 'jpeg' if is_photo(image) else 'png'
+    if image_format == 'jpeg':
+        path = out_base + '.jpg'
+        image.convert('RGB').save(path, format='JPEG', quality=jpeg_quality, optimize=True)
+    else:
+        path = out_base + '.png'
+        image.save(path, format='PNG', optimize=True)
+
+    return {
+        'path': path,
+        'format': image_format,
+        'source_pixels': list(source_size),
+        'output_pixels': list(image.size),
+        'bytes': os.path.getsize(path),
+    }
@@ -0,0 +1,78 @@
+"""
+Run-scoped workspace management for the poster generation pipeline.
+
+A RunContext roots every intermediate a pipeline run reads or writes
+(contents/, tree_splits/, figure exports, tmp/) under one run directory, so
+several runs can share a host and a working directory without clobbering
+each other. Read-only inputs that every run shares (prompts, prompt
+templates, assets) are resolved against the project root instead.
+"""
+
+import os
+from typing import Any
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def project_path(*parts: str) -> str:
+    """
+    Resolve a shared, read-only project file such as a prompt template.
+
+    Args:
+        *parts: Path components relative to the project root
+
+    Returns:
+        Absolute path, independent of the current working directory
+    """
+    return os.path.join(PROJECT_ROOT, *parts)
+
+
+class RunContext:
+    """Workspace of a single pipeline run."""
+
+    def __init__(self, run_dir: str = '.'):
+        """
+        Initialize the run context.
+
+        Args:
+            run_dir: Directory holding all intermediates of this run. The
+                default "." keeps the historical cwd-relative layout.
+        """
+        self.run_dir = run_dir
+
+    def path(self, *parts: str) -> str:
+        """Resolve a run-local path; absolute paths are returned unchanged."""
+        if parts and os.path.isabs(parts[0]):
+            return os.path.join(*parts)
+        if self.run_dir in ('', '.'):
+            return os.path.join(*parts)
+        return os.path.join(self.run_dir, *parts)
+
+    def makedirs(self, *parts: str) -> str:
+        """Create a run-local directory if needed and return its path."""
+        dir_path = self.path(*parts)
+        os.makedirs(dir_path, exist_ok=True)
+        return dir_path
+
+    def __repr__(self) -> str:
+        return f'RunContext(run_dir={self.run_dir!r})'
+
+
+def get_run_context(args: Any) -> RunContext:
+    """
+    Return the RunContext attached to `args`, creating it from `args.run_dir` if needed.
+
+    Args:
+        args: Pipeline arguments namespace
+
+    Returns:
+        The run's RunContext
+    """
+    ctx = getattr(args, 'run_context', None)
+    if ctx is None:
+        ctx = RunContext(getattr(args, 'run_dir', None) or '.')
+        try:
+            setattr(args, 'run_context', ctx)
+        except AttributeError:
+            pass
+    return ctx
@@ -0,0 +1,128 @@
+"""
+Stage manifest of a pipeline run, used to resume after a crash.
+
+The manifest records, for every stage that completed, the state the later
+stages need and the artifacts the stage wrote (with their hashes). A resumed
+run replays that state for each recorded stage up to the first one that is
+missing or whose artifacts changed, and recomputes from there.
+"""
+
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from utils.cache_utils import file_sha256
+
+MANIFEST_FORMAT_VERSION = 1
+
+
+def artifact_fingerprint(path: str) -> Optional[str]:
+    """
+    Fingerprint an artifact so a resumed run can tell whether it is still intact.
+
+    Args:
+        path: File or directory written by a stage
+
+    Returns:
+        Hash of a file, "dir" for an existing directory, or None if missing
+    """
+    if os.path.isdir(path):
+        return 'dir'
+    return file_sha256(path)
+
+
+class RunManifest:
+    """Completed stages of one run, persisted as JSON after every stage."""
+
+    def __init__(self, path: str, fingerprint: str):
+        """
+        Initialize an empty manifest.
+
+        Args:
+            path: Where the manifest is stored
+            fingerprint: Hash of the run inputs; a manifest written for other
+                inputs is never resumed from
+        """
+        self.path = path
+        self.fingerprint = fingerprint
+        self.stages = {}
+
+    @classmethod
+    def load(cls, path: str, fingerprint: str) -> 'RunManifest':
+        """
+        Load the manifest at `path`, or start an empty one if it is missing or stale.
+
+        Args:
+            path: Where the manifest is stored
+            fingerprint: Hash of the current run inputs
+
+        Returns:
+            The manifest to resume from
+        """
+        manifest = cls(path, fingerprint)
+        if not os.path.exists(path):
+            return manifest
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            print(f'⚠️  Ignoring unreadable run manifest {path}')
+            return manifest
+        if data.get('version') != MANIFEST_FORMAT_VERSION or data.get('fingerprint') != fingerprint:
+            print(f'⚠️  Run manifest {path} was written for different inputs, starting over')
+            return manifest
+        manifest.stages = data.get('stages', {})
+        return manifest
+
+    def save(self) -> None:
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': MANIFEST_FORMAT_VERSION,
+                'fingerprint': self.fingerprint,
+                'stages': self.stages,
+            }, f, indent=4, default=str)
+        os.replace(tmp_path, self.path)
+
+    def completed(self, stage: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the record of a completed stage whose artifacts are all intact.
+
+        Args:
+            stage: Stage name
+
+        Returns:
+            The stage record, or None if the stage has to be rerun
+        """
+        record = self.stages.get(stage)
+        if record is None:
+            return None
+        for path, fingerprint in record['artifacts'].items():
+            if artifact_fingerprint(path) != fingerprint:
+                return None
+        return record
+
+    def record(self, stage: str, state: Dict[str, Any], artifacts: List[str]) -> None:
+        """
+        Mark a stage completed and persist the manifest.
+
+        Args:
+            stage: Stage name
+            state: JSON-serializable run state after the stage
+            artifacts: Files or directories the stage wrote
+        """
+        self.stages[stage] = {
+            'finished_at': time.time(),
+            'state': state,
+            'artifacts': {path: artifact_fingerprint(path) for path in artifacts},
+        }
+        self.save()
+
+    def invalidate_from(self, stages: List[str]) -> None:
+        """Forget `stages`, e.g. everything after the first stage that has to be rerun."""
+        for stage in stages:
+            self.stages.pop(stage, None)
+        self.save()
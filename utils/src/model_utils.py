@@ -1,5 +1,6 @@
 import json
 import os
+import threading
 from copy import deepcopy
 
 import numpy as np
@@ -8,6 +9,7 @@ import torchvision.transforms as T
 from FlagEmbedding import BGEM3FlagModel
 from marker.config.parser import ConfigParser
 from marker.converters.pdf import PdfConverter
+from marker.models import create_model_dict
 from marker.output import text_from_rendered
 from PIL import Image
 from torchvision.transforms.functional import InterpolationMode
@@ -18,6 +20,10 @@ from utils.src.utils import is_image_path, pjoin
 
 device_count = torch.cuda.device_count()
 
+# Marker models by (device, dtype); loaded once per process and shared by every caller
+_marker_models = {}
+_marker_models_lock = threading.Lock()
+
 
 def prs_dedup(
     presentation: Presentation,
@@ -94,11 +100,56 @@ def get_image_model(device: str = None):
     )
 
 
+def select_torch_device(device=None):
+    """
+    Pick a device and the dtype to run on it.
+
+    Args:
+        device: "cuda", "cuda:1", "mps", "cpu" or None to pick the best available.
+
+    Returns:
+        tuple: (device, dtype); float16 on GPUs, float32 on the CPU, where
+        float16 kernels are missing or slow.
+    """
+    if device is None:
+        if torch.cuda.is_available():
+            device = "cuda"
+        elif getattr(torch.backends, "mps", None) is not None and torch.backends.mps.is_available():
+            device = "mps"
+        else:
+            device = "cpu"
+    dtype = torch.float32 if str(device) == "cpu" else torch.float16
+    return device, dtype
+
+
+def get_marker_models(device: str = None) -> dict:
+    """
+    Return the marker model dict for `device`, loading it on first use.
+
+    The models are cached for the lifetime of the process, so repeated
+    fallbacks to marker (e.g. across a dataset pass) load them once.
+
+    Args:
+        device (str): Device to load on; auto-selected (GPU, else CPU) if None.
+
+    Returns:
+        dict: The artifact dict expected by `parse_pdf(model_lst=...)`.
+    """
+    device, dtype = select_torch_device(device)
+    key = (str(device), str(dtype))
+    with _marker_models_lock:
+        if key not in _marker_models:
+            print(f"Loading marker models on {device} ({dtype})")
+            _marker_models[key] = create_model_dict(device=device, dtype=dtype)
+        return _marker_models[key]
+
+
 def parse_pdf(
     pdf_path: str,
     output_path: str = None,
     model_lst: list = None,
     save_file: bool = True,
+    page_range: str = None,
 ) -> str:
     """
     Parse a PDF file and extract text and images.
@@ -107,17 +158,19 @@ def parse_pdf(
         pdf_path (str): The path to the PDF file.
         output_path (str): The directory to save the extracted content.
         model_lst (list): A list of models for processing the PDF.
+        page_range (str): Optional 0-based marker page range such as "0-9"; the whole PDF by default.
 
     Returns:
         str: The full text extracted from the PDF.
     """
     if save_file:
         os.makedirs(output_path, exist_ok=True)
-    config_parser = ConfigParser(
-        {
-            "output_format": "markdown",
-        }
-    )
+    config = {
+        "output_format": "markdown",
+    }
+    if page_range is not None:
+        config["page_range"] = page_range
+    config_parser = ConfigParser(config)
     converter = PdfConverter(
         config=config_parser.generate_config_dict(),
         artifact_dict=model_lst,
@@ -1,8 +1,10 @@
 import os
+import queue
 import shutil
 import subprocess
 import tempfile
 import traceback
+from contextlib import contextmanager
 from time import sleep, time
 from types import SimpleNamespace
 
@@ -19,6 +21,8 @@ from pptx.util import Length, Pt
 from rich import print
 from tenacity import RetryCallState, retry, stop_after_attempt, wait_fixed, wait_random
 
+from utils.tracing import span
+
 IMAGE_EXTENSIONS = {"bmp", "jpg", "jpeg", "pgm", "png", "ppm", "tif", "tiff", "webp"}
 
 BLACK = RGBColor(0, 0, 0)
@@ -135,6 +139,58 @@ tenacity = retry(
     wait=wait_random(3), stop=stop_after_attempt(5), after=tenacity_log, reraise=True
 )
 
+# When set, LibreOffice user profiles are kept under this directory and reused
+# across calls instead of being rebuilt in a fresh temp dir every time.
+_soffice_profile_root = None
+_soffice_profile_pool = queue.SimpleQueue()
+
+
+def set_soffice_profile_root(profile_root: str):
+    """
+    Keep warm LibreOffice user profiles under `profile_root` for the rest of the process.
+
+    Each concurrent conversion borrows its own profile from a pool, so parallel
+    callers never share a profile directory.
+    """
+    global _soffice_profile_root
+    os.makedirs(profile_root, exist_ok=True)
+    _soffice_profile_root = os.path.abspath(profile_root)
+
+
+@contextmanager
+def soffice_user_installation():
+    if _soffice_profile_root is None:
+        # Create unique user installation directory for LibreOffice to avoid concurrency issues
+        with tempfile.TemporaryDirectory() as user_install_dir:
+            yield user_install_dir
+        return
+    try:
+        user_install_dir = _soffice_profile_pool.get_nowait()
+    except queue.Empty:
+        user_install_dir = tempfile.mkdtemp(prefix="profile_", dir=_soffice_profile_root)
+    try:
+        yield user_install_dir
+    finally:
+        _soffice_profile_pool.put(user_install_dir)
+
+
+def warm_up_soffice():
+    """Start LibreOffice once so the first real conversion does not pay for profile creation."""
+    with soffice_user_installation() as user_install_dir:
+        subprocess.run(
+            [
+                "soffice",
+                "--headless",
+                "--norestore",
+                "--nolockcheck",
+                f"-env:UserInstallation=file://{user_install_dir}",
+                "--terminate_after_init",
+            ],
+            check=False,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
 
 @tenacity
 def ppt_to_images(file: str, output_dir: str, warning: bool = False, dpi=72, output_type='png'):
@@ -143,8 +199,7 @@ def ppt_to_images(file: str, output_dir: str, warning: bool = False, dpi=72, out
         print(f"ppt2images: {output_dir} already exists")
     os.makedirs(output_dir, exist_ok=True)
     with tempfile.TemporaryDirectory() as temp_dir:
-        # Create unique user installation directory for LibreOffice to avoid concurrency issues
-        with tempfile.TemporaryDirectory() as user_install_dir:
+        with soffice_user_installation() as user_install_dir:
             command_list = [
                 "soffice",
                 "--headless",
@@ -161,7 +216,8 @@ def ppt_to_images(file: str, output_dir: str, warning: bool = False, dpi=72, out
             env = os.environ.copy()
             env['LC_ALL'] = 'en_US.UTF-8'
             env['LANG'] = 'en_US.UTF-8'
-            subprocess.run(command_list, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
+            with span('soffice', name='soffice.pptx_to_pdf', file=file):
+                subprocess.run(command_list, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
 
         for f in os.listdir(temp_dir):
             if not f.endswith(".pdf"):
@@ -187,8 +243,7 @@ def wmf_to_images(blob: bytes, filepath: str):
     with tempfile.TemporaryDirectory() as temp_dir:
         with open(pjoin(temp_dir, f"{basename}.wmf"), "wb") as f:
             f.write(blob)
-        # Create unique user installation directory for LibreOffice to avoid concurrency issues
-        with tempfile.TemporaryDirectory() as user_install_dir:
+        with soffice_user_installation() as user_install_dir:
             command_list = [
                 "soffice",
                 "--headless",
@@ -201,7 +256,8 @@ def wmf_to_images(blob: bytes, filepath: str):
                 "--outdir",
                 dirname,
             ]
-            subprocess.run(command_list, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            with span('soffice', name='soffice.wmf_to_jpg', file=filepath):
+                subprocess.run(command_list, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
     assert pexists(filepath), f"File {filepath} does not exist"
 
@@ -0,0 +1,298 @@
+"""
+Structured tracing for the poster generation pipeline.
+
+Spans are recorded for every LLM/VLM call (`ChatAgent.step`), docling and
+marker conversion, LibreOffice launches, `run_code` executions and pipeline
+stages. Each span carries its latency, status and attributes such as model,
+token usage, retry count, stage and section. Spans go to a JSONL or SQLite
+sink chosen by file extension, and `summarize_trace` prints p50/p95 latency
+per span kind.
+
+Tracing is off unless `configure_tracing` is called (or POSTER_TRACE_PATH is
+set, which is how worker processes pick it up); disabled spans cost nothing.
+"""
+
+import argparse
+import contextvars
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+TRACE_PATH_ENV = 'POSTER_TRACE_PATH'
+
+_current_span = contextvars.ContextVar('poster_trace_span', default=None)
+_trace_attrs = contextvars.ContextVar('poster_trace_attrs', default={})
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+class JsonlSink:
+    """Appends one JSON object per span; safe to share between threads and processes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, default=str, ensure_ascii=False) + '\n'
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+
+class SqliteSink:
+    """Stores spans in a `spans` table; SQLite locking handles concurrent processes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS spans ('
+                'span_id TEXT PRIMARY KEY, parent_id TEXT, kind TEXT, name TEXT, '
+                'start REAL, duration REAL, status TEXT, error TEXT, pid INTEGER, '
+                'thread TEXT, attrs TEXT)'
+            )
+
+    def write(self, record: Dict[str, Any]) -> None:
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT INTO spans VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    record['span_id'], record['parent_id'], record['kind'], record['name'],
+                    record['start'], record['duration'], record['status'], record['error'],
+                    record['pid'], record['thread'], json.dumps(record['attrs'], default=str),
+                ),
+            )
+
+
+def make_sink(path: str):
+    if path.endswith(('.sqlite', '.sqlite3', '.db')):
+        return SqliteSink(path)
+    return JsonlSink(path)
+
+
+class Tracer:
+    """Turns finished spans into records and hands them to a sink."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.sink = make_sink(path)
+
+    def emit(self, record: Dict[str, Any]) -> None:
+        try:
+            self.sink.write(record)
+        except Exception as e:
+            # Telemetry must never take a poster run down with it
+            print(f'⚠️  Failed to record trace span: {e}')
+
+
+def configure_tracing(path: str) -> Tracer:
+    """
+    Send spans of this process, and of worker processes it starts, to `path`.
+
+    Args:
+        path: JSONL file, or a .sqlite/.db file for the SQLite sink
+
+    Returns:
+        The active tracer
+    """
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None or _tracer.path != path:
+            _tracer = Tracer(path)
+        os.environ[TRACE_PATH_ENV] = path
+    instrument_chat_agent()
+    return _tracer
+
+
+def get_tracer() -> Optional[Tracer]:
+    """Return the active tracer, configuring it from the environment in worker processes."""
+    global _tracer
+    if _tracer is None and os.environ.get(TRACE_PATH_ENV):
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = Tracer(os.environ[TRACE_PATH_ENV])
+    return _tracer
+
+
+@contextmanager
+def trace_context(**attrs: Any) -> Iterator[None]:
+    """Attach `attrs` (e.g. poster, stage, section) to every span opened inside the block."""
+    token = _trace_attrs.set({**_trace_attrs.get(), **attrs})
+    try:
+        yield
+    finally:
+        _trace_attrs.reset(token)
+
+
+@contextmanager
+def span(kind: str, name: Optional[str] = None, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Record a span around the block.
+
+    Args:
+        kind: Span type used for aggregation, e.g. "llm" or "soffice"
+        name: Finer-grained label, defaults to `kind`
+        **attrs: Span attributes; the block may add more to the yielded dict
+
+    Yields:
+        The span's attribute dict
+    """
+    tracer = get_tracer()
+    span_attrs = {**_trace_attrs.get(), **attrs}
+    if tracer is None:
+        yield span_attrs
+        return
+
+    span_id = uuid.uuid4().hex[:16]
+    parent_id = _current_span.get()
+    token = _current_span.set(span_id)
+    start = time.time()
+    status, error = 'ok', None
+    try:
+        yield span_attrs
+    except BaseException as e:
+        status, error = 'error', f'{type(e).__name__}: {e}'
+        raise
+    finally:
+        _current_span.reset(token)
+        if span_attrs.get('error') and status == 'ok':
+            status, error = 'error', str(span_attrs.pop('error'))
+        tracer.emit({
+            'span_id': span_id,
+            'parent_id': parent_id,
+            'kind': kind,
+            'name': name or kind,
+            'start': start,
+            'duration': time.time() - start,
+            'status': status,
+            'error': error,
+            'pid': os.getpid(),
+            'thread': threading.current_thread().name,
+            'attrs': span_attrs,
+        })
+
+
+_retry_state = threading.local()
+
+
+def _count_retry(model: str, input_message: Any) -> int:
+    """
+    Count consecutive identical requests to the same model on this thread.
+
+    The pipeline retries by resetting an agent (or building a new one) and
+    sending the same prompt again, so a repeated request is a retry.
+    """
+    content = getattr(input_message, 'content', input_message)
+    key = (model, hash(str(content)))
+    if getattr(_retry_state, 'last_key', None) == key:
+        _retry_state.count += 1
+    else:
+        _retry_state.last_key = key
+        _retry_state.count = 0
+    return _retry_state.count
+
+
+def instrument_chat_agent() -> None:
+    """Wrap `ChatAgent.step` at class level so every LLM/VLM call records a span."""
+    from camel.agents import ChatAgent
+
+    if getattr(ChatAgent.step, '_poster_traced', False):
+        return
+    original_step = ChatAgent.step
+
+    def traced_step(self, input_message, *args, **kwargs):
+        model = str(getattr(getattr(self, 'model_backend', None), 'model_type', 'unknown'))
+        with span('llm', name='ChatAgent.step', model=model,
+                  retry=_count_retry(model, input_message)) as attrs:
+            response = original_step(self, input_message, *args, **kwargs)
+            usage = (getattr(response, 'info', None) or {}).get('usage') or {}
+            attrs['prompt_tokens'] = usage.get('prompt_tokens')
+            attrs['completion_tokens'] = usage.get('completion_tokens')
+            return response
+
+    traced_step._poster_traced = True
+    traced_step.__wrapped__ = original_step
+    ChatAgent.step = traced_step
+
+
+def load_spans(path: str) -> List[Dict[str, Any]]:
+    """Read every span recorded in a JSONL or SQLite trace."""
+    if path.endswith(('.sqlite', '.sqlite3', '.db')):
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        try:
+            rows = conn.execute('SELECT * FROM spans').fetchall()
+        finally:
+            conn.close()
+        return [{**dict(row), 'attrs': json.loads(row['attrs'] or '{}')} for row in rows]
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of `values` (q in [0, 100])."""
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize_trace(path: str, group_by: str = 'kind') -> Dict[str, Dict[str, Any]]:
+    """
+    Aggregate a trace per span kind (or per `name`).
+
+    Args:
+        path: Trace file written by a sink
+        group_by: "kind" or "name"
+
+    Returns:
+        Group -> count, errors, total/p50/p95/max seconds and token totals
+    """
+    groups = {}
+    for record in load_spans(path):
+        groups.setdefault(record[group_by], []).append(record)
+
+    summary = {}
+    for group, records in sorted(groups.items()):
+        durations = [r['duration'] for r in records]
+        summary[group] = {
+            'count': len(records),
+            'errors': sum(r['status'] != 'ok' for r in records),
+            'total_seconds': sum(durations),
+            'p50_seconds': percentile(durations, 50),
+            'p95_seconds': percentile(durations, 95),
+            'max_seconds': max(durations),
+            'prompt_tokens': sum(r['attrs'].get('prompt_tokens') or 0 for r in records),
+            'completion_tokens': sum(r['attrs'].get('completion_tokens') or 0 for r in records),
+            'retries': sum(1 for r in records if r['attrs'].get('retry')),
+        }
+    return summary
+
+
+def print_summary(summary: Dict[str, Dict[str, Any]]) -> None:
+    print(f'{"span":<24}{"count":>7}{"errors":>8}{"total s":>10}{"p50 s":>9}{"p95 s":>9}'
+          f'{"max s":>9}{"tokens in":>11}{"tokens out":>12}{"retries":>9}')
+    for group, s in summary.items():
+        print(f'{group:<24}{s["count"]:>7}{s["errors"]:>8}{s["total_seconds"]:>10.2f}'
+              f'{s["p50_seconds"]:>9.2f}{s["p95_seconds"]:>9.2f}{s["max_seconds"]:>9.2f}'
+              f'{s["prompt_tokens"]:>11}{s["completion_tokens"]:>12}{s["retries"]:>9}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Summarize a poster pipeline trace')
+    parser.add_argument('trace_path', type=str)
+    parser.add_argument('--group_by', choices=['kind', 'name'], default='kind')
+    args = parser.parse_args()
+    print_summary(summarize_trace(args.trace_path, args.group_by))
@@ -16,6 +16,7 @@ import os
 import copy
 import io
 from utils.src.utils import ppt_to_images
+from utils.tracing import span
 from playwright.sync_api import sync_playwright
 from pathlib import Path
 from playwright.async_api import async_playwright
@@ -23,7 +24,7 @@ import asyncio
 from utils.pptx_utils import *
 from utils.critic_utils import *
 
-def get_agent_config(model_type):
+def get_agent_config(model_type, prefix_caching=False, structured_output=False):
     agent_config = {}
     if model_type == 'qwen':
         agent_config = {
@@ -193,6 +194,12 @@ def get_agent_config(model_type):
             'model_config': None
         }
     
+    if agent_config:
+        # Lay prompts out around a shared paper prefix (see utils.prompt_utils). vLLM has no
+        # per-request switch for caching it; the server must run with --enable-prefix-caching
+        agent_config['prefix_caching'] = prefix_caching
+        # Constrain JSON-producing agents to their schema (see utils.json_schemas)
+        agent_config['structured_output'] = structured_output
     return agent_config
 
 
@@ -231,13 +238,14 @@ def run_code(code):
     # Provide a globals dict specifying that __name__ is "__main__"
     exec_globals = {"__name__": "__main__"}
 
-    with contextlib.redirect_stdout(stdout_capture):
+    with span('run_code', code_chars=len(code)) as attrs, contextlib.redirect_stdout(stdout_capture):
         try:
             exec(code, exec_globals)
             error = None
         except Exception:
             # Capture the entire stack trace
             error = traceback.format_exc()
+            attrs['error'] = error.strip().splitlines()[-1]
 
     output = stdout_capture.getvalue()
     return output, error